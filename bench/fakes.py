@@ -0,0 +1,330 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Stand-in backends for benchmarking without root or a docker daemon:
+an in-memory docker daemon, resource limited hosts whose commands are recorded instead of run,
+a link backend which drains its batches without spawning ip, and cgroupfs in a temporary directory.
+Every docker api call may sleep latency seconds, to model the round trip of a daemon.
+"""
+
+import io
+import itertools
+import os
+import shutil
+import time
+from threading import Lock
+from Queue import Queue
+import docker
+from fie.cgroup import CgroupV2
+from fie.linkbackend import BatchBackend
+from fie.rslimit import RSLimitedHost
+
+
+class FakeEvents(object):
+    """An events stream of the fake daemon, iterates until closed"""
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+        self.queue = Queue()
+
+    def __iter__(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            yield event
+
+    def close(self):
+        self.daemon.unsubscribe(self)
+        self.queue.put(None)
+
+
+class FakeContainerModel(object):
+
+    def __init__(self, daemon, attrs):
+        self.daemon = daemon
+        self.id = attrs['Id']
+        self.attrs = attrs
+
+    def stop(self):
+        self.daemon.stop(self.id)
+
+    def remove(self, force=False):
+        self.daemon.api.remove_container(self.id, force=force)
+
+    def update(self, **limits):
+        self.attrs.setdefault('HostConfig', {}).update(limits)
+
+
+class FakeNetworkModel(object):
+
+    def __init__(self, daemon, name):
+        self.daemon = daemon
+        self.name = name
+
+    def remove(self):
+        self.daemon.api.remove_network(self.name)
+
+
+class FakeContainers(object):
+    """The containers collection of the docker client"""
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def prepare_model(self, attrs):
+        return FakeContainerModel(self.daemon, attrs)
+
+
+class FakeNetworks(object):
+    """The networks collection of the docker client"""
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def create(self, name, labels=None, **params):
+        self.daemon.delay()
+        with self.daemon.lock:
+            if name in self.daemon.labels:
+                raise docker.errors.APIError('network %s already exists' % name)
+            self.daemon.labels[name] = dict(labels or {})
+        return FakeNetworkModel(self.daemon, name)
+
+    def prune(self, filters=None):
+        self.daemon.delay()
+        key, _, value = (filters or {}).get('label', '').partition('=')
+        with self.daemon.lock:
+            used = set(c['network'] for c in self.daemon.table.values())
+            deleted = [name for name, labels in self.daemon.labels.items()
+                       if labels.get(key) == value and name not in used]
+            for name in deleted:
+                del self.daemon.labels[name]
+        return {'NetworksDeleted': deleted}
+
+
+class FakeImages(object):
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def list(self):
+        return []
+
+
+class FakeAPI(object):
+    """The low level api of the docker client"""
+
+    _version = '1.30'
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def create_networking_config(self, endpoints):
+        return {'EndpointsConfig': endpoints}
+
+    def create_endpoint_config(self, ipv4_address=None, **params):
+        return {'IPAMConfig': {'IPv4Address': ipv4_address}}
+
+    def create_container(self, image=None, name=None, host_config=None, networking_config=None, **params):
+        daemon = self.daemon
+        daemon.delay()
+        with daemon.lock:
+            if name in daemon.names:
+                raise docker.errors.APIError('container name %s is already in use' % name)
+            container_id = '%064x' % next(daemon.ids)
+            ip = None
+            if networking_config:
+                for endpoint in networking_config['EndpointsConfig'].values():
+                    ip = endpoint['IPAMConfig']['IPv4Address']
+            daemon.table[container_id] = {
+                'name': name, 'network': (host_config or {}).get('NetworkMode'),
+                'ip': ip, 'pid': None}
+            daemon.names[name] = container_id
+        return {'Id': container_id}
+
+    def start(self, container):
+        daemon = self.daemon
+        daemon.delay()
+        with daemon.lock:
+            c = daemon.table[daemon.resolve(container)]
+            c['pid'] = next(daemon.pids)
+        daemon.emit('start', daemon.resolve(container), c['name'])
+
+    def inspect_container(self, container):
+        daemon = self.daemon
+        daemon.delay()
+        with daemon.lock:
+            container_id = daemon.resolve(container)
+            c = daemon.table[container_id]
+            return {'Id': container_id, 'Name': '/' + c['name'],
+                    'State': {'Pid': c['pid'] or 0, 'Running': c['pid'] is not None},
+                    'NetworkSettings': {'Networks': {c['network']: {'IPAddress': c['ip'] or ''}}}}
+
+    def remove_container(self, container, force=False):
+        daemon = self.daemon
+        daemon.delay()
+        with daemon.lock:
+            container_id = daemon.resolve(container)
+            c = daemon.table.pop(container_id)
+            del daemon.names[c['name']]
+        if c['pid'] is not None:
+            daemon.emit('die', container_id, c['name'])
+        daemon.emit('destroy', container_id, c['name'])
+
+    def rename(self, container, name):
+        daemon = self.daemon
+        with daemon.lock:
+            container_id = daemon.resolve(container)
+            c = daemon.table[container_id]
+            del daemon.names[c['name']]
+            c['name'] = name
+            daemon.names[name] = container_id
+
+    def remove_network(self, name):
+        self.daemon.delay()
+        with self.daemon.lock:
+            if self.daemon.labels.pop(name, None) is None:
+                raise docker.errors.NotFound('network %s not found' % name)
+
+    def containers(self, all=False):
+        with self.daemon.lock:
+            return [{'Id': i, 'Names': ['/' + c['name']],
+                     'NetworkSettings': {'Networks': {c['network']: {}}}}
+                    for i, c in self.daemon.table.items()]
+
+    def networks(self, names=None):
+        with self.daemon.lock:
+            return [{'Name': name} for name in self.daemon.labels
+                    if not names or any(n in name for n in names)]
+
+
+class FakeDocker(object):
+    """An in-memory docker daemon and its client, in place of docker.DockerClient"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = Lock()
+        self.ids = itertools.count(1)
+        self.pids = itertools.count(100000)
+        # id -> {name, network, ip, pid}, name -> id
+        self.table = {}
+        self.names = {}
+        # network name -> labels
+        self.labels = {}
+        self.subscribers = []
+        self.api = FakeAPI(self)
+        self.containers = FakeContainers(self)
+        self.networks = FakeNetworks(self)
+        self.images = FakeImages(self)
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def resolve(self, container):
+        """Container id of an id or a name"""
+        if container in self.table:
+            return container
+        try:
+            return self.names[container]
+        except KeyError:
+            raise docker.errors.NotFound('no such container: %s' % container)
+
+    def stop(self, container_id):
+        with self.lock:
+            c = self.table[container_id]
+            c['pid'] = None
+        self.emit('die', container_id, c['name'])
+
+    def events(self, decode=True, filters=None):
+        stream = FakeEvents(self)
+        with self.lock:
+            self.subscribers.append(stream)
+        return stream
+
+    def unsubscribe(self, stream):
+        with self.lock:
+            if stream in self.subscribers:
+                self.subscribers.remove(stream)
+
+    def emit(self, action, container_id, name):
+        event = {'status': action, 'id': container_id,
+                 'Actor': {'Attributes': {'name': name, 'exitCode': '0'}}}
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for stream in subscribers:
+            stream.queue.put(event)
+
+
+class FakeProcess(object):
+
+    returncode = 0
+
+    def __init__(self):
+        self.stdin = io.BytesIO()
+
+    def communicate(self, data=None):
+        return '', ''
+
+    def wait(self):
+        return self.returncode
+
+
+class FakeHost(RSLimitedHost):
+    """A RSLimitedHost without a shell, its commands are recorded instead of run, its cgroup is in cgroups"""
+
+    pids = itertools.count(2)
+    # Without a shell, mnexec is not needed.
+    isSetup = True
+
+    def __init__(self, name, cgroups, **params):
+        # The cgroup hierarchy of the machine is neither detected nor mounted.
+        RSLimitedHost.inited = True
+        self.cgroups = cgroups
+        RSLimitedHost.__init__(self, name, **params)
+
+    def startShell(self, mnopts=None):
+        self.pid = next(FakeHost.pids)
+        self.commands = 0
+
+    def IP(self, intf=None):
+        return '10.%d.%d.%d' % (self.pid >> 16 & 255, self.pid >> 8 & 255, self.pid & 255)
+
+    def cmd(self, *args, **kwargs):
+        self.commands += 1
+        return ''
+
+    def popen(self, args, **kwargs):
+        self.commands += 1
+        return FakeProcess()
+
+
+class FakeLinkBackend(BatchBackend):
+    """A batch backend draining its batches without spawning ip"""
+
+    def commit(self):
+        with self.lock:
+            self.order = []
+            self.batches = {}
+        return 0
+
+
+class FakeCgroup(CgroupV2):
+    """cgroup v2 in a directory, the controllers of every group are enabled as created"""
+
+    def enable(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with open(os.path.join(path, 'cgroup.subtree_control'), 'w') as f:
+            f.write(' '.join('+' + c for c in self.controllers))
+
+    def remove(self, group):
+        # The interface files of a directory are not removed along with it.
+        shutil.rmtree(self.path(None, group), ignore_errors=True)
+        CgroupV2.remove(self, group)
@@ -0,0 +1,237 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Benchmark of the emulation lifecycle as topologies grow.
+Each size runs the phases init (FIE.__init__), start, routeAll, run (containers deployed on every node),
+destroyAll and stop, and the fastest of the repeats is kept.
+
+    # Stand-in docker, ip and cgroup backends, no root or daemon needed
+    python bench/lifecycle.py --sizes 2,8,32,128
+    # The real stack
+    sudo -E python bench/lifecycle.py --real --sizes 2,4,8
+
+With the stand-ins, init creates the cgroups of the hosts as mininet builds them, start runs RSLimitedHost.config
+of every host and FIE.start, and stop is FIE.stop, on a cgroupfs in a temporary directory.
+Results are appended to bench/results.json, which is not tracked, and compared with the last run of the same setup:
+a phase slower than --threshold times the previous run is reported and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mininet.log import setLogLevel
+from fie.fie import FIE
+from fie.rslimit import RSLimitedHost
+
+PHASES = ('init', 'start', 'routeAll', 'run', 'destroyAll', 'stop')
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.json')
+
+# The limits of every host, in both setups.
+LIMITS = {'cpu': 0.1, 'mem': 256}
+
+
+@contextmanager
+def timer(times, phase):
+    start = time.time()
+    yield
+    times[phase] = time.time() - start
+
+
+def fake_lifecycle(size, containers, workers, latency):
+    """Time the phases with the stand-in backends, return a dictionary of phase to seconds"""
+    from fakes import FakeDocker, FakeHost, FakeLinkBackend, FakeCgroup
+
+    tmp = tempfile.mkdtemp(prefix='fie-bench-')
+    times = {}
+    cgroups = FakeCgroup(os.path.join(tmp, 'cgroup'))
+    try:
+        # Mininet itself needs root, FIE wraps the stand-in hosts as it wraps mininet ones.
+        net = FIE.__new__(FIE)
+        net.controllers, net.switches, net.links, net.terms = [], [], [], []
+        net.built, net.waitConn = True, False
+        with timer(times, 'init'):
+            net.hosts = [FakeHost('h%d' % i, cgroups, **LIMITS) for i in range(size)]
+            net.initAbsNodes(workers, FakeLinkBackend, journal=os.path.join(tmp, 'journal'),
+                             dockerClient=FakeDocker(latency))
+
+        with timer(times, 'start'):
+            # As mininet configures its hosts, then FIE.start.
+            for host in net.hosts:
+                host.config(**host.params)
+            net.start()
+
+        with timer(times, 'routeAll'):
+            net.routeAll()
+
+        plan = [(host.name, {'image': 'busybox', 'command': 'sleep 3600'})
+                for host in net.hosts for _ in range(containers)]
+        with timer(times, 'run'):
+            failed = [r for r in net.deploy(plan, workers) if r['error'] is not None]
+        if failed:
+            raise RuntimeError('%d containers failed: %s' % (len(failed), failed[0]['error']))
+
+        with timer(times, 'destroyAll'):
+            net.destroyAll(workers)
+
+        with timer(times, 'stop'):
+            net.stop()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return times
+
+
+def real_lifecycle(size, containers, workers, image):
+    """Time the phases on the real stack, return a dictionary of phase to seconds"""
+    from mininet.topo import Topo
+    from mininet.util import custom
+
+    class BenchTopo(Topo):
+        """size hosts, 8 per switch, the switches in a chain"""
+
+        def build(self):
+            switches = []
+            for i in range(size):
+                if i % 8 == 0:
+                    switches.append(self.addSwitch('s%d' % (len(switches) + 1)))
+                    if len(switches) > 1:
+                        self.addLink(switches[-2], switches[-1])
+                host = self.addHost('h%d' % i, cls=custom(RSLimitedHost, **LIMITS))
+                self.addLink(switches[-1], host)
+
+    times = {}
+    with timer(times, 'init'):
+        net = FIE(topo=BenchTopo(), absnodeWorkers=workers)
+    try:
+        with timer(times, 'start'):
+            net.start()
+        with timer(times, 'routeAll'):
+            net.routeAll()
+        plan = [(host.name, {'image': image, 'command': 'sleep 3600'})
+                for host in net.hosts for _ in range(containers)]
+        with timer(times, 'run'):
+            failed = [r for r in net.deploy(plan, workers) if r['error'] is not None]
+        if failed:
+            raise RuntimeError('%d containers failed: %s' % (len(failed), failed[0]['error']))
+        with timer(times, 'destroyAll'):
+            net.destroyAll(workers)
+    except Exception:
+        net.destroyAll(workers)
+        net.stop()
+        raise
+    with timer(times, 'stop'):
+        net.stop()
+    return times
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(RESULTS)).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {'runs': []}
+
+
+def compare(run, previous, threshold, floor):
+    """Return the (size, phase, before, after) slower than threshold times previous"""
+    regressions = []
+    for size, times in run['phases'].items():
+        before = previous['phases'].get(size, {})
+        for phase, after in times.items():
+            if phase in before and after > before[phase] * threshold and after - before[phase] > floor:
+                regressions.append((size, phase, before[phase], after))
+    return regressions
+
+
+def report(run):
+    print('%8s' % 'size' + ''.join('%12s' % phase for phase in PHASES))
+    for size in sorted(run['phases'], key=int):
+        times = run['phases'][size]
+        print('%8s' % size + ''.join('%11.3fs' % times[phase] for phase in PHASES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the fie emulation lifecycle.')
+    parser.add_argument('--sizes', default='2,8,32,128',
+                        help='comma separated numbers of abstraction nodes')
+    parser.add_argument('--containers', type=int, default=4,
+                        help='containers deployed on every node')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='concurrent bring-up, deploy and teardown workers')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of every size, the fastest is kept')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds of every stand-in docker call')
+    parser.add_argument('--real', action='store_true',
+                        help='run against mininet and the docker daemon, needs root')
+    parser.add_argument('--image', default='busybox',
+                        help='image of the containers on the real stack')
+    parser.add_argument('--results', default=RESULTS,
+                        help='results file, default bench/results.json')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='slowdown against the previous run reported as a regression')
+    parser.add_argument('--floor', type=float, default=0.005,
+                        help='seconds under which a slowdown is noise')
+    parser.add_argument('--no-save', dest='save', action='store_false',
+                        help='compare without storing the results')
+    args = parser.parse_args()
+
+    setLogLevel('warning')
+    sizes = [int(size) for size in args.sizes.split(',')]
+    mode = 'real' if args.real else 'fake'
+
+    phases = {}
+    for size in sizes:
+        best = None
+        for _ in range(args.repeat):
+            if args.real:
+                times = real_lifecycle(size, args.containers, args.workers, args.image)
+            else:
+                times = fake_lifecycle(size, args.containers, args.workers, args.latency)
+            best = times if best is None else dict((p, min(best[p], times[p])) for p in PHASES)
+        phases[str(size)] = best
+
+    run = {'mode': mode, 'revision': revision(), 'time': int(time.time()),
+           'containers': args.containers, 'workers': args.workers,
+           'latency': args.latency, 'phases': phases}
+    report(run)
+
+    results = load(args.results)
+    # Only runs of the same setup are comparable.
+    setup = lambda r: (r['mode'], r['containers'], r['workers'], r['latency'])
+    previous = [r for r in results['runs'] if setup(r) == setup(run)]
+    regressions = compare(run, previous[-1], args.threshold, args.floor) if previous else []
+    for size, phase, before, after in regressions:
+        print('regression: %s at size %s, %.3fs -> %.3fs' % (phase, size, before, after))
+
+    if args.save:
+        results['runs'].append(run)
+        with open(args.results, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
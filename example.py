@@ -17,7 +17,6 @@ from fie.env import Env
 from fie.fie import FIE, emulation
 from fie.rslimit import RSLimitedHost
 import fie.utils
-from fie.utils import implicit_dns
 import time
 
 """
@@ -115,8 +114,8 @@ def kwargsHelper(name, role, location):
     return {
         'image': 'tz70s/reactive-city:0.1.6',
         'name': name,
-        'dns': [implicit_dns()],
-        'environment': {'CLUSTER_SEED_IP': 'controller.docker', 'CLUSTER_HOST_IP': name+'.docker'},
+        # {name} is the container name, replicas created by scale get their own.
+        'environment': {'CLUSTER_SEED_IP': 'controller.docker', 'CLUSTER_HOST_IP': '{name}.docker'},
         'restart_policy': {'Name': 'always'},
         'command': '-r ' + role + ' -l ' + location
     }
@@ -138,23 +137,33 @@ Architecture:
     """
           )
 
-    # Run a DNS(Domain Name Service) container in cloud0.
-    # This is common techniques in a microservice style,
-    # the domain address can be resolved to ip address in each services.
-    net.node('cloud0').run('phensley/docker-dns',
-                           name='dns',
-                           volumes={'/var/run/docker.sock': {'bind': '/docker.sock', 'mode': 'rw'}})
+    # Containers resolve each other by name, e.g. controller or controller.docker,
+    # through the name service of FIE, a common technique in a microservice style.
 
     # Run a controller node at the cloud1, actor system role is set to controller, location is set to cloud.
-    # Same as following.
-    net.node('cloud1').run(**kwargsHelper('controller', 'controller', 'cloud'))
-    net.node('fog0').run(**kwargsHelper('partition', 'partition', 'fog-west'))
-    net.node('fog1').run(**kwargsHelper('analytics', 'analytics', 'fog-west'))
-    net.node('fog1').run(**kwargsHelper('reflector', 'reflector', 'fog-west'))
-    net.node('car_src_0').run(**kwargsHelper('simulator', 'simulator', 'fog-west'))
+    # The other services join the cluster through the controller, they are launched concurrently
+    # once it accepts connections on the seed port of the actor system.
+    def service(name, node, location, after=()):
+        return {'name': name, 'node': node, 'spec': kwargsHelper(name, name, location),
+                'after': list(after), 'ready': {'tcp': 2551, 'timeout': 120}}
+
+    results = net.schedule([
+        service('controller', 'cloud1', 'cloud'),
+        service('partition', 'fog0', 'fog-west', after=['controller']),
+        service('analytics', 'fog1', 'fog-west', after=['controller']),
+        service('reflector', 'fog1', 'fog-west', after=['controller']),
+        service('simulator', 'car_src_0', 'fog-west', after=['controller']),
+    ])
+
+    for r in results:
+        print('%s on %s: ready in %s %s' % (r['name'], r['node'],
+                                            '%.2fs' % r['time_to_ready'] if r['error'] is None else '-',
+                                            r['error'] or 'ok'))
 
 
 if __name__ == '__main__':
     # The emulation function take two arguments:
     # 1. the build up topology, 2. the service_deployment function
-    emulation(NetworkTopology(), service_deployment)
+    # The images are prefetched before the emulation starts.
+    emulation(NetworkTopology(), service_deployment,
+              images=['tz70s/reactive-city:0.1.6'])
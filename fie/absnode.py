@@ -13,9 +13,21 @@ Checkout the docs for more detailed abstraction node concepts.
 
 import docker
 import os
-from subprocess import call
+import sys
+import time
+import six
+from threading import Lock
 from mininet.util import custom
+from mininet.log import error
 from container import Container
+from linkbackend import BatchBackend
+from index import ContainerIndex
+from env import AddressPool
+from journal import Journal
+from utils import parallel_map, network
+import cpuplace
+from budget import Budget
+import executor
 
 
 class AbstractionNode():
@@ -27,19 +39,35 @@ class AbstractionNode():
         ip_pool,
         cgroup,
         docker client
+        container state cache,
+        container index,
+        journal,
+        link backend,
         network,
         container_list,
         pid_list 
     as necessary params
     """
 
-    def __init__(self, name, head_node, ip_pool, docker_client, **opts):
-        """Initialization"""
+    def __init__(self, name, head_node, ip_pool, docker_client, link=None, build=True, state=None,
+                 index=None, static_ip=False, journal=None, overcommit='reject', **opts):
+        """
+        Initialization
+        journal records the created resources for cleanup, shared over the emulation, see journal.py.
+        static_ip=True hands out container addresses from the ip pool instead of docker IPAM.
+        index is the container index shared by all abstraction nodes, the node owns one without it.
+        link is a shared link backend, e.g. one batch for the whole topology.
+        Without it, the node owns a batch backend committed on each step.
+        build=False leaves the internal network to the caller, see net_default.
+        overcommit is the policy of the resource budget of containers, reject or rebalance, see budget.py.
+        """
         self.head_node = head_node
         self.pid = str(head_node.pid)
         self.name = name
         self.ip_pool = ip_pool
         self.gw = self.create_gateway()
+        self.static_ip = static_ip
+        self.addresses = AddressPool(ip_pool)
         self.cg = "/" + self.name
 
         # Network name for creating bridge
@@ -47,19 +75,42 @@ class AbstractionNode():
 
         # Initialize docker client
         self.docker_client = docker_client
+        self.state = state
+
+        # Initialize link backend
+        self.own_link = link is None
+        self.link = BatchBackend() if link is None else link
 
         # Initialize lists of containers and pids
 
         self.container_list = []
         self.pid_list = []
+        # Guards the lists and the naming counter against concurrent runs.
+        self.lock = Lock()
+        self.counter = 0
+        self.index = ContainerIndex() if index is None else index
+        self.journal = Journal() if journal is None else journal
 
         self.dockerbridge = None
-
-        self.net_default()
+        self.veth = False
+        # The name servers of containers, set once the node serves names, see dns.py
+        self.dns = None
+        # The cpus of the node divided among its containers, set by the cpu placement, see cpuplace.py
+        self.cpuset = None
+        # The resources granted to the host, shared by its containers.
+        self.budget = Budget.of(head_node, overcommit)
+
+        # Clean up what we have partially built before reporting the failure.
+        if build:
+            try:
+                self.net_default()
+            except Exception:
+                self.teardown()
+                raise
 
     def cmd(self, cmdstr):
         """Inherit mininet host cmd"""
-        self.head_node.cmd(cmdstr)
+        executor.cmd(self.head_node, cmdstr)
 
     """
     Internal network from head_node to containers
@@ -81,38 +132,38 @@ class AbstractionNode():
     def net_default(self):
         """The default network settings inner abstraction node"""
         self.create_veth()
+        self.link.commit()
+        self.net_bridge()
+
+    def net_bridge(self):
+        """The settings after the veth pair of create_veth is committed"""
         self.createBridge()
         self.set_nat_rules()
 
     def create_gateway(self):
         """Create the gateway of abstraction node route"""
-        sub_list = self.ip_pool.split('/')[0].split('.')
-        sub_list[-1] = '1'
-        return '.'.join(sub_list)
+        return str(network(self.ip_pool).network_address + 1)
 
     def create_veth(self):
-        """Create additional veth for head_node (eth1)"""
+        """Create additional veth for head_node (eth1), queued in the link backend"""
         # print(self.name + ' : add netns veth pair with docker bridge')
 
-        create_link = 'ip link add ' + self.name + '-eth1' + \
-            ' type veth peer name ' + self.name + '-dport'
-        up_link = 'ip link set dev ' + self.name + '-eth1' + ' up'
-        set_ns = 'ip link set netns ' + self.pid + ' dev ' + self.name + '-eth1' + ' up'
+        self.journal.record('link', self.name + '-dport')
+        self.link.add_veth(self.name + '-eth1', self.name + '-dport')
+        self.veth = True
+        self.link.set_netns(self.name + '-eth1', self.head_node)
 
-        call(create_link.split(' '))
-        call(up_link.split(' '))
-        call(set_ns.split(' '))
+        # Up the parent interface of docker bridge, a.k.a xxx-dport
+        self.link.set_up(self.name + '-dport')
 
-        self.cmd('ifconfig ' + self.name + '-eth1 ' + self.gw)
-        self.cmd('route add -net ' + self.ip_pool.split('/')
-                 [0] + ' netmask 255.255.255.0 gw ' + self.gw + ' dev ' + self.name + '-eth1')
+        # The address brings up the route to ip pool through eth1 as well.
+        prefixlen = self.ip_pool.split('/')[1]
+        self.link.add_addr(self.name + '-eth1', self.gw +
+                           '/' + prefixlen, self.head_node)
 
     def createBridge(self):
         """Create docker network a.k.a linux bridge"""
 
-        # Up the parent interface, a.k.a xxx-dport
-        call(['ip', 'link', 'set', 'dev', self.name+'-dport', 'up'])
-
         # Set the network ip pool for new containers over specific network namespace
         ipam_pool = docker.types.IPAMPool(subnet=self.ip_pool, gateway=self.gw)
         ipam_config = docker.types.IPAMConfig(pool_configs=[ipam_pool])
@@ -121,28 +172,66 @@ class AbstractionNode():
             'parent': self.name+'-dport'
         }
 
-        self.dockerbridge = self.docker_client.networks.create(
-            self.network, driver='macvlan', ipam=ipam_config, options=opts)
+        # The label of the run lets the teardown remove all networks of the run at once.
+        self.journal.record('network', self.network)
+        self.dockerbridge = executor.docker(
+            self.name, 'networks.create ' + self.network, self.docker_client.networks.create,
+            self.network, driver='macvlan', ipam=ipam_config, options=opts,
+            labels={'fie.run': self.journal.run_id})
 
-    def set_nat_rules(self):
-        """NAT rules setting inner host/namespace"""
+    def remove_bridge(self):
+        executor.docker(self.name, 'network.remove ' + self.network, self.dockerbridge.remove)
+
+    def nat_rules(self, action='-A'):
+        """NAT rules inner host/namespace, action is -A for append or -D for delete"""
         rules = []
 
         # Postroute
-        rules.append('iptables -t nat -A POSTROUTING -o ' +
+        rules.append('iptables -t nat ' + action + ' POSTROUTING -o ' +
                      self.name + '-eth0 -j MASQUERADE')
 
         # Conn
-        rules.append('iptables -A FORWARD -i ' + self.name + '-eth0 -o ' +
+        rules.append('iptables ' + action + ' FORWARD -i ' + self.name + '-eth0 -o ' +
                      self.name + '-eth1 -m state --state RELATED,ESTABLISHED -j ACCEPT')
 
         # Accept
-        rules.append('iptables -A FORWARD -i ' + self.name +
+        rules.append('iptables ' + action + ' FORWARD -i ' + self.name +
                      '-eth1 -o ' + self.name + '-eth0 -j ACCEPT')
 
-        for rule in rules:
+        return rules
+
+    def set_nat_rules(self):
+        """NAT rules setting inner host/namespace"""
+        for rule in self.nat_rules():
             self.cmd(rule)
 
+    def teardown(self):
+        """
+        Roll back the internal network of a (partially) built abstraction node.
+        Safe to call at any point, only the created parts are removed.
+        """
+        if self.dockerbridge is not None:
+            try:
+                self.remove_bridge()
+            except docker.errors.APIError:
+                pass
+            self.dockerbridge = None
+            self.journal.forget('network', self.network)
+
+        if self.veth:
+            for rule in self.nat_rules(action='-D'):
+                self.cmd(rule + ' 2>/dev/null')
+            self.release_link()
+            self.link.commit()
+
+    def release_link(self):
+        """Queue the removal of the veth pair in the link backend"""
+        if self.veth:
+            # Deleting one end of the veth pair removes its peer as well.
+            self.link.del_link(self.name + '-dport')
+            self.journal.forget('link', self.name + '-dport')
+            self.veth = False
+
     """
     Containers management here, have some functions.
         1. Run a container
@@ -150,31 +239,183 @@ class AbstractionNode():
         3. Destroy all containers
     """
 
+    def next_count(self):
+        """Reserve a number for naming a container, unique even with concurrent runs"""
+        with self.lock:
+            count = self.counter
+            self.counter += 1
+            return count
+
     def run(self, image, **params):
-        """Run a container and add information into the lists keep from abstraction node"""
+        """Run a container and add information into the lists keep from abstraction node, return the container"""
+
+        if self.static_ip and params.get('ip') is None:
+            params['ip'] = self.addresses.allocate()
 
         # Create a class of container
         c = Container(docker_client=self.docker_client, image=image, cg_parent=self.cg,
-                      network=self.network, name_parent=self.name, count=len(self.container_list), **params)
-        c.run()
-        self.container_list.append(c)
-        self.pid_list.append(c.log_pid)
+                      network=self.network, name_parent=self.name, count=self.next_count(),
+                      state=self.state, **params)
+        self.launch(c)
+        return c
 
     def dry_run(self, container):
         container.cg_parent = self.cg
         container.network = self.network
         container.name_parent = self.name
-        container.count = len(self.container_list)
-        container.run()
-        self.container_list.append(container)
-        self.pid_list.append(container.log_pid)
+        container.count = self.next_count()
+        container.state = self.state
+        # The address of another node is not routable here.
+        container.ip = self.addresses.allocate() if self.static_ip else None
+        self.launch(container)
+
+    def launch(self, container):
+        """
+        Run a container and attach it, journaled ahead so a crash in between never leaks it.
+        On failure, the container docker created for this call is removed and the address is returned.
+        """
+        entry = self.index.get(container.name)
+        # A migrated container keeps its entry until it runs on this node.
+        if entry is not None and entry[1] is not container:
+            self.release_ip(container)
+            raise ValueError('container name %s is in use on %s' % (container.name, entry[0].name))
+        self.journal.record('container', container.name)
+        self.use_dns(container)
+        self.use_cpus(container)
+        try:
+            self.use_budget(container)
+        except Exception:
+            self.journal.forget('container', container.name)
+            self.release_ip(container)
+            self.release_cpus(container)
+            raise
+        try:
+            container.run()
+        except Exception:
+            # The cleanup may raise and handle errors of its own, which replace the current one on python 2.
+            exc_info = sys.exc_info()
+            if container.id is not None:
+                try:
+                    executor.docker(self.name, 'remove_container ' + container.name,
+                                    self.docker_client.api.remove_container, container.id, force=True)
+                except docker.errors.APIError:
+                    pass
+            self.journal.forget('container', container.name)
+            self.release_ip(container)
+            self.release_cpus(container)
+            self.release_budget(container)
+            six.reraise(*exc_info)
+        self.attach(container)
+
+    def use_dns(self, container):
+        """Point container at the name server of this node, unless it declares its own"""
+        if self.dns is not None and 'dns' not in container.template:
+            container.params = dict(container.params, dns=self.dns)
+
+    def use_cpus(self, container):
+        """Pin container on the least loaded cpus of this node, unless it declares its own cpuset"""
+        if self.cpuset is None or 'cpuset_cpus' in container.template:
+            return
+        cpus = self.cpuset.assign(container.name, cpuplace.demand(container.params))
+        params = dict(container.params, cpuset_cpus=cpuplace.format_cpus(cpus))
+        if self.cpuset.mems:
+            params['cpuset_mems'] = cpuplace.format_cpus(self.cpuset.mems)
+        container.params = params
+
+    def release_cpus(self, container):
+        if self.cpuset is not None:
+            self.cpuset.release(container.name)
+
+    def use_budget(self, container):
+        """Admit container in the budget of this node, its shares become its limits, raise BudgetError if it does not fit"""
+        changed = self.budget.admit(container.name, container.share, container.template)
+        container.params = dict(container.params, **self.budget.limits(container.name))
+        self.rebalance(changed)
+
+    def release_budget(self, container):
+        self.rebalance(self.budget.release(container.name))
+
+    def rebalance(self, names):
+        """Update the cpu limits of the running containers whose grant changed"""
+        for name in names:
+            c = self.lookup(name)
+            if c is None or c.container is None:
+                continue
+            limits = self.budget.limits(name)
+            c.params = dict(c.params, **limits)
+            try:
+                executor.docker(self.name, 'update ' + name, c.container.update,
+                                cpu_quota=limits['cpu_quota'], cpu_period=limits['cpu_period'])
+            except docker.errors.APIError as e:
+                error('*** error: rebalance of %s: %s\n' % (name, e))
+
+    def attach(self, container):
+        """Keep a running container in the lists and place it on this node in the index"""
+        with self.lock:
+            self.container_list.append(container)
+            self.pid_list.append(container.pid)
+        self.index.put(self, container)
+
+    def detach(self, container, unindex=True):
+        """
+        Drop a container from the lists.
+        unindex=False keeps the index entry, for a migration which places it on another node.
+        """
+        with self.lock:
+            if container in self.container_list:
+                self.container_list.remove(container)
+            if container.pid in self.pid_list:
+                self.pid_list.remove(container.pid)
+        self.release_ip(container)
+        self.release_cpus(container)
+        self.release_budget(container)
+        self.journal.forget('container', container.name)
+        if unindex:
+            self.index.remove(container.name, node=self)
+
+    def release_ip(self, container):
+        """Return the static address of container to the ip pool, if it is taken from there"""
+        if container.ip is not None and self.addresses.owns(container.ip):
+            self.addresses.release(container.ip)
+
+    def lookup(self, name):
+        """Return the container of name on this node, or None"""
+        entry = self.index.get(name)
+        if entry is None or entry[0] is not self:
+            return None
+        return entry[1]
+
+    def run_many(self, specs, workers=4):
+        """
+        Run containers concurrently, specs are the keyword arguments of run, including image.
+        Return a list of results in the order of specs, see run_spec.
+        """
+        return [result for _, result, _ in parallel_map(self.run_spec, specs, workers)]
+
+    def run_spec(self, spec):
+        """
+        Run a container from spec and never raise,
+        return a dictionary of node, name, elapsed seconds, error and the container.
+        """
+        params = dict(spec)
+        result = {'node': self.name, 'name': params.get('name'),
+                  'elapsed': 0.0, 'error': None, 'container': None}
+        start = time.time()
+        try:
+            c = self.run(**params)
+            result['name'] = c.name
+            result['container'] = c
+        except Exception as e:
+            result['error'] = str(e)
+        result['elapsed'] = time.time() - start
+        return result
 
     def stop(self, container):
-        """Destroy specific container"""
-        for c in self.container_list:
-            if c.name == container:
-                c.stop()
-                return "Successful stop container : " + c.name
+        """Stop specific container"""
+        c = self.lookup(container)
+        if c is not None:
+            c.stop()
+            return "Successful stop container : " + c.name
         return "The target container to stop doesn't exist!"
 
     # Stop all
@@ -186,24 +427,35 @@ class AbstractionNode():
 
     def destroy(self, container):
         """Destroy specific container"""
-        for c in self.container_list:
-            if c.name == container:
-                c.destroy()
-                self.container_list.remove(c)
-                return "Successful destory container : " + c.name
+        c = self.lookup(container)
+        if c is not None:
+            c.destroy()
+            self.detach(c)
+            return "Successful destory container : " + c.name
         return "The target container to destroy doesn't exist!"
 
     # Destroy all
-    def destroyall(self):
-        """Checkout all containers in container_list and remove all of them"""
-        for c in self.container_list:
+    def destroyall(self, workers=8):
+        """Checkout all containers in container_list and remove all of them, at most workers at once"""
+        def remove(c):
             c.destroy()
-        self.dockerbridge.remove()
+            self.detach(c)
+
+        for c, _, err in parallel_map(remove, list(self.container_list), workers):
+            if err is not None:
+                error('*** Failed to remove container %s:\n%s\n' % (c.name, err))
+        self.remove_bridge()
+        self.dockerbridge = None
+        self.journal.forget('network', self.network)
 
     # Set static route
-    def route(self, host):
-        """Set static route to a specific container subnet"""
-        dest_ip = host.ip_pool.split('/')[0]
+    def route(self, host, commit=True):
+        """
+        Set static route to a specific container subnet.
+        commit=False keeps it queued in the link backend for a later batch.
+        """
         dest_gw = host.head_node.IP(host.name+'-eth0')
-        self.cmd('route add -net ' + dest_ip + ' netmask 255.255.255.0 gw ' +
-                 dest_gw + ' dev ' + self.name + '-eth0')
+        self.link.add_route(host.ip_pool, dest_gw,
+                            self.name + '-eth0', self.head_node)
+        if commit:
+            self.link.commit()
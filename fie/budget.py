@@ -0,0 +1,199 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Resource budgets of abstraction nodes: the cpu, memory and io a host is granted by RSLimitedHost.config,
+shared by the containers run inside its cgroup.
+A container asks for shares of the node instead of absolute numbers,
+
+    fog0.run('busybox', share={'cpu': 0.25, 'mem': 0.5})
+    fog0.run('busybox', share=0.25)
+
+converted into its cgroup limits under the node, and the absolute limits (cpu_quota, nano_cpus, mem_limit)
+are counted against the same budget. A container which does not fit is rejected with BudgetError,
+or with the rebalance policy, the cpu shares are scaled down to make room. Memory and io throttles cannot be
+taken back from running containers, they are always rejected on overcommit.
+"""
+
+import os
+from threading import Lock
+from docker.utils import parse_bytes
+from mininet.util import numCores
+
+RESOURCES = ('cpu', 'mem', 'io')
+POLICIES = ('reject', 'rebalance')
+# The io throttles of RSLimitedHost.config, "major:minor rate" strings, and their docker parameters.
+THROTTLES = ('device_read_bps', 'device_write_bps', 'device_read_iops', 'device_write_iops')
+# The smallest limits docker accepts.
+MIN_QUOTA = 1000
+MIN_MEM = 6 * 1024 * 1024
+# Shares are summed up in floats.
+EPSILON = 1e-9
+
+
+class BudgetError(Exception):
+    """Raised when a container does not fit in the budget left on its abstraction node"""
+
+
+def device(major_minor):
+    """The device node of a block device number, e.g. 8:0 is /dev/sda"""
+    return '/dev/' + os.path.basename(os.path.realpath('/sys/dev/block/' + major_minor))
+
+
+class Budget(object):
+    """
+    The budget of an abstraction node: cpus, memory in bytes (None if unlimited),
+    the io throttles (parameter -> (major:minor, rate)) and the weight of io.
+    policy is what happens on overcommit, reject or rebalance.
+    """
+
+    def __init__(self, cpus, mem=None, throttles=None, period=100000, policy='reject'):
+        if policy not in POLICIES:
+            raise ValueError('unknown overcommit policy: %s' % policy)
+        self.cpus = cpus
+        self.mem = mem
+        self.throttles = throttles or {}
+        self.period = period
+        self.policy = policy
+        self.lock = Lock()
+        # container name -> {resource: (fraction of the node, relative)}
+        self.requests = {}
+        # container name -> {resource: fraction granted}, below the request when rebalanced
+        self.granted = {}
+
+    @classmethod
+    def of(cls, host, policy='reject'):
+        """The budget granted to a host by its configuration, the whole machine if unlimited"""
+        params = getattr(host, 'params', {})
+        cpu = params.get('cpu')
+        cpus = cpu * numCores() if cpu is not None and cpu > 0 else float(numCores())
+        mem = params.get('mem') * 1024 * 1024 if params.get('mem') else None
+        throttles = {}
+        for name in THROTTLES:
+            if params.get(name):
+                major_minor, rate = params[name].split()
+                throttles[name] = (major_minor, int(rate))
+        return cls(cpus, mem, throttles, getattr(host, 'period_us', 100000), policy)
+
+    def request(self, share, params):
+        """The fractions of the node a container asks for, as resource -> (fraction, relative)"""
+        if share is None:
+            share = {}
+        elif not isinstance(share, dict):
+            # One share of every resource the node has a budget of.
+            share = dict((r, share) for r in RESOURCES
+                         if r == 'cpu' or (r == 'mem' and self.mem) or (r == 'io' and self.throttles))
+        unknown = set(share) - set(RESOURCES)
+        if unknown:
+            raise ValueError('unknown resources: %s' % ', '.join(sorted(unknown)))
+        result = {}
+        for resource, fraction in share.items():
+            if not 0 < fraction <= 1:
+                raise ValueError('the %s share must be in (0, 1], got %s' % (resource, fraction))
+            if resource == 'mem' and not self.mem:
+                raise ValueError('the node has no memory limit to take a share of')
+            if resource == 'io' and not self.throttles:
+                raise ValueError('the node has no io throttle to take a share of')
+            result[resource] = (float(fraction), True)
+
+        # The absolute limits count as well.
+        cpus = None
+        if params.get('nano_cpus'):
+            cpus = params['nano_cpus'] / 1e9
+        elif params.get('cpu_quota') and params['cpu_quota'] > 0:
+            cpus = float(params['cpu_quota']) / (params.get('cpu_period') or 100000)
+        if cpus is not None:
+            if 'cpu' in result:
+                raise ValueError('a cpu share along with an absolute cpu limit')
+            result['cpu'] = (cpus / self.cpus, False)
+        if params.get('mem_limit') and self.mem:
+            if 'mem' in result:
+                raise ValueError('a memory share along with an absolute memory limit')
+            result['mem'] = (float(parse_bytes(params['mem_limit'])) / self.mem, False)
+        return result
+
+    def admit(self, name, share, params):
+        """
+        Admit a container, raise BudgetError if it does not fit.
+        Return the names of the other containers whose cpu grant changed by a rebalance.
+        A container admitted already keeps its grant.
+        """
+        with self.lock:
+            if name in self.requests:
+                return []
+            request = self.request(share, params)
+            requests = dict(self.requests)
+            requests[name] = request
+            granted = dict((n, dict(g)) for n, g in self.granted.items())
+            granted[name] = dict((r, fraction) for r, (fraction, _) in request.items())
+            for resource in request:
+                members = [(n, requests[n][resource]) for n in requests if resource in requests[n]]
+                fixed = sum(f for _, (f, relative) in members if not relative)
+                relative = sum(f for _, (f, rel) in members if rel)
+                if fixed + relative <= 1 + EPSILON:
+                    # Back to the requests, a rebalance is undone as containers leave.
+                    for n, (f, _) in members:
+                        granted[n][resource] = f
+                    continue
+                if resource != 'cpu' or self.policy != 'rebalance' or fixed >= 1 or relative == 0:
+                    raise BudgetError('%s does not fit: %.0f%% of the %s of the node requested, %.0f%% left' %
+                                      (name, request[resource][0] * 100, resource,
+                                       max(0.0, 1 - fixed - relative + request[resource][0]) * 100))
+                scale = (1 - fixed) / relative
+                for n, (f, rel) in members:
+                    granted[n][resource] = f * scale if rel else f
+            changed = [n for n in self.granted if self.granted[n] != granted[n]]
+            self.requests, self.granted = requests, granted
+            return changed
+
+    def release(self, name):
+        """
+        Give the budget of a container back, the rebalanced cpu shares grow back towards their requests.
+        Return the names of the containers whose cpu grant changed.
+        """
+        with self.lock:
+            if self.requests.pop(name, None) is None:
+                return []
+            self.granted.pop(name, None)
+            members = [(n, r['cpu']) for n, r in self.requests.items() if 'cpu' in r]
+            fixed = sum(f for _, (f, relative) in members if not relative)
+            relative = sum(f for _, (f, rel) in members if rel)
+            scale = 1.0 if fixed + relative <= 1 + EPSILON or relative == 0 else (1 - fixed) / relative
+            changed = []
+            for n, (f, rel) in members:
+                fraction = f * scale if rel else f
+                if abs(self.granted[n]['cpu'] - fraction) > EPSILON:
+                    self.granted[n]['cpu'] = fraction
+                    changed.append(n)
+            return changed
+
+    def limits(self, name):
+        """The docker limits of the relative shares granted to a container"""
+        with self.lock:
+            request, granted = self.requests.get(name, {}), self.granted.get(name, {})
+            limits = {}
+            for resource, (_, relative) in request.items():
+                if not relative:
+                    continue
+                fraction = granted[resource]
+                if resource == 'cpu':
+                    limits['cpu_period'] = self.period
+                    limits['cpu_quota'] = max(MIN_QUOTA, int(fraction * self.cpus * self.period))
+                elif resource == 'mem':
+                    limits['mem_limit'] = max(MIN_MEM, int(fraction * self.mem))
+                elif resource == 'io':
+                    # The weight among the containers of the node, along with the throttles.
+                    limits['blkio_weight'] = min(1000, max(10, int(round(fraction * 1000))))
+                    for param, (major_minor, rate) in self.throttles.items():
+                        limits[param] = [{'Path': device(major_minor), 'Rate': max(1, int(fraction * rate))}]
+            return limits
+
+    def usage(self):
+        """Resource -> fraction of the node granted to containers"""
+        with self.lock:
+            return dict((r, sum((g.get(r, 0.0) for g in self.granted.values()), 0.0)) for r in RESOURCES)
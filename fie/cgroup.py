@@ -0,0 +1,239 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Cgroup backends writing the cgroupfs files directly, instead of spawning cgcreate, cgset and cgget.
+Parameters are named in the cgroup v1 form, resource.param, e.g. cpu.cfs_quota_us,
+the v2 backend translates them into cpu.max, memory.max, io.max and friends.
+"""
+
+import errno
+import os
+from mininet.log import error, debug
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def detect(root=CGROUP_ROOT):
+    """Return the backend of the mounted hierarchy, v2 if unified"""
+    if os.path.exists(os.path.join(root, 'cgroup.controllers')):
+        return CgroupV2(root)
+    return CgroupV1(root)
+
+
+def write(path, value):
+    with open(path, 'w') as f:
+        f.write(str(value))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+class CgroupV1(object):
+    """One hierarchy per controller, as mounted in /proc/mounts"""
+
+    version = 1
+    controllers = ('cpu', 'cpuacct', 'cpuset', 'memory', 'blkio')
+
+    def __init__(self, root=CGROUP_ROOT):
+        self.root = root
+        self.mounts = self.find_mounts()
+
+    def find_mounts(self):
+        """Map controllers to mount points, co-mounted ones such as cpu,cpuacct share one"""
+        mounts = {}
+        try:
+            with open('/proc/mounts') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 4 or fields[2] != 'cgroup':
+                        continue
+                    for option in fields[3].split(','):
+                        if option in self.controllers:
+                            mounts[option] = fields[1]
+        except IOError:
+            pass
+        for controller in self.controllers:
+            mounts.setdefault(controller, os.path.join(self.root, controller))
+        return mounts
+
+    def path(self, resource, group, filename=None):
+        path = os.path.join(self.mounts[resource], group.lstrip('/'))
+        return path if filename is None else os.path.join(path, filename)
+
+    def create(self, group):
+        """Create the group in every hierarchy"""
+        for mount in set(self.mounts.values()):
+            path = os.path.join(mount, group.lstrip('/'))
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        # An empty cpuset accepts no task, inherit the one of the parent.
+        for param in ('cpus', 'mems'):
+            path = self.path('cpuset', group, 'cpuset.' + param)
+            if not read(path):
+                write(path, read(os.path.join(os.path.dirname(os.path.dirname(path)), 'cpuset.' + param)))
+
+    def classify(self, group, pid):
+        """Move a process into the group"""
+        for mount in set(self.mounts[c] for c in self.controllers):
+            write(os.path.join(mount, group.lstrip('/'), 'tasks'), pid)
+
+    def remove(self, group):
+        """Remove the group and its children, they must have no task left"""
+        for mount in set(self.mounts.values()):
+            top = os.path.join(mount, group.lstrip('/'))
+            for path, _, _ in list(os.walk(top, topdown=False)):
+                try:
+                    os.rmdir(path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+
+    def files(self, group, resource, param, value):
+        """The (file, value) writes of a parameter"""
+        return [(self.path(resource, group, resource + '.' + param), value)]
+
+    def apply(self, group, settings):
+        """
+        Write settings, a list of (resource, param, value), in one pass.
+        Return a list of (resource.param, error) of the failed ones.
+        """
+        failures = []
+        for resource, param, value in settings:
+            value = str(value).strip('"')
+            for path, content in self.files(group, resource, param, value):
+                try:
+                    write(path, content)
+                except (IOError, OSError) as e:
+                    failures.append((resource + '.' + param, e))
+                    error('*** error: cgroup %s: %s=%s: %s\n' %
+                          (group, os.path.basename(path), content, e.strerror))
+        return failures
+
+    def get(self, group, resource, param):
+        """Read a parameter"""
+        return read(self.path(resource, group, resource + '.' + param))
+
+    def stat(self, group, resource, filename):
+        """The path of a statistics file, e.g. cpuacct.usage"""
+        return self.path(resource, group, filename)
+
+
+class CgroupV2(CgroupV1):
+    """
+    The unified hierarchy.
+    The processes of a group live in its leaf child 'head', since a group with enabled
+    controllers cannot hold processes itself, and the containers are its children too.
+    """
+
+    version = 2
+    controllers = ('cpu', 'cpuset', 'memory', 'io')
+    leaf = 'head'
+
+    # blkio throttle parameters and their io.max keys
+    throttles = {'throttle.read_bps_device': 'rbps', 'throttle.write_bps_device': 'wbps',
+                 'throttle.read_iops_device': 'riops', 'throttle.write_iops_device': 'wiops'}
+
+    def __init__(self, root=CGROUP_ROOT):
+        self.root = root
+        # group -> [quota, period] of cpu.max, written together
+        self.cpu_max = {}
+        # group -> memory limit, memsw is translated into swap on top of it
+        self.mem_max = {}
+
+    def path(self, resource, group, filename=None):
+        path = os.path.join(self.root, group.lstrip('/'))
+        return path if filename is None else os.path.join(path, filename)
+
+    def enable(self, path):
+        """Enable the controllers for the children of path"""
+        available = read(os.path.join(path, 'cgroup.controllers')).split()
+        wanted = ' '.join('+' + c for c in self.controllers if c in available)
+        if wanted:
+            write(os.path.join(path, 'cgroup.subtree_control'), wanted)
+
+    def create(self, group):
+        """Create the group and its leaf, with controllers enabled down to the containers"""
+        path = self.path(None, group)
+        leaf = os.path.join(path, self.leaf)
+        if not os.path.isdir(leaf):
+            os.makedirs(leaf)
+        # Every ancestor has to delegate the controllers.
+        parts = group.strip('/').split('/')
+        for i in range(len(parts) + 1):
+            self.enable(os.path.join(self.root, *parts[:i]))
+
+    def classify(self, group, pid):
+        write(os.path.join(self.path(None, group), self.leaf, 'cgroup.procs'), pid)
+
+    def remove(self, group):
+        top = self.path(None, group)
+        for path, _, _ in list(os.walk(top, topdown=False)):
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+        self.cpu_max.pop(group, None)
+        self.mem_max.pop(group, None)
+
+    def files(self, group, resource, param, value):
+        path = lambda filename: self.path(None, group, filename)
+        key = resource + '.' + param
+
+        if key in ('cpu.cfs_quota_us', 'cpu.cfs_period_us'):
+            quota_period = self.cpu_max.setdefault(group, ['max', '100000'])
+            if key == 'cpu.cfs_period_us':
+                quota_period[1] = value
+            else:
+                quota_period[0] = 'max' if int(value) < 0 else value
+            return [(path('cpu.max'), ' '.join(quota_period))]
+        if key == 'cpu.shares':
+            # The v1 range 2..262144 mapped onto 1..10000
+            return [(path('cpu.weight'), 1 + (int(value) - 2) * 9999 // 262142)]
+        if key in ('cpuset.cpus', 'cpuset.mems'):
+            return [(path(key), value)]
+        if key == 'memory.limit_in_bytes':
+            self.mem_max[group] = int(value)
+            return [(path('memory.max'), value)]
+        if key == 'memory.memsw.limit_in_bytes':
+            swap = int(value) - self.mem_max.get(group, 0)
+            return [(path('memory.swap.max'), max(swap, 0))]
+        if resource == 'blkio':
+            if param in self.throttles:
+                device, rate = value.split()
+                return [(path('io.max'), '%s %s=%s' % (device, self.throttles[param], rate))]
+            if param == 'weight':
+                # The v1 range 10..1000 mapped onto 100..10000
+                return [(path('io.weight'), 'default %d' % (int(value) * 10))]
+            if param == 'weight_device':
+                device, weight = value.split()
+                return [(path('io.weight'), '%s %d' % (device, int(weight) * 10))]
+
+        # swappiness, oom_control and rt scheduling have no v2 counterpart.
+        debug('*** cgroup v2 has no counterpart of %s, skipped\n' % key)
+        return []
+
+    def get(self, group, resource, param):
+        key = resource + '.' + param
+        if key in ('cpu.cfs_quota_us', 'cpu.cfs_period_us'):
+            quota, period = read(self.path(None, group, 'cpu.max')).split()
+            if key == 'cpu.cfs_period_us':
+                return period
+            return '-1' if quota == 'max' else quota
+        if key == 'memory.limit_in_bytes':
+            value = read(self.path(None, group, 'memory.max'))
+            return '-1' if value == 'max' else value
+        if key in ('cpuset.cpus', 'cpuset.mems'):
+            return read(self.path(None, group, key))
+        return None
+
+    def stat(self, group, resource, filename):
+        return self.path(None, group, filename)
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Reap the resources left by a killed emulation, in one pass:
+containers are removed concurrently, then docker networks, then links in one ip batch.
+Besides the journal, the netns-* docker networks and their containers are reaped as well,
+they are left by runs without a journal too. Run scripts/cleanup.sh, then `mn -c` for mininet itself.
+"""
+
+import argparse
+import docker
+from mininet.log import info, error, setLogLevel
+from journal import Journal, JOURNAL
+from linkbackend import BatchBackend
+from utils import parallel_map
+import dockerpool
+import executor
+
+
+def stale_networks(client):
+    """Names of the docker networks of abstraction nodes, a name filter matches substrings"""
+    return [n['Name'] for n in client.api.networks(names=['netns-'])
+            if n['Name'].startswith('netns-')]
+
+
+def cleanup(path=JOURNAL, stale=True, workers=8, docker_client=None):
+    """Reap the resources in the journal, return the number of containers, networks and links removed"""
+    client = docker_client or dockerpool.client(connections=workers)
+    journal = Journal(path)
+    entries = journal.entries()
+
+    containers = [e['name'] for e in entries if e['kind'] == 'container']
+    networks = [e['name'] for e in entries if e['kind'] == 'network']
+    links = [e['name'] for e in entries if e['kind'] == 'link']
+
+    if stale:
+        for name in stale_networks(client):
+            if name not in networks:
+                networks.append(name)
+        # One listing covers the containers still attached to the networks.
+        for c in client.api.containers(all=True):
+            attached = c.get('NetworkSettings', {}).get('Networks', {})
+            name = c['Names'][0].lstrip('/')
+            if any(net in networks for net in attached) and name not in containers:
+                containers.append(name)
+
+    def remove_container(name):
+        try:
+            executor.docker(None, 'remove_container ' + name,
+                            client.api.remove_container, name, force=True)
+        except docker.errors.NotFound:
+            pass
+
+    def remove_network(name):
+        try:
+            executor.docker(None, 'remove_network ' + name, client.api.remove_network, name)
+        except docker.errors.NotFound:
+            pass
+
+    failed = 0
+    for remove, names in ((remove_container, containers), (remove_network, networks)):
+        for name, _, err in parallel_map(remove, names, workers):
+            if err is not None:
+                failed += 1
+                error('*** Failed to remove %s:\n%s\n' % (name, err))
+
+    # Missing links are skipped by the forced batch.
+    link = BatchBackend()
+    for dev in links:
+        link.del_link(dev)
+    link.commit()
+
+    if failed == 0:
+        journal.clear()
+    return len(containers), len(networks), len(links)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Reap the resources left by a killed fie emulation.')
+    parser.add_argument('--journal', default=JOURNAL,
+                        help='path of the journal, default ' + JOURNAL)
+    parser.add_argument('--no-stale', dest='stale', action='store_false',
+                        help='only reap what is in the journal')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='concurrent docker removals')
+    args = parser.parse_args()
+
+    setLogLevel('info')
+    counts = cleanup(args.journal, args.stale, args.workers)
+    info('*** Removed %d containers, %d networks, %d links\n' % counts)
@@ -11,11 +11,13 @@ This file is inherit from mininet/cli.py
 """
 
 from mininet.cli import CLI
-from fie import FIE
 import sys
 from cmd import Cmd
 from subprocess import call
-from copy import copy
+import time
+import telemetry
+import shaping
+import linkstats
 
 
 class FCLI(CLI):
@@ -36,51 +38,156 @@ class FCLI(CLI):
         """Top for perf monitoring"""
         self.do_sh("top")
 
+    def do_stats(self, _line):
+        """
+        Refreshing table of cpu, throttling, memory and block io usage of abstraction nodes and containers.
+        stats [refresh seconds] [count], stop it with ctrl-c.
+        The usage is read from the telemetry sampler, started if it is not running.
+        """
+        try:
+            args = _line.split()
+            refresh = float(args[0]) if args else 1.0
+            count = int(args[1]) if len(args) > 1 else None
+        except ValueError:
+            print("invalid arguments, expect stats [refresh seconds] [count]")
+            return
+        sampler = self._fie.sampler
+        if sampler is None or not sampler.running():
+            sampler = self._fie.startTelemetry()
+            # Rates need two samples.
+            time.sleep(sampler.interval * 2)
+        try:
+            while count is None or count > 0:
+                # Clear the screen and move home, then draw.
+                sys.stdout.write('\033[H\033[J' + telemetry.table(sampler, refresh) + '\n')
+                sys.stdout.flush()
+                if count is not None:
+                    count -= 1
+                    if count == 0:
+                        break
+                time.sleep(refresh)
+        except KeyboardInterrupt:
+            print('')
+
+    def do_links(self, _line):
+        """
+        Traffic, drops and queues of the link interfaces over the latest window, the busiest first.
+        links [window seconds] [count]
+        The counters are read from the link sampler, started if it is not running.
+        """
+        try:
+            args = _line.split()
+            window = float(args[0]) if args else 1.0
+            count = int(args[1]) if len(args) > 1 else None
+        except ValueError:
+            print("invalid arguments, expect links [window seconds] [count]")
+            return
+        sampler = self._fie.linkSampler
+        if sampler is None or not sampler.running():
+            sampler = self._fie.startLinkTelemetry()
+            # Rates need two samples.
+            time.sleep(sampler.interval * 2)
+        print(linkstats.table(sampler, window, count))
+
+    def do_shape(self, _line):
+        """
+        Replay link traces, see shaping.py.
+        shape <trace.csv> [loop]: start the replay
+        shape stop [export.csv]: stop it, export the applied updates if a path is given
+        shape: the drift of the applied updates
+        """
+        try:
+            args = _line.split()
+            if not args:
+                if self._fie.shaper is None:
+                    print("no trace replayed")
+                    return
+                drift = self._fie.shaper.drift()
+                print(' '.join('%s=%s' % (k, '%.2fms' % (v * 1000) if isinstance(v, float) else v)
+                               for k, v in sorted(drift.items())))
+            elif args[0] == 'stop':
+                self._fie.stopShaping(args[1] if len(args) > 1 else None)
+            else:
+                traces = shaping.load(args[0])
+                shaper = self._fie.startShaping(traces, loop=len(args) > 1 and args[1] == 'loop')
+                print("replaying %d updates on %d interfaces" % (len(shaper.events), len(shaper.interfaces)))
+        except (IOError, KeyError, ValueError) as e:
+            print("invalid arguments, expect shape [<trace.csv> [loop] | stop [export.csv]]")
+            print(e)
+        except Exception as e:
+            print("internal error occurred.")
+            print(e)
+
+    def do_profile(self, _line):
+        """
+        The slowest external operations, i.e. commands, ip batches, docker and cgroup calls.
+        profile [count] [phase], e.g. profile 10 init
+        """
+        try:
+            args = _line.split()
+            count = int(args[0]) if args else 20
+            phase = args[1] if len(args) > 1 else None
+            print(self._fie.profile(count, phase))
+        except ValueError as e:
+            print("invalid arguments, expect profile [count] [phase]")
+            print(e)
+
     def do_clear(self, _line):
         """Clear the terminal"""
         self.do_sh("clear")
 
     def do_migrate(self, _line):
         """
-        Migrate container to dst node.
-        migrate <container> <dst_node>
+        Migrate container to dst node, and report the downtime.
+        migrate <container> <dst_node> [cold|live|live-noprecopy]
+        cold restarts the container, live checkpoints and restores it with its memory.
         """
         try:
-            args = _line.split(' ')
+            args = _line.split()
             container = args[0]
             dst_node = args[1]
-            for node in self._fie.absnode_map:
-                for c in self._fie.absnode_map[node].container_list:
-                    if c.name == container:
-                        self._fie.absnode_map[node].container_list.remove(c)
-                        c.destroy()
-                        # do migration
-                        self._fie.node(dst_node).dry_run(c)
-        except:
-            print("invalid arguments, expect migrate <container> <dst_node>")
+            mode = args[2] if len(args) > 2 else 'cold'
+            # do migration
+            report = self._fie.migrate(container, dst_node, mode)
+            print("migrated %s from %s to %s (%s): downtime %.3fs, checkpoint %.3fs, restore %.3fs, total %.3fs" %
+                  (report['name'], report['src'], report['dst'], report['mode'], report['downtime'],
+                   report['checkpoint'], report['restore'], report['total']))
+            if report['error'] is not None:
+                print("migration error: " + report['error'])
+        except (IndexError, KeyError, ValueError) as e:
+            print("invalid arguments, expect migrate <container> <dst_node> [cold|live|live-noprecopy]")
+            print(e)
+        except Exception as e:
+            print("internal error occurred.")
+            print(e)
 
     def do_scale(self, _line):
         """
-        Scale one container to dst node.
-        scale <container> <container_new_name> <dst_node>
+        Scale the replicas of a container, created in parallel and spread over the nodes.
+        scale <container> <count> [<node[,node...]>] [name template]
+        The name template defaults to {name}-{i}, {name} in environment values is the replica name.
+        Scaling down removes the newest replicas first and needs no nodes.
         """
         try:
-            args = _line.split(' ')
+            args = _line.split()
             container = args[0]
-            new_container_name = args[1]
-            dst_node = args[2]
-            for node in self._fie.absnode_map:
-                for c in self._fie.absnode_map[node].container_list:
-                    if c.name == container:
-                        new_c = copy(c)
-                        new_c.params = copy(c.params)
-                        new_c.params['environment'] = {
-                            'CLUSTER_SEED_IP': 'controller.docker', 'CLUSTER_HOST_IP': new_container_name + '.docker'}
-                        new_c.name = new_container_name
-                        self._fie.node(dst_node).dry_run(new_c)
-        except Exception as e:
+            count = int(args[1])
+            nodes = args[2].split(',') if len(args) > 2 else None
+            template = args[3] if len(args) > 3 else '{name}-{i}'
+            start = time.time()
+            results = self._fie.scale(container, count, nodes, template)
+            failed = [r for r in results if r['error'] is not None]
+            print("%s: %d replicas, %d changed, %d failed in %.2fs" %
+                  (container, len(self._fie.replicas[container]), len(results) - len(failed),
+                   len(failed), time.time() - start))
+            for r in failed:
+                print("%s: %s" % (r['name'], r['error']))
+        except (IndexError, KeyError, ValueError) as e:
             print(
-                "invalid arguments, expect scale <container> <container_new_name> <dst_node>")
+                "invalid arguments, expect scale <container> <count> [<node[,node...]>] [name template]")
+            print(e)
+        except Exception as e:
+            print("internal error occurred.")
             print(e)
 
     def do_routeall(self, _line):
@@ -91,13 +198,13 @@ class FCLI(CLI):
 
     def do_ps(self, _line):
         """
-        Show all containers locate in where.
+        Show all containers locate in where, along with the cached status.
         """
         try:
             for node in self._fie.absnode_map:
                 sys.stdout.write(node + " - ")
                 for c in self._fie.absnode_map[node].container_list:
-                    sys.stdout.write(c.name + ' ')
+                    sys.stdout.write(c.name + '(' + c.status() + ') ')
                 print('')
         except Exception as e:
             print("internal error occurred.")
@@ -111,11 +218,9 @@ class FCLI(CLI):
         try:
             args = _line.split(' ')
             container = args[0]
-            for node in self._fie.absnode_map:
-                for c in self._fie.absnode_map[node].container_list:
-                    if c.name == container:
-                        self._fie.absnode_map[node].container_list.remove(c)
-                        c.destroy()
+            print(self._fie.destroy(container))
+        except KeyError as e:
+            print(e)
         except Exception as e:
             print("internal error occurred.")
             print(e)
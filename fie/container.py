@@ -6,43 +6,81 @@ Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependa
 Checkout the License for using, modifying and publishing.
 """
 
-from subprocess import call
-from subprocess import STDOUT, Popen, PIPE
 import os
 import docker
-import json
+import executor
+from docker.models.containers import _create_container_args
 
 """
 TODO: Use Docker python API instead of shell command for more options.
 """
 
 
+def render(params, name):
+    """Substitute {name} in the environment values of params with the container name"""
+    environment = params.get('environment')
+    if isinstance(environment, dict):
+        environment = dict((k, v.replace('{name}', name) if isinstance(v, (str, type(u''))) else v)
+                           for k, v in environment.items())
+    elif isinstance(environment, list):
+        environment = [v.replace('{name}', name) for v in environment]
+    else:
+        return params
+    return dict(params, environment=environment)
+
+
 class Container(object):
     """The declaration of container, important method, run, log_pid, destroy"""
 
-    def __init__(self, docker_client, image, cg_parent, network, name_parent, count, name, **params):
+    def __init__(self, docker_client, image, cg_parent, network, name_parent, count, name=None, state=None,
+                 ip=None, share=None, **params):
         self.docker_client = docker_client
+        # A static address in the network, docker IPAM assigns one if None.
+        self.ip = ip
+        # The shared state cache of Env, see state.py
+        self.state = state
         self.image = image
         self.cg_parent = cg_parent
         self.network = network
         # count represented as the numbers of abstraction node containers list, used for dealing with naming conflicts.
         self.name = name or name_parent + '-' + str(count)
         self.pid = None
-        self.params = params
+        # The params as declared, {name} in the environment is substituted per container.
+        self.template = params
+        self.params = render(params, self.name)
+        # The shares of the abstraction node asked for, see budget.py
+        self.share = share
+        # The id of the docker container once created by run, None before.
+        self.id = None
         self.container = None
 
     def run(self):
-        """Run a container"""
-        self.container = self.docker_client.containers.run(
-            image=self.image,
-            detach=True,
-            name=self.name,
-            network=self.network,
-            cgroup_parent=self.cg_parent,
-            **self.params
-        )
-        # CHECK THIS: if the pid appears soon after the container created?
-        # self.pid = self.log_pid()
+        """Create and start the container, its id is kept as soon as docker created it"""
+        try:
+            self.id = self.create()
+        except docker.errors.ImageNotFound:
+            # Pulled on demand as containers.run does, the images of a plan are prefetched, see images.py
+            executor.docker(self.node(), 'pull ' + self.image, self.docker_client.images.pull, self.image)
+            self.id = self.create()
+        executor.docker(self.node(), 'start ' + self.name, self.docker_client.api.start, self.id)
+        self.container = self.docker_client.containers.prepare_model({'Id': self.id})
+        # The pid appears along with the start event, which follows soon after the creation.
+        self.pid = self.log_pid()
+
+    def create(self, name=None):
+        """Create the container without starting it, under name if given, return its id"""
+        api = self.docker_client.api
+        kwargs = dict(self.params, image=self.image, detach=True, name=name or self.name,
+                      cgroup_parent=self.cg_parent, version=api._version)
+        create_kwargs = _create_container_args(kwargs)
+        create_kwargs['host_config']['NetworkMode'] = self.network
+        if self.ip is not None:
+            create_kwargs['networking_config'] = api.create_networking_config({
+                self.network: api.create_endpoint_config(ipv4_address=self.ip)
+            })
+        resp = executor.docker(self.node(), 'create_container ' + create_kwargs['name'],
+                               api.create_container, **create_kwargs)
+        return resp['Id']
 
     # TODO: Currently, this start is useless, we should find additonal way to let this container start parameters to available since abstraction node
     def start(self):
@@ -56,17 +94,30 @@ class Container(object):
             **self.params)
 
     def log_pid(self):
-        """Logs pid of container, return a string"""
-        p = Popen(['sudo', 'docker', 'inspect', self.name],
-                  stdin=PIPE, stdout=PIPE, stderr=PIPE)
-        output, _ = p.communicate((""))
-        inspect = json.loads(output)
-        return int(inspect[0]["State"]["Pid"])
+        """Logs pid of container, return an int"""
+        if self.state is not None:
+            return self.state.pid(self.name, self.id)
+        # Without the state cache, ask the daemon directly.
+        inspect = executor.docker(self.node(), 'inspect_container ' + self.name,
+                                  self.docker_client.api.inspect_container, self.id or self.name)
+        return int(inspect["State"]["Pid"])
+
+    def node(self):
+        """The name of the abstraction node of the container, its cgroup parent"""
+        return self.cg_parent.lstrip('/')
+
+    def status(self):
+        """The cached status of container, e.g. running, exited"""
+        if self.state is not None:
+            state = self.state.get(self.name)
+            if state is not None:
+                return state.status
+        return 'unknown'
 
     def stop(self):
         """Stop the running container"""
 
-        self.container.stop()
+        executor.docker(self.node(), 'stop ' + self.name, self.container.stop)
 
     def destroy(self):
         """Destroy the running container"""
@@ -74,4 +125,4 @@ class Container(object):
         # CONCERN: Do we really need the step of safe stop?
         # timeout 10 secs
         # self.container.stop()
-        self.container.remove(force=True)
+        executor.docker(self.node(), 'remove ' + self.name, self.container.remove, force=True)
@@ -0,0 +1,226 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+CPU placement of abstraction nodes and their containers.
+Every node gets a cpuset of its own, sized to its cpu share (the fraction of the machine of RSLimitedHost),
+taken within one NUMA node when it fits and in the order of physical cores, so hyperthread siblings go together.
+The nodes without a share run on the cpus left over.
+The cpuset of a node is then divided among its containers, each on the least loaded cpus of the node.
+
+    net = FIE(topo=topo, cpuPlacement=True)
+"""
+
+import itertools
+import os
+from threading import Lock
+from mininet.log import error, info
+
+SYSFS = '/sys/devices/system'
+
+
+def parse_cpus(cpulist):
+    """Parse a cpu list such as 0-3,8 into a list of numbers"""
+    cpus = []
+    for part in cpulist.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpus(cpus):
+    """Format numbers into a cpu list, e.g. [0, 1, 2, 3, 8] into 0-3,8"""
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else '%d-%d' % (a, b) for a, b in ranges)
+
+
+def read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+class Topology(object):
+    """
+    The online cpus of the machine grouped by NUMA node, numa node -> cpus in the order of
+    (package, core), so the threads of a core are adjacent.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    @classmethod
+    def detect(cls, root=SYSFS):
+        """Read the topology from sysfs, one NUMA node of every online cpu without it"""
+        online = read(os.path.join(root, 'cpu', 'online'))
+        cpus = parse_cpus(online) if online else list(range(os.sysconf('SC_NPROCESSORS_ONLN')))
+        numa = {}
+        directory = os.path.join(root, 'node')
+        if os.path.isdir(directory):
+            for entry in os.listdir(directory):
+                if entry.startswith('node') and entry[4:].isdigit():
+                    for cpu in parse_cpus(read(os.path.join(directory, entry, 'cpulist')) or ''):
+                        numa[cpu] = int(entry[4:])
+
+        def core(cpu):
+            topology = os.path.join(root, 'cpu', 'cpu%d' % cpu, 'topology')
+            package = read(os.path.join(topology, 'physical_package_id'))
+            core_id = read(os.path.join(topology, 'core_id'))
+            return (int(package or 0), int(core_id if core_id is not None else cpu), cpu)
+
+        nodes = {}
+        for cpu in sorted(cpus, key=core):
+            nodes.setdefault(numa.get(cpu, 0), []).append(cpu)
+        return cls(nodes)
+
+    def cpus(self):
+        return [cpu for node in sorted(self.nodes) for cpu in self.nodes[node]]
+
+    def mems(self, cpus):
+        """The NUMA nodes of cpus"""
+        cpus = set(cpus)
+        return sorted(node for node, members in self.nodes.items() if cpus & set(members))
+
+
+def sizes(shares, count):
+    """
+    The number of cpus of every share, a fraction of count cpus, at least one.
+    Shares summing up to more than the machine are scaled down to fit, by the largest remainders.
+    """
+    if len(shares) > count:
+        return dict((name, 1) for name in shares)
+    wanted = dict((name, max(1, int(round(share * count)))) for name, share in shares.items())
+    if sum(wanted.values()) <= count:
+        return wanted
+    total = float(sum(shares.values()))
+    exact = dict((name, share * count / total) for name, share in shares.items())
+    result = dict((name, max(1, int(value))) for name, value in exact.items())
+    for name in sorted(exact, key=lambda n: (-(exact[n] - int(exact[n])), n)):
+        if sum(result.values()) >= count:
+            break
+        result[name] += 1
+    # The minimum of one cpu may still overflow, taken back from the largest.
+    while sum(result.values()) > count:
+        largest = max(sorted(result), key=lambda n: result[n])
+        result[largest] -= 1
+    return result
+
+
+class Placement(object):
+    """Disjoint cpusets of abstraction nodes on a topology"""
+
+    def __init__(self, topology):
+        self.topology = topology
+        # name -> cpus
+        self.assigned = {}
+        # The cpus of the nodes without a share.
+        self.rest = topology.cpus()
+
+    def place(self, shares):
+        """
+        Assign cpusets, shares is a dictionary of name to the fraction of the machine, or None.
+        Return the dictionary of name to cpus.
+        """
+        total = len(self.topology.cpus())
+        sized = dict((name, share) for name, share in shares.items() if share is not None and share > 0)
+        counts = sizes(sized, total)
+        if sum(counts.values()) > total:
+            error('*** error: %d nodes with a cpu share on %d cpus, the cpusets overlap\n' %
+                  (len(counts), total))
+        elif sum(max(1, int(round(share * total))) for share in sized.values()) > total:
+            info('*** cpu shares exceed the %d cpus, the cpusets are scaled down\n' % total)
+
+        free = dict((node, list(cpus)) for node, cpus in self.topology.nodes.items())
+        # More nodes than cpus, the last ones share cpus round robin.
+        spill = itertools.cycle(self.topology.cpus())
+        assigned = {}
+        # The largest first, each in the NUMA node it fits best.
+        for name in sorted(counts, key=lambda n: (-counts[n], n)):
+            count = counts[name]
+            fits = [node for node in sorted(free) if len(free[node]) >= count]
+            if fits:
+                node = min(fits, key=lambda n: len(free[n]))
+                cpus, free[node] = free[node][:count], free[node][count:]
+            else:
+                # Spread over the nodes with the most free cpus.
+                cpus = []
+                for node in sorted(free, key=lambda n: -len(free[n])):
+                    taken = free[node][:count - len(cpus)]
+                    free[node] = free[node][len(taken):]
+                    cpus.extend(taken)
+                while len(cpus) < count:
+                    cpus.append(next(spill))
+            # In the order of cores, the containers take the threads of a core together.
+            assigned[name] = cpus
+
+        self.rest = sorted(cpu for cpus in free.values() for cpu in cpus) or self.topology.cpus()
+        for name in shares:
+            if name not in assigned:
+                assigned[name] = list(self.rest)
+        self.assigned = assigned
+        return assigned
+
+    def mems(self, cpus):
+        return self.topology.mems(cpus)
+
+
+class CpuSet(object):
+    """The cpus of an abstraction node, divided among its containers"""
+
+    def __init__(self, cpus, mems=None):
+        self.cpus = list(cpus)
+        self.mems = mems
+        # cpu -> number of containers on it
+        self.load = dict((cpu, 0) for cpu in self.cpus)
+        # container name -> cpus
+        self.containers = {}
+        # Containers are launched concurrently, see AbstractionNode.run_many.
+        self.lock = Lock()
+
+    def assign(self, name, count=1):
+        """The cpus of a container, the count least loaded ones, the same ones if it has some already"""
+        with self.lock:
+            if name in self.containers:
+                return self.containers[name]
+            count = max(1, min(count, len(self.cpus)))
+            order = dict((cpu, i) for i, cpu in enumerate(self.cpus))
+            cpus = sorted(sorted(self.cpus, key=lambda cpu: (self.load[cpu], order[cpu]))[:count])
+            for cpu in cpus:
+                self.load[cpu] += 1
+            self.containers[name] = cpus
+            return cpus
+
+    def release(self, name):
+        with self.lock:
+            for cpu in self.containers.pop(name, []):
+                self.load[cpu] -= 1
+
+    def __str__(self):
+        return format_cpus(self.cpus)
+
+
+def demand(params):
+    """The cpus a container asks for, from nano_cpus or its cfs quota, one by default"""
+    if params.get('nano_cpus'):
+        return -(-int(params['nano_cpus']) // 1000000000)
+    quota, period = params.get('cpu_quota'), params.get('cpu_period') or 100000
+    if quota and quota > 0:
+        return -(-int(quota) // int(period))
+    return 1
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Daemon mode: the emulated network is kept alive and served over a unix socket,
+experiment drivers attach, run their trials against the warm topology and detach.
+The protocol is one json object per line each way,
+    {"method": "migrate", "params": {"name": "analytics", "dst": "fog0"}}
+answered by {"result": ...} or {"error": "..."}.
+
+    from fie.daemon import Client
+    fie = Client()
+    fie.run(node='fog0', spec={'image': 'busybox', 'command': 'sleep 60'})
+"""
+
+import errno
+import json
+import os
+import signal
+import socket
+import sys
+import SocketServer
+from threading import Lock, Thread
+from mininet.log import info
+
+SOCKET = os.path.expanduser('~/.fie/fie.sock')
+
+
+def plain(result):
+    """A result of run_spec without the container object"""
+    return dict((k, v) for k, v in result.items() if k != 'container')
+
+
+class Service(object):
+    """The methods exposed over the socket, the ones changing the emulation are serialized"""
+
+    def __init__(self, net):
+        self.net = net
+        self.lock = Lock()
+
+    def ping(self):
+        return 'pong'
+
+    def nodes(self):
+        return sorted(self.net.absnode_map)
+
+    def ps(self):
+        """Node name -> containers with their cached status"""
+        return dict((name, [{'name': c.name, 'status': c.status(), 'ip': c.ip}
+                            for c in list(node.container_list)])
+                    for name, node in self.net.absnode_map.items())
+
+    def run(self, node, spec):
+        with self.lock:
+            return plain(self.net.node(node).run_spec(spec))
+
+    def deploy(self, plan, workers=8):
+        """plan is a list of [node name, spec]"""
+        with self.lock:
+            return [plain(r) for r in self.net.deploy([tuple(entry) for entry in plan], workers)]
+
+    def schedule(self, services, workers=8):
+        """services are the dictionaries of Scheduler, with probe specs"""
+        with self.lock:
+            return [plain(r) for r in self.net.schedule(services, workers)]
+
+    def destroy(self, name):
+        with self.lock:
+            return self.net.destroy(name)
+
+    def migrate(self, name, dst, mode='cold'):
+        with self.lock:
+            return self.net.migrate(name, dst, mode)
+
+    def scale(self, name, count, nodes=None, template='{name}-{i}'):
+        with self.lock:
+            return [plain(r) for r in self.net.scale(name, count, nodes, template)]
+
+    def limit(self, node, limits):
+        """Change the resource limits of a RSLimitedHost, e.g. {"cpu": 0.2, "mem": 256}"""
+        with self.lock:
+            return self.net.get(node).limit(**limits)
+
+    def budget(self, node):
+        """The resources of a node and the fractions of them granted to containers, see budget.py"""
+        b = self.net.node(node).budget
+        return {'cpus': b.cpus, 'mem': b.mem, 'policy': b.policy, 'granted': b.usage(),
+                'containers': dict((name, grant) for name, grant in b.granted.items())}
+
+    def route(self, remote=None):
+        """remote is a dictionary of node name to [ip pool, gateway] of other workers, see distributed.py"""
+        with self.lock:
+            self.net.routeAll(remote)
+
+    def stats(self, window=1.0):
+        """Series group -> usage over the latest window seconds along with its name, see Series.rates"""
+        sampler = self.net.sampler
+        if sampler is None or not sampler.running():
+            with self.lock:
+                if self.net.sampler is None or not self.net.sampler.running():
+                    self.net.startTelemetry()
+            sampler = self.net.sampler
+        return dict((group, dict(s.rates(window, sampler.interval) or {}, name=s.name, node=s.node, kind=s.kind))
+                    for group, s in sampler.latest().items())
+
+    def links(self, window=1.0):
+        """Interface name -> traffic over the latest window seconds, see LinkSeries.rates"""
+        sampler = self.net.linkSampler
+        if sampler is None or not sampler.running():
+            with self.lock:
+                if self.net.linkSampler is None or not self.net.linkSampler.running():
+                    self.net.startLinkTelemetry()
+            sampler = self.net.linkSampler
+        return dict((name, dict(s.rates(window, sampler.interval) or {}, node=s.node, link=s.link))
+                    for name, s in sampler.latest().items())
+
+    def profile(self, n=20, phase=None):
+        return self.net.profile(n, phase)
+
+
+class Handler(SocketServer.StreamRequestHandler):
+    """Serve the requests of one connection, until it is closed"""
+
+    def handle(self):
+        service = self.server.service
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                method = request['method']
+                if method == 'shutdown':
+                    # shutdown blocks until serve_forever returns, it cannot run in a handler.
+                    Thread(target=self.server.shutdown).start()
+                    response = {'result': None}
+                elif method.startswith('_') or not hasattr(service, method):
+                    response = {'error': 'no such method: %s' % method}
+                else:
+                    response = {'result': getattr(service, method)(**request.get('params', {}))}
+            except Exception as e:
+                response = {'error': '%s: %s' % (type(e).__name__, e)}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+class Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(net, path=SOCKET, service=None):
+    """
+    Serve the emulated network on the unix socket path, until a shutdown request or a signal.
+    service replaces the Service of net, e.g. the one of a distributed worker.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except socket.error as e:
+            if e.errno != errno.ECONNREFUSED:
+                raise
+            # Left by a killed daemon, nothing listens on it.
+            os.remove(path)
+        else:
+            raise socket.error(errno.EADDRINUSE, 'a daemon is already serving on ' + path)
+        finally:
+            probe.close()
+
+    server = Server(path, Handler)
+    server.service = service or Service(net)
+
+    # The callers tear the network down once serve returns.
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    except ValueError:
+        # Only the main thread handles signals.
+        pass
+
+    info('*** Serving on %s\n' % path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class RPCError(Exception):
+    """The error answered by the daemon"""
+
+
+class Client(object):
+    """
+    A connection to the daemon, the methods of Service are called as methods of the client,
+    e.g. client.migrate(name='analytics', dst='fog0').
+    """
+
+    def __init__(self, path=SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rwb')
+
+    def call(self, method, **params):
+        self.file.write((json.dumps({'method': method, 'params': params}) + '\n').encode())
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise RPCError('connection closed by the daemon')
+        response = json.loads(line)
+        if 'error' in response:
+            raise RPCError(response['error'])
+        return response['result']
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+        return lambda **params: self.call(method, **params)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
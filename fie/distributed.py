@@ -0,0 +1,517 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Distributed emulation: one topology sharded over worker processes, each an FIE with its own kernel share
+of hosts, switches and abstraction nodes, on this machine or on others.
+
+    from fie.distributed import Coordinator
+    net = Coordinator('topos:FogTopo', workers=4)
+    net.start()
+    net.run(node='fog0', spec={'image': 'busybox', 'command': 'sleep 60'})
+    net.migrate('analytics', 'cloud1')
+    net.stop()
+
+Every worker builds the topology itself, from the 'module:callable' given, and keeps its partition,
+so the topology never crosses the wire. Hosts stay with the switches they are linked to,
+the links cut between switches are joined by a veth pair between workers of the same machine,
+or by an OVS vxlan port between machines. Host addresses are the ones of the unsharded network,
+the abstraction nodes of every worker take their ip pools from a distinct block of cidrBase.
+
+A worker is served by the daemon protocol on a unix socket, see daemon.py. The coordinator starts local ones,
+a worker on another machine is started there with
+    python fie/distributed.py --socket /root/.fie/worker.sock
+and reached through a forwarded socket, e.g. ssh -L /tmp/w1.sock:/root/.fie/worker.sock machine1,
+along with the address its tunnels end on, which needs an underlay mtu of at least 1550.
+"""
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+from functools import partial
+from threading import Lock
+from mininet.node import DefaultController
+from mininet.topo import Topo
+from mininet.util import ipAdd, netParse
+from fie import FIE
+from daemon import Service, Client, serve
+from journal import JOURNAL
+from utils import network, parallel_map
+import executor
+
+WORKER = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+WORKERS = os.path.expanduser('~/.fie/workers')
+
+
+def load_topo(spec, params=None):
+    """Build the topology of spec, a 'module:callable' called with params, e.g. 'topos:FogTopo'"""
+    module, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError('expect module:callable, got ' + spec)
+    return getattr(importlib.import_module(module), attr)(**(params or {}))
+
+
+def partition(topo, workers):
+    """
+    Assign every node of topo to one of workers, return a dictionary of node name to worker index.
+    A host is kept with the nodes it is linked to, so only the links between switches are cut.
+    These groups are taken in breadth-first order and cut into runs of about the same number of hosts,
+    neighbours stay together, and the same topology always gets the same partition.
+    """
+    nodes = topo.nodes()
+    neighbours = dict((n, []) for n in nodes)
+    for a, b in topo.links(sort=True):
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+
+    group = dict((n, n) for n in nodes)
+
+    def find(n):
+        while group[n] != n:
+            group[n] = group[group[n]]
+            n = group[n]
+        return n
+
+    hosts = set(topo.hosts())
+    for h in topo.hosts():
+        for n in neighbours[h]:
+            a, b = find(h), find(n)
+            if a != b:
+                group[max(a, b)] = min(a, b)
+    members = {}
+    for n in nodes:
+        members.setdefault(find(n), []).append(n)
+
+    # The groups in breadth-first order of their nodes.
+    ordered = []
+    seen = set()
+    for start in nodes:
+        if start in seen:
+            continue
+        seen.add(start)
+        queue = [start]
+        while queue:
+            n = queue.pop(0)
+            if find(n) not in ordered:
+                ordered.append(find(n))
+            for m in neighbours[n]:
+                if m not in seen:
+                    seen.add(m)
+                    queue.append(m)
+
+    weight = lambda g: len([n for n in members[g] if n in hosts]) if hosts else len(members[g])
+    total = sum(weight(g) for g in ordered) or 1
+    assignment = {}
+    before = 0
+    for g in ordered:
+        # By the middle of the group, a large group goes where most of it falls.
+        index = min((2 * before + weight(g)) * workers // (2 * total), workers - 1)
+        for n in members[g]:
+            assignment[n] = index
+        before += weight(g)
+    return assignment
+
+
+def shard(topo, assignment, index, ipBase='10.0.0.0/8'):
+    """The topology of the nodes of worker index and the links among them"""
+    sub = Topo()
+    ipBaseNum, prefixLen = netParse(ipBase)
+    for i, name in enumerate(topo.hosts()):
+        if assignment[name] == index:
+            # The address mininet gives the host in the unsharded network.
+            opts = dict(topo.nodeInfo(name))
+            opts.setdefault('ip', ipAdd(i + 1, ipBaseNum=ipBaseNum, prefixLen=prefixLen) + '/%s' % prefixLen)
+            sub.addHost(name, **opts)
+    for name in topo.switches():
+        if assignment[name] == index:
+            sub.addSwitch(name, **topo.nodeInfo(name))
+    for _, _, info in topo.links(sort=True, withInfo=True):
+        opts = dict(info)
+        a, b = opts.pop('node1'), opts.pop('node2')
+        if assignment[a] == index and assignment[b] == index:
+            sub.addLink(a, b, **opts)
+    return sub
+
+
+def cuts(topo, assignment):
+    """The links between workers, a list of (key, switch, switch), the key numbers the tunnel"""
+    result = []
+    for key, (a, b) in enumerate(topo.links(sort=True)):
+        if assignment[a] == assignment[b]:
+            continue
+        if not (topo.isSwitch(a) and topo.isSwitch(b)):
+            raise ValueError('the link %s-%s of a host is cut' % (a, b))
+        result.append((key + 1, a, b))
+    return result
+
+
+def split(cidr, count):
+    """count disjoint blocks of cidr, one per worker"""
+    blocks = network(cidr).subnets(prefixlen_diff=max(count - 1, 0).bit_length())
+    return [str(block) for block in blocks][:count]
+
+
+def sh(args):
+    """Run a command in the root namespace, raise RuntimeError if it fails"""
+    _, err, rc = executor.popen(None, args, b'')
+    if rc != 0:
+        raise RuntimeError('%s: %s' % (' '.join(args), err.decode('utf-8', 'replace').strip()))
+
+
+class WorkerService(Service):
+    """The service of a worker, its network is built by the coordinator"""
+
+    def __init__(self, net=None):
+        Service.__init__(self, net)
+        # The veth pairs created for the cut links, removed on teardown.
+        self.veths = []
+        # The names of the containers of other workers served by the name service.
+        self.published = set()
+
+    def build(self, topo, params, workers, index, opts):
+        """
+        Build and start the partition index of the topology spec, see load_topo.
+        opts are the keyword arguments of FIE, with controllerPort, the port of the controller of this worker.
+        """
+        with self.lock:
+            if self.net is not None:
+                raise RuntimeError('the network is built already')
+            base = load_topo(topo, params)
+            opts = dict(opts)
+            controller = partial(DefaultController, port=opts.pop('controllerPort', 6653))
+            sub = shard(base, partition(base, workers), index, opts.get('ipBase', '10.0.0.0/8'))
+            net = FIE(topo=sub, controller=controller, **opts)
+            net.start()
+            self.net = net
+            return sorted(net.absnode_map)
+
+    def join(self, ports):
+        """
+        Attach the ends of cut links to switches, a list of dictionaries of switch, port, and
+        either peer, the veth pair of port to create, or remote and key, the end of a vxlan tunnel.
+        A port without either attaches the peer created by another worker.
+        """
+        with self.lock:
+            for p in ports:
+                switch, port = p['switch'], p['port']
+                if p.get('remote') is not None:
+                    sh(['ovs-vsctl', 'add-port', switch, port, '--', 'set', 'interface', port,
+                        'type=vxlan', 'options:remote_ip=%s' % p['remote'], 'options:key=%d' % p['key']])
+                    continue
+                if p.get('peer') is not None:
+                    self.net.journal.record('link', port)
+                    sh(['ip', 'link', 'add', port, 'type', 'veth', 'peer', 'name', p['peer']])
+                    self.veths.append(port)
+                sh(['ip', 'link', 'set', port, 'up'])
+                sh(['ovs-vsctl', 'add-port', switch, port])
+
+    def pools(self):
+        """Node name -> [ip pool, gateway] of the abstraction nodes of this worker"""
+        return dict((name, [node.ip_pool, node.head_node.IP(name + '-eth0')])
+                    for name, node in self.net.absnode_map.items())
+
+    def names(self):
+        """Container name -> ip of the containers of this worker, the ones with a known address"""
+        result = {}
+        for node in self.net.absnode_map.values():
+            for c in list(node.container_list):
+                state = self.net.env.state.get(c.name)
+                ip = c.ip or (state.ip if state is not None else None)
+                if ip:
+                    result[c.name] = ip
+        return result
+
+    def publish(self, records):
+        """Serve records, the container name -> ip of other workers, in place of the previous ones"""
+        dns = self.net.dns
+        if dns is None:
+            return
+        for name in self.published - set(records):
+            dns.delete(name)
+        for name, ip in records.items():
+            dns.set(name, ip)
+        self.published = set(records)
+
+    def spec(self, name):
+        """The spec a container is run from, for running it on another worker"""
+        _, c = self.net.container(name)
+        # As declared, the name server, cpus and limits of shares are the ones of the node it runs on.
+        spec = dict(c.template, image=c.image, name=c.name)
+        if c.share is not None:
+            spec['share'] = c.share
+        return spec
+
+    def teardown(self):
+        if self.net is None:
+            return
+        try:
+            self.net.destroyAll()
+            self.net.stop()
+        finally:
+            for port in self.veths:
+                try:
+                    sh(['ip', 'link', 'del', port])
+                except RuntimeError:
+                    # Gone along with the switch.
+                    pass
+                self.net.journal.forget('link', port)
+
+
+class Coordinator(object):
+    """
+    Drive a topology sharded over workers.
+    topo is the 'module:callable' building the topology, called with params in every worker.
+    workers is the number of worker processes started on this machine, or a list of the workers already serving,
+    dictionaries of socket, the unix socket path, and address, the ip tunnels end on for another machine.
+    The other keyword arguments are given to the FIE of every worker, each one has its block of cidrBase,
+    its journal and the controller port after the one of the previous worker.
+    """
+
+    def __init__(self, topo, params=None, workers=2, directory=WORKERS, cidrBase='192.168.0.0/16',
+                 journal=JOURNAL, controllerPort=6653, **opts):
+        self.spec = topo
+        self.params = params or {}
+        self.topo = load_topo(topo, self.params)
+        self.spawn = not isinstance(workers, list)
+        if self.spawn:
+            workers = [{'socket': os.path.join(directory, 'worker%d.sock' % i)} for i in range(workers)]
+        self.workers = [dict({'address': None}, **w) for w in workers]
+        addresses = set(w['address'] for w in self.workers)
+        if len(addresses) > 1 and None in addresses:
+            raise ValueError('workers on other machines need the address of every worker')
+        count = len(self.workers)
+        self.assignment = partition(self.topo, count)
+        self.cuts = cuts(self.topo, self.assignment)
+        blocks = split(cidrBase, count)
+        self.opts = [dict(opts, cidrBase=blocks[i], journal='%s-w%d' % (journal, i),
+                          controllerPort=controllerPort + i) for i in range(count)]
+        self.processes = []
+        self.clients = []
+        self.locks = [Lock() for _ in self.workers]
+        # Container name -> worker index, as deployed by the coordinator.
+        self.containers = {}
+
+    def call(self, i, method, params=None):
+        """Call a method of worker i with a dictionary of params, one call at a time per worker"""
+        with self.locks[i]:
+            return self.clients[i].call(method, **(params or {}))
+
+    def each(self, method, params=None):
+        """
+        Call method on every worker concurrently, params is a function of the worker index to its parameters.
+        Return the results in the order of workers, raise RuntimeError if any failed.
+        """
+        outcomes = parallel_map(lambda i: self.call(i, method, params(i) if params else None),
+                                range(len(self.workers)), len(self.workers))
+        failures = ['worker %d: %s' % (i, err) for i, _, err in outcomes if err is not None]
+        if failures:
+            raise RuntimeError('%s failed on %s' % (method, '\n'.join(failures)))
+        return [result for _, result, _ in outcomes]
+
+    def start(self, timeout=60.0):
+        """Start the workers, build their partitions, join the cut links and route all the nodes"""
+        if self.spawn:
+            self.launch()
+        try:
+            self.connect(timeout)
+            self.each('build', lambda i: {'topo': self.spec, 'params': self.params,
+                                          'workers': len(self.workers), 'index': i, 'opts': self.opts[i]})
+            self.join()
+            self.routeAll()
+            self.sync()
+        except Exception:
+            self.stop()
+            raise
+
+    def connect(self, timeout):
+        deadline = time.time() + timeout
+        for w in self.workers:
+            while True:
+                try:
+                    self.clients.append(Client(w['socket']))
+                    break
+                except (IOError, OSError):
+                    if time.time() >= deadline:
+                        raise RuntimeError('worker %s does not serve after %.1fs' % (w['socket'], timeout))
+                    time.sleep(0.1)
+
+    def launch(self):
+        """Start a worker process per socket"""
+        env = dict(os.environ)
+        # The workers import the topology from where the coordinator does.
+        env['PYTHONPATH'] = os.pathsep.join(p for p in [os.getcwd()] + sys.path if p)
+        for w in self.workers:
+            directory = os.path.dirname(w['socket'])
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            # Left by a killed worker, the coordinator would connect to it.
+            if os.path.exists(w['socket']):
+                os.remove(w['socket'])
+            self.processes.append(subprocess.Popen([sys.executable, WORKER, '--socket', w['socket']],
+                                                   env=env, close_fds=True))
+
+    def join(self):
+        """Join every cut link, by a veth pair within a machine, by a vxlan tunnel between machines"""
+        first = [[] for _ in self.workers]
+        second = [[] for _ in self.workers]
+        for key, a, b in self.cuts:
+            i, j = self.assignment[a], self.assignment[b]
+            local, remote = self.workers[i]['address'], self.workers[j]['address']
+            if local == remote:
+                first[i].append({'switch': a, 'port': 'fiec%da' % key, 'peer': 'fiec%db' % key})
+                second[j].append({'switch': b, 'port': 'fiec%db' % key})
+            else:
+                first[i].append({'switch': a, 'port': 'fiec%d' % key, 'remote': remote, 'key': key})
+                first[j].append({'switch': b, 'port': 'fiec%d' % key, 'remote': local, 'key': key})
+        # The peers are attached once created.
+        self.each('join', lambda i: {'ports': first[i]})
+        self.each('join', lambda i: {'ports': second[i]})
+
+    def routeAll(self):
+        """Route every abstraction node to the ip pools of all the others, on any worker"""
+        pools = self.each('pools')
+        self.each('route', lambda i: {'remote': dict((name, pool) for j, own in enumerate(pools) if j != i
+                                                     for name, pool in own.items())})
+
+    def sync(self):
+        """Serve the container names of every worker by the name services of the others"""
+        names = self.each('names')
+        self.each('publish', lambda i: {'records': dict((name, ip) for j, own in enumerate(names) if j != i
+                                                        for name, ip in own.items())})
+
+    def worker(self, node):
+        """The index of the worker running an abstraction node"""
+        if node not in self.assignment or self.topo.isSwitch(node):
+            raise KeyError('no such node: %s' % node)
+        return self.assignment[node]
+
+    def locate(self, name):
+        """The index of the worker running a container, raise KeyError if absent"""
+        if name in self.containers:
+            return self.containers[name]
+        for i, ps in enumerate(self.each('ps')):
+            if any(c['name'] == name for containers in ps.values() for c in containers):
+                self.containers[name] = i
+                return i
+        raise KeyError('no such container: ' + name)
+
+    def nodes(self):
+        return sorted(name for names in self.each('nodes') for name in names)
+
+    def ps(self):
+        """Node name -> containers over all workers"""
+        result = {}
+        for ps in self.each('ps'):
+            result.update(ps)
+        return result
+
+    def run(self, node, spec):
+        """Run a container on an abstraction node of any worker, see AbstractionNode.run_spec"""
+        i = self.worker(node)
+        result = self.call(i, 'run', {'node': node, 'spec': spec})
+        if result['error'] is None:
+            self.containers[result['name']] = i
+            self.sync()
+        return result
+
+    def deploy(self, plan, workers=8):
+        """Deploy a plan of (node name, spec) on all workers at once, see FIE.deploy"""
+        if isinstance(plan, dict):
+            plan = [(node, spec) for node in plan for spec in plan[node]]
+        plan = list(plan)
+        shares = [[] for _ in self.workers]
+        for k, (node, spec) in enumerate(plan):
+            shares[self.worker(node)].append((k, [node, spec]))
+        results = [None] * len(plan)
+        for i, share in enumerate(self.each('deploy', lambda i: {'plan': [entry for _, entry in shares[i]],
+                                                                'workers': workers})):
+            for (k, _), result in zip(shares[i], share):
+                results[k] = result
+                if result['error'] is None:
+                    self.containers[result['name']] = i
+        self.sync()
+        return results
+
+    def destroy(self, name):
+        i = self.locate(name)
+        result = self.call(i, 'destroy', {'name': name})
+        self.containers.pop(name, None)
+        self.sync()
+        return result
+
+    def migrate(self, name, dst, mode='cold'):
+        """
+        Move a container to the abstraction node dst, see FIE.migrate.
+        Between workers, the container is cold started on dst, a checkpoint does not cross machines.
+        """
+        i, j = self.locate(name), self.worker(dst)
+        if i == j:
+            report = self.call(i, 'migrate', {'name': name, 'dst': dst, 'mode': mode})
+            self.sync()
+            return report
+        if mode != 'cold':
+            raise ValueError('only cold migration moves %s between workers' % name)
+        src = [node for node, containers in self.call(i, 'ps').items()
+               if any(c['name'] == name for c in containers)]
+        start = time.time()
+        spec = self.call(i, 'spec', {'name': name})
+        self.call(i, 'destroy', {'name': name})
+        self.containers.pop(name, None)
+        result = self.call(j, 'run', {'node': dst, 'spec': spec})
+        failure = result['error']
+        if failure is None:
+            self.containers[name] = j
+        elif src:
+            # As migration.cold, run it again where it was.
+            result = self.call(i, 'run', {'node': src[0], 'spec': spec})
+            if result['error'] is None:
+                self.containers[name] = i
+                failure += ', restarted on ' + src[0]
+            else:
+                failure += ', failed to restart on %s: %s' % (src[0], result['error'])
+        downtime = time.time() - start
+        self.sync()
+        return {'mode': 'cold', 'name': name, 'src': src[0] if src else None, 'dst': dst,
+                'prepare': 0.0, 'checkpoint': 0.0, 'restore': downtime, 'downtime': downtime,
+                'total': downtime, 'error': failure}
+
+    def stop(self, timeout=60.0):
+        """Shut the workers down, each one destroys its containers and stops its network"""
+        for i, client in enumerate(self.clients):
+            try:
+                self.call(i, 'shutdown')
+            except Exception:
+                pass
+            client.close()
+        self.clients = []
+        deadline = time.time() + timeout
+        for p in self.processes:
+            while p.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+            if p.poll() is None:
+                p.kill()
+                p.wait()
+        self.processes = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='A worker of a distributed emulation, see distributed.py')
+    parser.add_argument('--socket', default=os.path.join(WORKERS, 'worker.sock'))
+    args = parser.parse_args()
+    service = WorkerService()
+    try:
+        serve(None, args.socket, service)
+    finally:
+        service.teardown()
+
+
+if __name__ == '__main__':
+    main()
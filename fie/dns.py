@@ -0,0 +1,232 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+The built-in name service of containers, in place of a dns container.
+A small responder runs in the namespace of every abstraction node and listens on its gateway address,
+the containers of the node use it as their name server.
+The records come from the container state cache: FIE pushes every change to the responders
+over their stdin as it happens, a lookup never reaches docker.
+A container is resolved by its name, and by its name under the suffix domain, e.g. controller.docker.
+
+Run as a script, this file is the responder:
+    python dns.py <address> [--port 53] [--upstream <address>] [--suffix docker]
+reading lines of `add <name> <ip>` and `del <name>` from stdin, until it is closed.
+"""
+
+import argparse
+import os
+import select
+import socket
+import struct
+import subprocess
+import sys
+from threading import Lock
+import executor
+
+# Answers are not cached for long, the records move along with migrations.
+TTL = 1
+# The responder script, the module may be loaded from a compiled file.
+RESPONDER = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+
+QTYPE_A = 1
+RCODE_NXDOMAIN = 3
+
+
+class NameService(object):
+    """The responders of abstraction nodes and the records they serve"""
+
+    def __init__(self, suffix='docker', port=53, upstream=None):
+        self.suffix = suffix
+        self.port = port
+        self.upstream = upstream
+        self.lock = Lock()
+        # name -> ip
+        self.records = {}
+        # abstraction node name -> responder process
+        self.responders = {}
+
+    def add_node(self, node):
+        """Start the responder of an abstraction node, on its gateway address"""
+        args = [sys.executable, RESPONDER, node.gw, '--port', str(self.port), '--suffix', self.suffix]
+        if self.upstream:
+            args += ['--upstream', self.upstream]
+        p = executor.run('dns', node.name, 'start responder ' + node.gw,
+                         node.head_node.popen, args, stdin=subprocess.PIPE)
+        with self.lock:
+            self.responders[node.name] = p
+            lines = ''.join('add %s %s\n' % (name, ip) for name, ip in self.records.items())
+            self.send(p, lines)
+        node.dns = [node.gw]
+
+    def remove_node(self, name):
+        with self.lock:
+            p = self.responders.pop(name, None)
+        if p is not None:
+            self.close(p)
+
+    def send(self, p, lines):
+        if not lines:
+            return
+        try:
+            p.stdin.write(lines.encode())
+            p.stdin.flush()
+        except (IOError, OSError, ValueError):
+            # The responder is gone, its node is being torn down.
+            pass
+
+    def broadcast(self, lines):
+        with self.lock:
+            for p in self.responders.values():
+                self.send(p, lines)
+
+    def set(self, name, ip):
+        with self.lock:
+            if self.records.get(name) == ip:
+                return
+            self.records[name] = ip
+        self.broadcast('add %s %s\n' % (name, ip))
+
+    def delete(self, name):
+        with self.lock:
+            if self.records.pop(name, None) is None:
+                return
+        self.broadcast('del %s\n' % name)
+
+    def update(self, action, state):
+        """A listener of the container state cache"""
+        if action == 'start' and state.ip:
+            self.set(state.name, state.ip)
+        elif action in ('die', 'destroy'):
+            self.delete(state.name)
+
+    def close(self, p):
+        try:
+            p.stdin.close()
+        except (IOError, OSError):
+            pass
+        p.wait()
+
+    def stop(self):
+        """Stop all responders, they exit once their stdin is closed"""
+        with self.lock:
+            responders, self.responders = list(self.responders.values()), {}
+        for p in responders:
+            self.close(p)
+
+
+def parse_question(packet):
+    """Return (labels, qtype, end offset) of the first question of a query"""
+    labels = []
+    offset = 12
+    while True:
+        length = bytearray(packet[offset:offset + 1])[0]
+        offset += 1
+        if length == 0:
+            break
+        labels.append(packet[offset:offset + length].decode('ascii', 'replace'))
+        offset += length
+    qtype, = struct.unpack('!H', packet[offset:offset + 2])
+    return labels, qtype, offset + 4
+
+
+def answer(packet, records, suffix):
+    """Return the response to a query, or None if the name is unknown"""
+    ident, flags, qdcount = struct.unpack('!HHH', packet[:6])
+    if qdcount != 1:
+        return None
+    labels, qtype, end = parse_question(packet)
+    name = '.'.join(labels).lower()
+    if suffix and name.endswith('.' + suffix):
+        name = name[:-len(suffix) - 1]
+    ip = records.get(name)
+    if ip is None:
+        return None
+
+    question = packet[12:end]
+    # Response, recursion desired as asked, recursion available.
+    flags = 0x8000 | (flags & 0x0100) | 0x0080
+    if qtype != QTYPE_A:
+        # The name exists without a record of the type, e.g. AAAA.
+        return struct.pack('!HHHHHH', ident, flags, 1, 0, 0, 0) + question
+    record = struct.pack('!HHHIH', 0xc00c, QTYPE_A, 1, TTL, 4) + socket.inet_aton(ip)
+    return struct.pack('!HHHHHH', ident, flags, 1, 1, 0, 0) + question + record
+
+
+def nxdomain(packet):
+    ident, flags = struct.unpack('!HH', packet[:4])
+    _, _, end = parse_question(packet)
+    flags = 0x8000 | (flags & 0x0100) | 0x0080 | RCODE_NXDOMAIN
+    return struct.pack('!HHHHHH', ident, flags, 1, 0, 0, 0) + packet[12:end]
+
+
+def respond(address, port=53, upstream=None, suffix='docker'):
+    """Serve the records read from stdin, forward unknown names to upstream if given"""
+    records = {}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((address, port))
+    forward = None
+    # query id -> client address, of the queries forwarded upstream
+    pending = {}
+    if upstream:
+        forward = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        forward.connect((upstream, 53))
+
+    stdin = sys.stdin.fileno()
+    buf = b''
+    sockets = [stdin, sock] + ([forward] if forward else [])
+    while True:
+        readable, _, _ = select.select(sockets, [], [])
+        if stdin in readable:
+            data = os.read(stdin, 65536)
+            if not data:
+                return
+            buf += data
+            lines = buf.split(b'\n')
+            buf = lines.pop()
+            for line in lines:
+                fields = line.decode().split()
+                if len(fields) == 3 and fields[0] == 'add':
+                    records[fields[1].lower()] = fields[2]
+                elif len(fields) == 2 and fields[0] == 'del':
+                    records.pop(fields[1].lower(), None)
+
+        if sock in readable:
+            packet, client = sock.recvfrom(512)
+            try:
+                response = answer(packet, records, suffix)
+                if response is None and forward is not None:
+                    if len(pending) > 4096:
+                        pending.clear()
+                    pending[packet[:2]] = client
+                    forward.send(packet)
+                    continue
+                sock.sendto(response or nxdomain(packet), client)
+            except (struct.error, IndexError):
+                # Malformed query.
+                pass
+
+        if forward is not None and forward in readable:
+            packet = forward.recv(4096)
+            client = pending.pop(packet[:2], None)
+            if client is not None:
+                sock.sendto(packet, client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve fie container names.')
+    parser.add_argument('address', help='address to listen on')
+    parser.add_argument('--port', type=int, default=53)
+    parser.add_argument('--upstream', help='name server of the names not known')
+    parser.add_argument('--suffix', default='docker', help='the domain of container names')
+    args = parser.parse_args()
+    respond(args.address, args.port, args.upstream, args.suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+A docker client for concurrent calls.
+The operations of abstraction nodes and containers are issued from worker threads, see utils.parallel_map.
+Over a unix socket, the stock client keeps a connection pool per request url, i.e. per container,
+and only the 25 most recent pools: with more containers than that, nearly every call reconnects.
+The pooled client shares one pool of up to connections for all urls,
+the calls beyond them open a connection which is dropped after the call.
+"""
+
+import docker
+from docker.transport import UnixAdapter
+from docker.transport.unixconn import UnixHTTPConnectionPool
+
+SOCKET = 'unix://var/run/docker.sock'
+# Enough for the workers of deploy and destroyAll, along with the events and image streams.
+CONNECTIONS = 32
+
+
+class PooledUnixAdapter(UnixAdapter):
+    """A unix socket adapter sharing one pool of up to maxsize connections for all urls"""
+
+    def __init__(self, socket_url, timeout=60, maxsize=CONNECTIONS):
+        self.maxsize = maxsize
+        UnixAdapter.__init__(self, socket_url, timeout, pool_connections=1)
+
+    def get_connection(self, url, proxies=None):
+        with self.pools.lock:
+            pool = self.pools.get(self.socket_path)
+            if pool:
+                return pool
+            # Not blocking, a call finding every connection busy opens one more.
+            pool = UnixHTTPConnectionPool(url, self.socket_path, self.timeout, maxsize=self.maxsize)
+            self.pools[self.socket_path] = pool
+        return pool
+
+
+def pooled(client, connections=CONNECTIONS):
+    """Replace the connection pool of a docker client talking over a unix socket, return the client"""
+    api = client.api
+    if not isinstance(getattr(api, '_custom_adapter', None), UnixAdapter):
+        # Not a unix socket, the stock pool is kept.
+        return client
+    adapter = PooledUnixAdapter(api._custom_adapter.socket_path, api.timeout, connections)
+    api._custom_adapter.close()
+    api._custom_adapter = adapter
+    api.mount('http+docker://', adapter)
+    return client
+
+
+def client(base_url=SOCKET, connections=CONNECTIONS, timeout=60):
+    """A docker client keeping up to connections to the daemon"""
+    return pooled(docker.DockerClient(base_url=base_url, version='auto', timeout=timeout), connections)
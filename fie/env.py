@@ -6,42 +6,140 @@ Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependa
 Checkout the License for using, modifying and publishing.
 """
 
-import docker
+from threading import Lock
+from utils import network
+from state import StateCache
+from images import ImageCache
+import dockerpool
 
 
 class Env(object):
     """The declaration of some share variables."""
 
-    def __init__(self, node_num):
-        self.docker_client = self.init_docker_client()
-        self.cidr_list = self.set_cidr(node_num)
-        self.used_list = [False] * node_num
+    def __init__(self, node_num, cidr_base='192.168.0.0/16', cidr_prefixlen=24, docker_client=None,
+                 docker_connections=dockerpool.CONNECTIONS):
+        self.cidr = CidrAllocator(cidr_base, cidr_prefixlen)
+        if node_num > self.cidr.capacity:
+            raise ValueError('%d abstraction nodes exceed the %d ip pools of %s, use a larger cidr base' %
+                             (node_num, self.cidr.capacity, cidr_base))
+
+        self.docker_connections = docker_connections
+        self.docker_client = docker_client or self.init_docker_client()
+        # One events subscription shared by all abstraction nodes.
+        self.state = StateCache(self.docker_client)
+        self.state.start()
+        self.images = ImageCache(self.docker_client)
 
     def init_docker_client(self):
-        """Init docker client for docker daemon api """
-        client = docker.DockerClient(
-            base_url='unix://var/run/docker.sock', version='auto')
-        return client
-
-    def set_cidr(self, node_num):
-        """Set CIDR for private ip pool assignment, return a list of cidrs"""
-        # TODO: support this, extend to ip_addr class C
-        if node_num > 200:
-            print("We don't support nodes exceed 200 currently")
-            exit(1)
-
-        sub = node_num
-        cidr_list = []
-        for _ in range(node_num):
-            sub += 1
-            substr = str(sub)
-            cidr_list.append('192.168.' + substr + '.0/24')
-        return cidr_list
+        """Init docker client for docker daemon api, shared by the concurrent operations of all nodes"""
+        return dockerpool.client(connections=self.docker_connections)
+
+    def close(self):
+        """Release the shared resources"""
+        self.state.stop()
 
     def assign_cidr(self):
         """Assign CIDR for an absraction node, return a string from this method"""
-        for i in range(len(self.used_list)):
-            if self.used_list[i] is False:
-                self.used_list[i] = True
-                return self.cidr_list[i]
-        return ""
+        return self.cidr.allocate()
+
+    def release_cidr(self, cidr):
+        """Return the CIDR of a torn down abstraction node"""
+        self.cidr.release(cidr)
+
+
+class BlockAllocator(object):
+    """
+    O(1) allocation of numbered blocks in [first, size).
+    Blocks never handed out are taken from a counter, released ones from a free stack,
+    a bitmap tracks which blocks are in use.
+    """
+
+    def __init__(self, size, first=0):
+        self.size = size
+        self.fresh = first
+        self.free = []
+        self.used = bytearray(size)
+
+    def allocate(self):
+        if self.free:
+            i = self.free.pop()
+        elif self.fresh < self.size:
+            i = self.fresh
+            self.fresh += 1
+        else:
+            raise ValueError('address space exhausted')
+        self.used[i] = 1
+        return i
+
+    def release(self, i):
+        if not 0 <= i < self.size or not self.used[i]:
+            raise ValueError('block %d is not allocated' % i)
+        self.used[i] = 0
+        self.free.append(i)
+
+
+class CidrAllocator(object):
+    """
+    Allocate ip pools of prefixlen from a base prefix, e.g. /24 pools of 192.168.0.0/16.
+    The first pool of base is skipped, it is left to the LAN of the host in most setups.
+    Choose a base disjoint from the mininet ipBase and the docker bridges.
+    """
+
+    def __init__(self, base='192.168.0.0/16', prefixlen=24):
+        self.base = network(base)
+        self.prefixlen = prefixlen
+        if prefixlen < self.base.prefixlen or prefixlen > 30:
+            raise ValueError('prefixlen %d does not fit in %s' % (prefixlen, base))
+        self.step = 1 << (self.base.max_prefixlen - prefixlen)
+        self.blocks = BlockAllocator(1 << (prefixlen - self.base.prefixlen), first=1)
+        self.lock = Lock()
+
+    @property
+    def capacity(self):
+        return self.blocks.size - 1
+
+    def allocate(self):
+        """Return a free cidr string"""
+        with self.lock:
+            i = self.blocks.allocate()
+        addr = self.base.network_address + i * self.step
+        return '%s/%d' % (str(addr), self.prefixlen)
+
+    def release(self, cidr):
+        """Take a cidr back"""
+        offset = int(network(cidr).network_address) - int(self.base.network_address)
+        with self.lock:
+            self.blocks.release(offset // self.step)
+
+
+class AddressPool(object):
+    """
+    Host addresses of an abstraction node ip pool, handed out to containers without docker IPAM.
+    The first host address is the gateway of the pool.
+    """
+
+    def __init__(self, cidr):
+        self.net = network(cidr)
+        # Skip the network address and the gateway, exclude the broadcast address.
+        self.blocks = BlockAllocator(self.net.num_addresses - 1, first=2)
+        self.lock = Lock()
+
+    def allocate(self):
+        """Return a free ip address string"""
+        with self.lock:
+            i = self.blocks.allocate()
+        return str(self.net.network_address + i)
+
+    def offset(self, ip):
+        return int(network(ip + '/32').network_address) - int(self.net.network_address)
+
+    def owns(self, ip):
+        """Whether the ip address is allocated from this pool"""
+        i = self.offset(ip)
+        with self.lock:
+            return 0 <= i < self.blocks.size and self.blocks.used[i] == 1
+
+    def release(self, ip):
+        """Take an ip address back"""
+        with self.lock:
+            self.blocks.release(self.offset(ip))
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Every external operation, i.e. commands in hosts, ip batches, docker api calls and cgroup writes,
+goes through the executor, which times it and tags it with its node and the phase of the emulation.
+The latest records give a profile of the slowest operations, and can be saved and replayed:
+a ReplayExecutor answers the recorded commands with their recorded outputs instead of running them.
+"""
+
+import json
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Kinds of operations whose results are recorded and replayed, the others are timed only.
+REPLAYED = ('cmd', 'call', 'popen')
+# The records kept, a long-lived emulation polls and samples without end.
+CAPACITY = 100000
+
+
+class Record(object):
+    """One timed operation"""
+
+    __slots__ = ('kind', 'node', 'phase', 'op', 'start', 'elapsed', 'error', 'result')
+
+    def __init__(self, kind, node, phase, op, start, elapsed, error=None, result=None):
+        self.kind = kind
+        self.node = node
+        self.phase = phase
+        self.op = op
+        self.start = start
+        self.elapsed = elapsed
+        self.error = error
+        self.result = result
+
+    def to_dict(self):
+        return dict((key, getattr(self, key)) for key in self.__slots__)
+
+
+class Executor(object):
+    """Run and time operations, thread-safe, the latest capacity records are kept, all of them if None"""
+
+    def __init__(self, capacity=CAPACITY):
+        self.lock = threading.Lock()
+        self.records = deque(maxlen=capacity)
+        # The operations recorded since the reset, along with the ones dropped from records.
+        self.count = 0
+        self.local = threading.local()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Tag the operations of the calling thread with phase.
+        The outermost phase wins, e.g. the deployments of scale are tagged scale, not deploy.
+        """
+        previous = getattr(self.local, 'phase', None)
+        if previous is None:
+            self.local.phase = name
+        try:
+            yield
+        finally:
+            self.local.phase = previous
+
+    def current_phase(self):
+        return getattr(self.local, 'phase', None)
+
+    def append(self, record):
+        with self.lock:
+            self.records.append(record)
+            self.count += 1
+
+    def run(self, kind, node, op, func, *args, **kwargs):
+        """Run func(*args, **kwargs) as the operation op of kind on node, return its result"""
+        start = time.time()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.append(Record(kind, node, self.current_phase(), op, start,
+                               time.time() - start, error=str(e)))
+            raise
+        self.append(Record(kind, node, self.current_phase(), op, start, time.time() - start,
+                           result=result if kind in REPLAYED else None))
+        return result
+
+    def cmd(self, node, cmdstr):
+        """Run a command string in a mininet node, return its output"""
+        return self.run('cmd', node.name, cmdstr, node.cmd, cmdstr)
+
+    def call(self, args):
+        """Run a command in the root namespace, return its exit status"""
+        return self.run('call', None, ' '.join(args), subprocess.call, args)
+
+    def popen(self, node, args, data):
+        """
+        Run a command in a mininet node, or in the root namespace if node is None, with data as its input.
+        Return [output, error output, exit status].
+        """
+        def communicate():
+            if node is None:
+                p = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            else:
+                p = node.popen(args, stdin=subprocess.PIPE)
+            out, err = p.communicate(data)
+            return [out, err, p.returncode]
+        return self.run('popen', None if node is None else node.name, ' '.join(args), communicate)
+
+    def docker(self, node, op, func, *args, **kwargs):
+        """Call the docker api, op names the call and its target, e.g. 'create_container fog0-1'"""
+        return self.run('docker', node, op, func, *args, **kwargs)
+
+    def reset(self):
+        with self.lock:
+            self.records.clear()
+            self.count = 0
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.records)
+
+    def profile(self, n=20, phase=None):
+        """Render the n slowest operations, and the total time of every kind and phase, of the records kept"""
+        with self.lock:
+            records, count = list(self.records), self.count
+        lines = []
+        if count > len(records):
+            lines.append('The latest %d of %d operations' % (len(records), count))
+        records = [r for r in records if phase is None or r.phase == phase]
+        lines.append('%9s  %-7s %-12s %-10s %s' % ('SECONDS', 'KIND', 'NODE', 'PHASE', 'OPERATION'))
+        for r in sorted(records, key=lambda r: r.elapsed, reverse=True)[:n]:
+            lines.append('%9.4f  %-7s %-12s %-10s %s%s' %
+                         (r.elapsed, r.kind, r.node or '-', r.phase or '-', r.op[:80],
+                          ' (failed)' if r.error else ''))
+
+        totals = {}
+        for r in records:
+            key = (r.phase or '-', r.kind)
+            count, elapsed = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, elapsed + r.elapsed)
+        lines.append('')
+        lines.append('%-10s %-7s %7s %9s' % ('PHASE', 'KIND', 'CALLS', 'SECONDS'))
+        for (phase_name, kind), (count, elapsed) in sorted(totals.items(), key=lambda t: -t[1][1]):
+            lines.append('%-10s %-7s %7d %9.4f' % (phase_name, kind, count, elapsed))
+        return '\n'.join(lines)
+
+    def save(self, path):
+        """Save the records kept as json lines, to be loaded by ReplayExecutor"""
+        with open(path, 'w') as f:
+            for r in self.snapshot():
+                f.write(json.dumps(r.to_dict()) + '\n')
+
+
+class ReplayExecutor(Executor):
+    """
+    Answer the recorded commands with their recorded results, in the recorded order per node and command.
+    With timing, every answer takes as long as the recorded one.
+    Docker and cgroup operations, and commands absent from the recording, are run for real.
+    """
+
+    def __init__(self, path, timing=False, capacity=CAPACITY):
+        Executor.__init__(self, capacity)
+        self.timing = timing
+        # (kind, node, op) -> recorded entries, oldest first
+        self.recorded = {}
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['kind'] in REPLAYED:
+                    key = (entry['kind'], entry['node'], entry['op'])
+                    self.recorded.setdefault(key, []).append(entry)
+
+    def run(self, kind, node, op, func, *args, **kwargs):
+        with self.lock:
+            entries = self.recorded.get((kind, node, op))
+            entry = entries.pop(0) if entries else None
+        if entry is None:
+            return Executor.run(self, kind, node, op, func, *args, **kwargs)
+
+        start = time.time()
+        if self.timing:
+            time.sleep(entry['elapsed'])
+        self.append(Record(kind, node, self.current_phase(), op, start, time.time() - start,
+                           error=entry['error'], result=entry['result']))
+        if entry['error'] is not None:
+            raise RuntimeError('replayed: ' + entry['error'])
+        return entry['result']
+
+
+EXECUTOR = Executor()
+
+
+def get():
+    """The executor in use"""
+    return EXECUTOR
+
+
+def use(executor):
+    """Route the operations through executor from now on"""
+    global EXECUTOR
+    EXECUTOR = executor
+
+
+def phase(name):
+    return EXECUTOR.phase(name)
+
+
+def phased(name):
+    """Decorate a function to run in phase name"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with EXECUTOR.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def run(kind, node, op, func, *args, **kwargs):
+    return EXECUTOR.run(kind, node, op, func, *args, **kwargs)
+
+
+def cmd(node, cmdstr):
+    return EXECUTOR.cmd(node, cmdstr)
+
+
+def call(args):
+    return EXECUTOR.call(args)
+
+
+def popen(node, args, data):
+    return EXECUTOR.popen(node, args, data)
+
+
+def docker(node, op, func, *args, **kwargs):
+    return EXECUTOR.docker(node, op, func, *args, **kwargs)
@@ -11,10 +11,39 @@ from mininet.node import (Node, Host, OVSKernelSwitch, DefaultController,
                           Controller)
 from mininet.nodelib import NAT
 from mininet.link import Link, Intf
+from mininet.log import error
 from absnode import AbstractionNode
+from linkbackend import BatchBackend
+from routing import RoutePlanner
+from index import ContainerIndex
+from journal import Journal, JOURNAL
 from env import Env
+from utils import parallel_map
+from executor import phased
+import executor as executors
+import migration
+from rslimit import RSLimitedHost
+from telemetry import Sampler
+from linkstats import LinkSampler
+import cgroup
+from daemon import serve
+from dns import NameService
+from scheduler import Scheduler
+from shaping import Shaper
+from cpuplace import Placement, Topology, CpuSet
+import cpuplace
 import cli
 
+
+class BringUpError(Exception):
+    """Raised when some abstraction nodes failed to be brought up"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        Exception.__init__(self, 'failed to bring up abstraction nodes: ' +
+                           ', '.join(name for name, _ in failures))
+
+
 class FIE(Mininet):
     """FIE Class inherit from Mininet class as the core configuration"""
 
@@ -23,50 +52,475 @@ class FIE(Mininet):
                  build=True, xterms=False, cleanup=False, ipBase='10.0.0.0/8',
                  inNamespace=False,
                  autoSetMacs=False, autoStaticArp=False, autoPinCpus=False,
-                 listenPort=None, waitConnected=False):
+                 listenPort=None, waitConnected=False, absnodeWorkers=1,
+                 linkBackend=BatchBackend, cidrBase='192.168.0.0/16', cidrPrefixLen=24,
+                 staticIp=False, journal=JOURNAL, executor=None, dns=True, dnsUpstream=None,
+                 dockerConnections=32, cpuPlacement=False, overcommit='reject'):
+
+        # Every external operation is timed by the executor, see executor.py
+        if executor is not None:
+            executors.use(executor)
 
-        Mininet.__init__(self, topo, switch, host,
-                         controller, link, intf,
-                         build, xterms, cleanup, ipBase,
-                         inNamespace,
-                         autoSetMacs, autoStaticArp, autoPinCpus,
-                         listenPort, waitConnected)
+        with executors.phase('build'):
+            Mininet.__init__(self, topo, switch, host,
+                             controller, link, intf,
+                             build, xterms, cleanup, ipBase,
+                             inNamespace,
+                             autoSetMacs, autoStaticArp, autoPinCpus,
+                             listenPort, waitConnected)
 
         # We add abstraction nodes in this class.
         # Automatically wraps mininet host, containers, internal network
+        self.initAbsNodes(absnodeWorkers, linkBackend, cidrBase, cidrPrefixLen, staticIp, journal,
+                          dns=dns, dnsUpstream=dnsUpstream, dockerConnections=dockerConnections,
+                          cpuPlacement=cpuPlacement, overcommit=overcommit)
 
+    @phased('init')
+    def initAbsNodes(self, absnodeWorkers=1, linkBackend=BatchBackend, cidrBase='192.168.0.0/16',
+                     cidrPrefixLen=24, staticIp=False, journal=JOURNAL, dockerClient=None,
+                     dns=True, dnsUpstream=None, dockerConnections=32, cpuPlacement=False,
+                     overcommit='reject'):
+        """
+        Wrap self.hosts into abstraction nodes, along with the state shared by them.
+        dockerClient replaces the client of the local docker daemon, e.g. the stand-in of bench/.
+        dns serves container names to the containers of every node, names it does not know are
+        forwarded to dnsUpstream if given, see dns.py.
+        dockerConnections is the number of connections to the docker daemon kept for concurrent calls,
+        size it after the workers of deploy and destroyAll, see dockerpool.py.
+        cpuPlacement pins every node on cpus of its own, sized to its cpu share, and its containers
+        on cpus of the node, see cpuplace.py.
+        overcommit is what happens to a container which does not fit in the resources left on its node,
+        reject or rebalance the cpu shares, see budget.py.
+        """
         self.absnode_map = {}
-        e = Env(len(self.hosts))
+        # Container name -> (abstraction node, container) over all abstraction nodes.
+        self.index = ContainerIndex()
+        # Resources created by this run, reaped by scripts/cleanup.sh after a crash.
+        self.journal = Journal(journal)
+        if self.journal.entries():
+            error('*** Resources of a previous run are left in %s, run scripts/cleanup.sh\n' % journal)
+        # The ip pools of abstraction nodes are cidrPrefixLen blocks of cidrBase.
+        e = Env(len(self.hosts), cidr_base=cidrBase, cidr_prefixlen=cidrPrefixLen,
+                docker_client=dockerClient, docker_connections=dockerConnections)
         self.env = e
+        self.staticIp = staticIp
+        self.overcommit = overcommit
+
+        # One link backend shared by all abstraction nodes, batches the whole topology.
+        self.link = linkBackend()
+        self.router = RoutePlanner(self.link)
+        # Container name -> names of its replicas created by scale, oldest first.
+        self.replicas = {}
+        # The resource telemetry sampler, started by startTelemetry.
+        self.sampler = None
+        # The link counters sampler, started by startLinkTelemetry.
+        self.linkSampler = None
+        # The link trace replay, started by startShaping.
+        self.shaper = None
+        # The name service follows the containers through the state cache.
+        self.dns = None
+        if dns:
+            self.dns = NameService(upstream=dnsUpstream)
+            self.env.state.listeners.append(self.dns.update)
+
+        # The cpusets of abstraction nodes, assigned by placeCpus.
+        self.placement = None
+
+        self.buildAbsNodes(self.hosts, workers=absnodeWorkers)
+        if cpuPlacement:
+            self.placeCpus()
+
+    def buildAbsNodes(self, hosts, workers=1):
+        """
+        Wrap hosts into abstraction nodes with at most workers building concurrently.
+        If any of them fails, the others are rolled back and BringUpError is raised.
+        """
+        nodes = [AbstractionNode(h.name, h, self.env.assign_cidr(), self.env.docker_client,
+                                 link=self.link, build=False, state=self.env.state,
+                                 index=self.index, static_ip=self.staticIp,
+                                 journal=self.journal, overcommit=self.overcommit) for h in hosts]
+
+        # The veth pairs of all nodes go in one batch, the docker bridges follow concurrently.
+        for node in nodes:
+            node.create_veth()
+        self.link.commit()
+
+        def build(node):
+            try:
+                node.net_bridge()
+            except Exception:
+                node.teardown()
+                raise
+            return node
+
+        outcomes = parallel_map(build, nodes, workers)
 
-        for h in self.hosts:
-            self.absnode_map[h.name] = AbstractionNode(
-                h.name, h, e.assign_cidr(), e.docker_client)
+        failures = [(node.name, err)
+                    for node, _, err in outcomes if err is not None]
+        if failures:
+            for name, err in failures:
+                error('*** Failed to bring up abstraction node %s:\n%s\n' %
+                      (name, err))
+            for _, node, err in outcomes:
+                if err is None:
+                    node.teardown()
+            for node in nodes:
+                self.env.release_cidr(node.ip_pool)
+            raise BringUpError(failures)
+
+        for _, node, _ in outcomes:
+            self.absnode_map[node.name] = node
+            if self.dns is not None:
+                self.dns.add_node(node)
+
+    @phased('init')
+    def placeCpus(self, topology=None):
+        """
+        Assign disjoint cpusets to abstraction nodes, sized to the cpu share of their hosts,
+        the hosts without one share the cpus left over. topology is the cpuplace.Topology of the machine.
+        The containers run later are placed on the least loaded cpus of their node.
+        """
+        self.placement = Placement(topology or Topology.detect())
+        shares = {}
+        for name, node in self.absnode_map.items():
+            cpu = getattr(node.head_node, 'params', {}).get('cpu')
+            shares[name] = cpu if cpu is not None and cpu > 0 else None
+        for name, cpus in self.placement.place(shares).items():
+            self.pinCpus(self.absnode_map[name], cpus)
+        return self.placement.assigned
+
+    def pinCpus(self, node, cpus):
+        """Pin an abstraction node on cpus, the cgroup of a RSLimitedHost and the containers run later"""
+        mems = self.placement.mems(cpus)
+        host = node.head_node
+        if isinstance(host, RSLimitedHost):
+            host.cgroupBatch()
+            try:
+                host.setCPUs(cpuplace.format_cpus(cpus), cpuplace.format_cpus(mems))
+            finally:
+                host.cgroupFlush()
+        node.cpuset = CpuSet(cpus, mems)
+        # The containers share the cpus of the node, whichever bound is tighter.
+        node.budget.cpus = min(node.budget.cpus, float(len(cpus)))
+
+    @phased('init')
+    def addAbsNode(self, host):
+        """Wrap a host added at runtime into an abstraction node, routes are updated incrementally"""
+        self.buildAbsNodes([host])
+        node = self.absnode_map[host.name]
+        if self.placement is not None:
+            # The placed nodes keep their cpus.
+            self.pinCpus(node, self.placement.rest)
+        if self.router.nodes:
+            self.router.add_node(node)
+        return node
+
+    @phased('teardown')
+    def delAbsNode(self, name):
+        """Destroy an abstraction node at runtime, its routes are withdrawn from the others"""
+        node = self.absnode_map.pop(name)
+        self.router.remove_node(name)
+        if self.dns is not None:
+            self.dns.remove_node(name)
+        node.destroyall()
+        node.teardown()
+        self.env.release_cidr(node.ip_pool)
 
     # May move to another ideal, meaningful place
-    def routeAll(self):
-        """(Add static) Route all the hosts"""
-        for host in self.absnode_map:
-            for another in self.absnode_map:
-                if host == another:
-                    continue
-                else:
-                    self.absnode_map[host].route(self.absnode_map[another])
+    @phased('route')
+    def routeAll(self, remote=None):
+        """
+        (Add static) Route all the hosts.
+        The route tables are planned once and pushed in one batch per namespace,
+        calling it again only pushes the differences.
+        remote replaces the nodes of other workers, a dictionary of name to (ip pool, gateway).
+        """
+        if remote is not None:
+            self.router.remote = dict(remote)
+        self.router.route(self.absnode_map.values())
 
     def node(self, index):
         return self.absnode_map[index]
 
-def emulation(topo, runner):
+    def container(self, name):
+        """Return (abstraction node, container) of a container name, raise KeyError if absent"""
+        entry = self.index.get(name)
+        if entry is None:
+            raise KeyError('no such container: ' + name)
+        return entry
+
+    @phased('migrate')
+    def migrate(self, name, dst, mode='cold'):
+        """
+        Move a container to the dst abstraction node, the index keeps the source until it runs on dst.
+        mode is cold, live or live-noprecopy, see migration.py.
+        Return the report of the migration, including the downtime in seconds.
+        """
+        src, c = self.container(name)
+        dst_node = self.node(dst)
+        if mode == 'cold':
+            return migration.cold(src, dst_node, c)
+        if mode in ('live', 'live-noprecopy'):
+            return migration.live(src, dst_node, c, precopy=(mode == 'live'))
+        raise ValueError('unknown migration mode: ' + mode)
+
+    def destroy(self, name):
+        """Destroy a container wherever it is"""
+        src, _ = self.container(name)
+        return src.destroy(name)
+
+    @phased('prefetch')
+    def prefetch(self, plan, workers=4):
+        """
+        Pull every image referenced by plan once and in parallel, call it before start.
+        plan is a deployment plan of deploy, or simply a list of images.
+        """
+        if isinstance(plan, dict):
+            plan = [spec for node in plan for spec in plan[node]]
+        images = []
+        for entry in plan:
+            if isinstance(entry, tuple):
+                entry = entry[1]
+            images.append(entry if isinstance(entry, str) else entry['image'])
+        return self.env.images.prefetch(images, workers)
+
+    @phased('deploy')
+    def deploy(self, plan, workers=8):
+        """
+        Deploy containers concurrently across abstraction nodes.
+        plan is a list of (node name, spec) or a dictionary of node name to a list of specs,
+        a spec is the keyword arguments of AbstractionNode.run, including image.
+        At most workers containers are created at once for each docker daemon.
+        Return the results of AbstractionNode.run_spec in the order of plan.
+        """
+        if isinstance(plan, dict):
+            plan = [(node, spec) for node in plan for spec in plan[node]]
+        plan = list(plan)
+
+        # Group by docker daemon, every daemon is bounded by its own workers.
+        daemons = {}
+        for i, (node, spec) in enumerate(plan):
+            client = self.node(node).docker_client
+            daemons.setdefault(id(client), []).append((i, node, spec))
+
+        def deploy_daemon(entries):
+            return parallel_map(lambda entry: self.node(entry[1]).run_spec(entry[2]),
+                                entries, workers)
+
+        results = [None] * len(plan)
+        for _, outcomes, _ in parallel_map(deploy_daemon, daemons.values(), len(daemons)):
+            for entry, result, _ in outcomes:
+                results[entry[0]] = result
+
+        for result in results:
+            if result['error'] is not None:
+                error('*** Failed to deploy %s on %s: %s\n' %
+                      (result['name'] or 'container', result['node'], result['error']))
+        return results
+
+    @phased('deploy')
+    def schedule(self, services, workers=8):
+        """
+        Deploy services in the order of their dependencies, each launched once its dependencies are ready.
+        Return the results with the time to ready of every service, see Scheduler.
+        """
+        results = Scheduler(self, services, workers).run()
+        for result in results:
+            if result['error'] is not None:
+                error('*** Failed to deploy %s on %s: %s\n' % (result['name'], result['node'], result['error']))
+        return results
+
+    @phased('scale')
+    def scale(self, name, count, nodes=None, template='{name}-{i}', workers=8):
+        """
+        Scale the replicas of a container to count, besides the container itself.
+        New replicas are spread over nodes round robin and created concurrently,
+        they are named after template, with {name} the container name and {i} the replica number,
+        and share its image and parameters, {name} in environment values is their own name.
+        Scaling down removes the newest replicas first.
+        Return the results of deploy for the created replicas, or of the removals.
+        """
+        _, c = self.container(name)
+        replicas = self.replicas.setdefault(name, [])
+        # Replicas removed by destroy are gone from the group.
+        replicas[:] = [r for r in replicas if r in self.index]
+
+        if count < len(replicas):
+            removed = replicas[count:]
+            del replicas[count:]
+            outcomes = parallel_map(self.destroy, reversed(removed), workers)
+            return [{'name': r, 'error': err} for r, result, err in outcomes]
+
+        if not nodes:
+            raise ValueError('nodes are required to scale up')
+        for node in nodes:
+            self.node(node)
+
+        if '{i}' not in template and count - len(replicas) > 1:
+            raise ValueError('template %s names a single replica, {i} is required to scale to %d' % (template, count))
+
+        used = set(replicas)
+        plan = []
+        i = 0
+        while len(replicas) + len(plan) < count:
+            i += 1
+            replica = template.replace('{name}', name).replace('{i}', str(i))
+            if replica in used or replica in self.index:
+                if '{i}' not in template:
+                    raise ValueError('replica %s already exists' % replica)
+                continue
+            used.add(replica)
+            spec = dict(c.template, image=c.image, name=replica)
+            if c.share is not None:
+                spec['share'] = c.share
+            plan.append((nodes[len(plan) % len(nodes)], spec))
+
+        results = self.deploy(plan, workers)
+        replicas.extend(r['name'] for r in results if r['error'] is None)
+        return results
+
+    @phased('teardown')
+    def destroyAll(self, workers=8):
+        """
+        Tear down all abstraction nodes: containers are removed concurrently,
+        the docker networks of this run in one prune, the veth pairs in one batch.
+        The journal is dropped only if everything is removed.
+        """
+        entries = [(node, c) for node in self.absnode_map.values()
+                   for c in list(node.container_list)]
+
+        def remove(entry):
+            node, c = entry
+            c.destroy()
+            node.detach(c)
+
+        for entry, _, err in parallel_map(remove, entries, workers):
+            if err is not None:
+                error('*** Failed to remove container %s:\n%s\n' %
+                      (entry[1].name, err))
+
+        pruned = executors.docker(None, 'networks.prune', self.env.docker_client.networks.prune,
+                                  filters={'label': 'fie.run=' + self.journal.run_id})
+        # A network still used by a container failed to be removed is kept.
+        deleted = set(pruned.get('NetworksDeleted') or [])
+        for node in self.absnode_map.values():
+            if node.dockerbridge is not None and node.network in deleted:
+                node.dockerbridge = None
+                self.journal.forget('network', node.network)
+            node.release_link()
+        self.link.commit()
+
+        if not self.journal.entries():
+            self.journal.clear()
+
+    def startTelemetry(self, interval=0.1, capacity=6000):
+        """
+        Sample the cgroup counters of abstraction nodes and their containers every interval seconds,
+        the latest capacity samples of each are kept.
+        """
+        backend = RSLimitedHost.cgroups or cgroup.detect()
+        hosts = dict((name, node.cg) for name, node in self.absnode_map.items())
+        self.sampler = Sampler(backend, hosts, interval=interval, capacity=capacity,
+                               state=self.env.state)
+        self.sampler.start()
+        return self.sampler
+
+    def stopTelemetry(self, path=None):
+        """Stop the sampler, and export the samples to path if given"""
+        if self.sampler is None:
+            return
+        self.sampler.stop()
+        if path is not None:
+            self.sampler.export(path)
+
+    def startLinkTelemetry(self, interval=0.1, capacity=6000):
+        """
+        Sample the counters and qdisc statistics of every link interface every interval seconds,
+        the latest capacity samples of each are kept.
+        """
+        self.stopLinkTelemetry()
+        self.linkSampler = LinkSampler(self, interval=interval, capacity=capacity)
+        self.linkSampler.start()
+        return self.linkSampler
+
+    def stopLinkTelemetry(self, path=None):
+        """Stop the link sampler, and export the samples to path if given"""
+        if self.linkSampler is None:
+            return
+        self.linkSampler.stop()
+        if path is not None:
+            self.linkSampler.export(path)
+
+    @phased('shape')
+    def startShaping(self, traces, loop=False):
+        """
+        Replay traces on links in the background, a dictionary of link name to shaping.Trace,
+        e.g. shaping.load('uplink.csv'). Links named in traces are reshaped as TCIntf ones.
+        """
+        self.stopShaping()
+        self.shaper = Shaper(self, traces, loop=loop)
+        self.shaper.start()
+        return self.shaper
+
+    def stopShaping(self, path=None):
+        """Stop the trace replay, and export its applied updates to path if given"""
+        if self.shaper is None:
+            return
+        self.shaper.stop()
+        if path is not None:
+            self.shaper.export(path)
+
+    @phased('start')
+    def start(self):
+        Mininet.start(self)
+
+    def profile(self, n=20, phase=None):
+        """The n slowest external operations, of phase if given, see Executor.profile"""
+        return executors.get().profile(n, phase)
+
+    @phased('stop')
+    def stop(self):
+        """Stop the shared resources of abstraction nodes, then mininet"""
+        self.stopTelemetry()
+        self.stopLinkTelemetry()
+        self.stopShaping()
+        if self.dns is not None:
+            self.dns.stop()
+        self.env.close()
+        Mininet.stop(self)
+
+def emulation(topo, runner, absnodeWorkers=1, images=None, telemetry=None, interval=0.1, profile=None,
+              daemon=None, linkTelemetry=None):
     # The abstraction node automatically wrapped here.
-    net = FIE(topo=topo)
+    # absnodeWorkers > 1 brings up abstraction nodes concurrently.
+    # telemetry is the path the resource samples are exported to, sampled every interval seconds.
+    # profile is the path the timed external operations are saved to, replayable by ReplayExecutor.
+    # linkTelemetry is the path the link samples are exported to, sampled every interval seconds.
+    # daemon is the unix socket path to serve the network on instead of the cli, see daemon.py.
+    net = FIE(topo=topo, absnodeWorkers=absnodeWorkers)
 
     try:
+        # Warm up the images used by runner, the pulls are kept out of the emulation.
+        if images:
+            net.prefetch(images)
         net.start()
         net.routeAll()
+        if telemetry:
+            net.startTelemetry(interval)
+        if linkTelemetry:
+            net.startLinkTelemetry(interval)
         runner(net)
-        cli.FCLI(net)
+        if daemon:
+            serve(net, daemon)
+        else:
+            cli.FCLI(net)
 
     finally:
-        for n in net.absnode_map:
-            net.absnode_map[n].destroyall()
+        if telemetry:
+            net.stopTelemetry(telemetry)
+        if linkTelemetry:
+            net.stopLinkTelemetry(linkTelemetry)
+        net.destroyAll()
         net.stop()
+        if profile:
+            executors.get().save(profile)
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Warm image cache, the images of a deployment are pulled once and in parallel before the emulation starts,
+so the pull times are never measured as container start latency.
+A local manifest records the pulled images, repeated runs skip the pulls of images still present.
+"""
+
+import json
+import os
+from docker.utils import parse_repository_tag
+from mininet.log import info, error
+from utils import parallel_map
+import executor
+
+MANIFEST = os.path.expanduser('~/.fie/images.json')
+
+
+def normalize(image):
+    """Return repository and tag of an image reference, the tag defaults to latest"""
+    repository, tag = parse_repository_tag(image)
+    return repository, tag or 'latest'
+
+
+class ImageCache(object):
+    """Prefetch images and keep the manifest of image reference to image id"""
+
+    def __init__(self, docker_client, manifest=MANIFEST):
+        self.docker_client = docker_client
+        self.manifest = manifest
+
+    def load(self):
+        """Load the manifest, a dictionary of image reference to id"""
+        try:
+            with open(self.manifest) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def save(self, records):
+        """Save the manifest atomically"""
+        directory = os.path.dirname(self.manifest)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp = self.manifest + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(records, f, indent=2, sort_keys=True)
+        os.rename(tmp, self.manifest)
+
+    def prefetch(self, images, workers=4):
+        """
+        Pull the missing images in parallel, each of them once.
+        Return a dictionary of the failed image references to errors.
+        """
+        refs = sorted(set('%s:%s' % normalize(image) for image in images))
+        records = self.load()
+
+        # One listing verifies the whole manifest, the images may be removed since last run.
+        # The tags present are authoritative, an image pulled by hand is recorded without pulling.
+        present = set()
+        for image in executor.docker(None, 'images.list', self.docker_client.images.list):
+            present.add(image.id)
+            for tag in image.tags:
+                records[tag] = image.id
+        missing = [ref for ref in refs if records.get(ref) not in present]
+
+        if missing:
+            info('*** Pulling images: %s\n' % ' '.join(missing))
+
+        def pull(ref):
+            repository, tag = normalize(ref)
+            return executor.docker(None, 'images.pull ' + ref, self.docker_client.images.pull,
+                                   repository, tag=tag).id
+
+        failures = {}
+        for ref, image_id, err in parallel_map(pull, missing, workers):
+            if err is None:
+                records[ref] = image_id
+            else:
+                failures[ref] = err
+                error('*** Failed to pull image %s:\n%s\n' % (ref, err))
+
+        self.save(records)
+        return failures
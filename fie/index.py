@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+The global index of containers, from container name to its abstraction node and container.
+Placement changes go through put and remove, each of them is atomic.
+"""
+
+from threading import Lock
+
+
+class ContainerIndex(object):
+    """Constant time lookups of containers by name"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = {}
+
+    def put(self, node, container):
+        """Place a container on node, replaces the previous placement of the same name"""
+        with self.lock:
+            self.entries[container.name] = (node, container)
+
+    def remove(self, name, node=None):
+        """
+        Remove a container, only if it is placed on node when node is given.
+        Return the removed (node, container) or None.
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or (node is not None and entry[0] is not node):
+                return None
+            return self.entries.pop(name)
+
+    def get(self, name):
+        """Return (node, container) of a container name, or None"""
+        with self.lock:
+            return self.entries.get(name)
+
+    def node(self, name):
+        """Return the abstraction node of a container name, or None"""
+        entry = self.get(name)
+        return None if entry is None else entry[0]
+
+    def items(self):
+        """A snapshot of (name, (node, container)) pairs"""
+        with self.lock:
+            return list(self.entries.items())
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
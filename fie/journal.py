@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+The on-disk journal of the resources created by an emulation.
+Every container, docker network and link is appended once created and marked once removed,
+so the resources left by a killed run can be reaped, see cleanup.py.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+JOURNAL = os.path.expanduser('~/.fie/journal')
+
+
+class Journal(object):
+    """
+    Append-only journal of json lines, {"op": "add" or "del", "kind": ..., "name": ...}.
+    The kinds are container, network and link.
+    """
+
+    def __init__(self, path=JOURNAL):
+        self.path = path
+        self.lock = Lock()
+        self.file = None
+        # Labels the docker networks of this run, so a bulk removal never touches another run.
+        self.run_id = '%d-%d' % (os.getpid(), int(time.time()))
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.file = open(self.path, 'a+')
+        # Terminate a line torn by a crash, the next entry starts on its own line.
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() > 0:
+            self.file.seek(-1, os.SEEK_END)
+            last = self.file.read(1)
+            # Switching from reading to writing needs a seek.
+            self.file.seek(0, os.SEEK_END)
+            if last != '\n':
+                self.file.write('\n')
+
+    def write(self, entry):
+        with self.lock:
+            if self.file is None:
+                self.open()
+            self.file.write(json.dumps(entry) + '\n')
+            # Flushed to the kernel on every entry, which survives the process being killed.
+            self.file.flush()
+
+    def record(self, kind, name, **attrs):
+        """Journal a created resource"""
+        entry = dict(attrs, op='add', kind=kind, name=name, run=self.run_id)
+        self.write(entry)
+
+    def forget(self, kind, name):
+        """Journal a removed resource"""
+        self.write({'op': 'del', 'kind': kind, 'name': name})
+
+    def entries(self):
+        """Replay the journal, return the live resources in creation order"""
+        # Re-created after a removal, a resource moves to the end.
+        live = OrderedDict()
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line torn by a crash.
+                        continue
+                    key = (entry['kind'], entry['name'])
+                    if entry['op'] == 'add':
+                        live[key] = entry
+                    else:
+                        live.pop(key, None)
+        except IOError:
+            return []
+        return list(live.values())
+
+    def clear(self):
+        """Drop the journal once everything is removed"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
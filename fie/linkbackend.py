@@ -0,0 +1,117 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Link and route backends used by abstraction nodes.
+The operations are expressed in iproute2 syntax, a namespace is represented by
+the mininet node owning it, or None for the root namespace.
+
+    ShellBackend: executes every operation right away, one process per operation.
+    BatchBackend: queues operations and applies them with a single `ip -batch`
+                  per namespace on commit.
+"""
+
+from threading import Lock
+from mininet.log import error
+import executor
+
+
+class LinkBackend(object):
+    """The interface of link and route backends"""
+
+    # The namespace nodes whose operations failed at the last commit, None for the root namespace.
+    failed = ()
+
+    def add_veth(self, name, peer):
+        """Create a veth pair in the root namespace"""
+        self.ip(None, 'link add %s type veth peer name %s' % (name, peer))
+
+    def set_up(self, dev, node=None):
+        """Up the device"""
+        self.ip(node, 'link set dev %s up' % dev)
+
+    def set_netns(self, dev, node):
+        """Move a root namespace device into the namespace of node and up it"""
+        self.ip(None, 'link set dev %s netns %s' % (dev, node.pid))
+        self.ip(node, 'link set dev %s up' % dev)
+
+    def add_addr(self, dev, addr, node=None):
+        """Add an address in cidr form to the device"""
+        self.ip(node, 'addr add %s dev %s' % (addr, dev))
+
+    def add_route(self, dest, gw, dev, node=None):
+        """Add (or replace) a route to dest subnet"""
+        via = ' via ' + gw if gw else ''
+        self.ip(node, 'route replace %s%s dev %s' % (dest, via, dev))
+
+    def del_route(self, dest, node=None):
+        """Delete the route to dest subnet"""
+        self.ip(node, 'route del %s' % dest)
+
+    def del_link(self, dev, node=None):
+        """Delete the device, the peer is removed as well for a veth pair"""
+        self.ip(node, 'link del %s' % dev)
+
+    def ip(self, node, line):
+        """Issue one ip command line (without the leading ip) in the namespace of node"""
+        raise NotImplementedError
+
+    def commit(self):
+        """Apply the pending operations, if any"""
+        pass
+
+
+class ShellBackend(LinkBackend):
+    """Execute each operation immediately, the behavior before batching"""
+
+    def ip(self, node, line):
+        if node is None:
+            executor.call(['ip'] + line.split(' '))
+        else:
+            executor.cmd(node, 'ip ' + line)
+
+
+class BatchBackend(LinkBackend):
+    """
+    Queue operations per namespace, commit them with one `ip -force -batch -` for each.
+    The root namespace goes first, so that links are moved before being configured.
+    Thread-safe, a single instance can be shared over the whole topology.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.order = []
+        self.batches = {}
+
+    def ip(self, node, line):
+        key = None if node is None else str(node.pid)
+        with self.lock:
+            if key not in self.batches:
+                self.batches[key] = (node, [])
+                self.order.append(key)
+            self.batches[key][1].append(line)
+
+    def commit(self):
+        """Apply all pending batches, return the number of failed batches"""
+        with self.lock:
+            batches = [self.batches[key] for key in self.order]
+            self.order = []
+            self.batches = {}
+
+        batches.sort(key=lambda batch: batch[0] is not None)
+
+        failed = []
+        for node, lines in batches:
+            args = ['ip', '-force', '-batch', '-']
+            _, err, returncode = executor.popen(node, args, '\n'.join(lines) + '\n')
+            if returncode != 0:
+                failed.append(node)
+                error('*** error: ip batch in %s: %s\n' %
+                      ('root' if node is None else node.name, err.strip()))
+        self.failed = failed
+        return len(failed)
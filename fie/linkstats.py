@@ -0,0 +1,381 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Link telemetry of the emulated topology: interface counters and qdisc statistics of every link,
+i.e. the switch and host interfaces of mininet links, and the eth1/dport pair of abstraction nodes.
+Each namespace keeps an rtnetlink socket opened inside it, a sample is one link dump and one qdisc dump
+per namespace, no process is spawned.
+Samples are kept in ring buffers as the resource telemetry, see telemetry.py, and exported in its format.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import socket
+import struct
+import time
+from threading import Thread, Event, Lock
+from mininet.log import error
+from telemetry import RingBuffer, human
+import telemetry
+
+# The columns of every series, counters are cumulative as reported by the kernel.
+COLUMNS = ('time', 'rx_bytes', 'tx_bytes', 'rx_packets', 'tx_packets',
+           'rx_dropped', 'tx_dropped', 'qdisc_drops', 'overlimits', 'backlog', 'qlen')
+
+MAGIC = 'FIE-LINKSTATS 1'
+
+NETLINK_ROUTE = 0
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_GETLINK = 18
+RTM_GETQDISC = 38
+IFLA_IFNAME = 3
+IFLA_STATS = 7
+IFLA_STATS64 = 23
+TCA_KIND = 1
+TCA_STATS = 3
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+TC_H_ROOT = 0xFFFFFFFF
+CLONE_NEWNET = 0x40000000
+
+_libc = None
+
+
+def setns(fd):
+    """Move the calling thread into the network namespace of fd"""
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if _libc.setns(fd, CLONE_NEWNET) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def netlink_socket(pid=None):
+    """An rtnetlink socket in the network namespace of pid, the current one if None"""
+    if pid is None:
+        return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    own = os.open('/proc/thread-self/ns/net', os.O_RDONLY)
+    target = os.open('/proc/%d/ns/net' % pid, os.O_RDONLY)
+    try:
+        setns(target)
+        try:
+            # A socket stays in the namespace it is created in.
+            return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        finally:
+            setns(own)
+    finally:
+        os.close(own)
+        os.close(target)
+
+
+def attributes(data, offset):
+    """Parse the netlink attributes from offset, return a dictionary of type to payload"""
+    attrs = {}
+    while offset + 4 <= len(data):
+        length, kind = struct.unpack_from('=HH', data, offset)
+        if length < 4:
+            break
+        # Without the nested and byte order flags.
+        attrs[kind & 0x3fff] = data[offset + 4:offset + length]
+        offset += (length + 3) & ~3
+    return attrs
+
+
+class Netlink(object):
+    """Dumps of the interfaces and qdiscs of a namespace"""
+
+    def __init__(self, pid=None):
+        self.sock = netlink_socket(pid)
+        self.sock.bind((0, 0))
+        self.seq = 0
+
+    def dump(self, msg_type, payload):
+        """Send a dump request, return the payloads of the answered messages"""
+        self.seq += 1
+        self.sock.send(struct.pack('=IHHII', 16 + len(payload), msg_type,
+                                   NLM_F_REQUEST | NLM_F_DUMP, self.seq, 0) + payload)
+        messages = []
+        while True:
+            data = self.sock.recv(1 << 16)
+            offset = 0
+            while offset + 16 <= len(data):
+                length, kind, _, seq, _ = struct.unpack_from('=IHHII', data, offset)
+                if length < 16:
+                    break
+                if seq == self.seq:
+                    if kind == NLMSG_DONE:
+                        return messages
+                    if kind == NLMSG_ERROR:
+                        errno = -struct.unpack_from('=i', data, offset + 16)[0]
+                        if errno:
+                            raise OSError(errno, os.strerror(errno))
+                    else:
+                        messages.append(data[offset + 16:offset + length])
+                offset += (length + 3) & ~3
+
+    def links(self):
+        """Interface index -> (name, rx_bytes, tx_bytes, rx_packets, tx_packets, rx_dropped, tx_dropped)"""
+        result = {}
+        for msg in self.dump(RTM_GETLINK, struct.pack('=BxHiII', socket.AF_UNSPEC, 0, 0, 0, 0)):
+            index = struct.unpack_from('=BxHiII', msg)[2]
+            attrs = attributes(msg, 16)
+            name = attrs.get(IFLA_IFNAME, b'').rstrip(b'\0').decode()
+            if IFLA_STATS64 in attrs:
+                stats = struct.unpack_from('=8Q', attrs[IFLA_STATS64])
+            elif IFLA_STATS in attrs:
+                stats = struct.unpack_from('=8I', attrs[IFLA_STATS])
+            else:
+                stats = (0,) * 8
+            rx_packets, tx_packets, rx_bytes, tx_bytes, _, _, rx_dropped, tx_dropped = stats
+            result[index] = (name, rx_bytes, tx_bytes, rx_packets, tx_packets, rx_dropped, tx_dropped)
+        return result
+
+    def qdiscs(self):
+        """
+        Interface index -> (drops, overlimits, backlog bytes, queue length) of the root egress qdisc,
+        which accounts for the qdiscs below it, e.g. the netem under htb.
+        """
+        result = {}
+        for msg in self.dump(RTM_GETQDISC, struct.pack('=BxxxiIII', socket.AF_UNSPEC, 0, 0, 0, 0)):
+            _, index, _, parent, _ = struct.unpack_from('=BxxxiIII', msg)
+            if parent != TC_H_ROOT:
+                continue
+            attrs = attributes(msg, 20)
+            if TCA_STATS2 in attrs:
+                nested = attributes(attrs[TCA_STATS2], 0)
+                if TCA_STATS_QUEUE not in nested:
+                    continue
+                qlen, backlog, drops, _, overlimits = struct.unpack_from('=5I', nested[TCA_STATS_QUEUE])
+            elif TCA_STATS in attrs:
+                _, _, drops, overlimits, _, _, qlen, backlog = struct.unpack_from('=QIIIIIII', attrs[TCA_STATS])
+            else:
+                continue
+            result[index] = (drops, overlimits, backlog, qlen)
+        return result
+
+    def close(self):
+        self.sock.close()
+
+
+class LinkSeries(object):
+    """The samples of one interface, one ring buffer per column"""
+
+    def __init__(self, name, node, link, bw, capacity):
+        self.name = name
+        # The owner of the namespace, root for the switches and the dport ends.
+        self.node = node
+        # The link of the interface, e.g. s1-s2, or the abstraction node of an eth1/dport end
+        self.link = link
+        # The shaped bandwidth in Mbit/s, None if unshaped
+        self.bw = bw
+        self.columns = dict((column, RingBuffer(capacity)) for column in COLUMNS)
+
+    def append(self, row):
+        for column, value in zip(COLUMNS, row):
+            self.columns[column].append(value)
+
+    def last(self, n=1):
+        """The latest n rows, as a list of dictionaries of column to value"""
+        columns = dict((c, self.columns[c].last(n)) for c in COLUMNS)
+        return [dict((c, columns[c][i]) for c in COLUMNS) for i in range(len(columns['time']))]
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def rates(self, window=1.0, interval=0.1):
+        """
+        The traffic over the latest window seconds, sampled every interval seconds:
+        rx and tx in bits per second, drops (of the device and the qdiscs) and overlimits per second,
+        the backlog in bytes and packets, and the utilization of the shaped bandwidth in percent.
+        Return None until two samples are taken.
+        """
+        rows = self.last(int(window / interval) + 1)
+        if len(rows) < 2:
+            return None
+        first, last = rows[0], rows[-1]
+        elapsed = last['time'] - first['time']
+        if elapsed <= 0:
+            return None
+        delta = lambda column: max(last[column] - first[column], 0) / elapsed
+        tx = delta('tx_bytes') * 8
+        return {'rx': delta('rx_bytes') * 8, 'tx': tx,
+                'drops': delta('rx_dropped') + delta('tx_dropped') + delta('qdisc_drops'),
+                'overlimits': delta('overlimits'),
+                'backlog': last['backlog'], 'qlen': last['qlen'],
+                'util': tx / (self.bw * 1e4) if self.bw else None}
+
+
+class LinkSampler(object):
+    """
+    Sample the interfaces of the links of net every interval seconds, the latest capacity samples are kept.
+    The namespaces are looked up again every rescan seconds, for the nodes added at runtime.
+    """
+
+    def __init__(self, net, interval=0.1, capacity=6000, rescan=1.0):
+        self.net = net
+        self.interval = interval
+        self.capacity = capacity
+        self.rescan_interval = rescan
+        self.lock = Lock()
+        # interface name -> LinkSeries
+        self.series = {}
+        # namespace name -> (Netlink, {interface name: (link, bw)})
+        self.namespaces = {}
+        self.stopped = Event()
+        self.thread = None
+        self.last_scan = 0
+
+    def interfaces(self):
+        """Namespace name -> (pid or None, {interface name: (link, bw)}) of the topology"""
+        result = {}
+
+        def add(node, name, link, bw=None):
+            key, pid = ('root', None) if node is None or not node.inNamespace else (node.name, node.pid)
+            result.setdefault(key, (pid, {}))[1][name] = (link, bw)
+
+        for link in self.net.links:
+            label = '%s-%s' % (link.intf1.node.name, link.intf2.node.name)
+            for intf in (link.intf1, link.intf2):
+                params = getattr(intf, 'params', {}) or {}
+                add(intf.node, intf.name, label, params.get('bw'))
+        for name, node in self.net.absnode_map.items():
+            add(node.head_node, name + '-eth1', name)
+            add(None, name + '-dport', name)
+        return result
+
+    def scan(self):
+        """Open the namespaces of new nodes, close the ones of removed nodes"""
+        wanted = self.interfaces()
+        for key in list(self.namespaces):
+            if key not in wanted:
+                self.namespaces.pop(key)[0].close()
+        for key, (pid, names) in wanted.items():
+            if key in self.namespaces:
+                self.namespaces[key] = (self.namespaces[key][0], names)
+                continue
+            try:
+                self.namespaces[key] = (Netlink(pid), names)
+            except (OSError, socket.error) as e:
+                error('*** error: link telemetry of %s: %s\n' % (key, e))
+        self.last_scan = time.time()
+
+    def sample(self):
+        """Take one sample of every interface, one link and one qdisc dump per namespace"""
+        for key, (netlink, names) in list(self.namespaces.items()):
+            try:
+                links = netlink.links()
+                qdiscs = netlink.qdiscs()
+            except (OSError, socket.error):
+                # The namespace is gone, dropped on the next scan.
+                continue
+            now = time.time()
+            for index, (name, rx_bytes, tx_bytes, rx_packets, tx_packets, rx_dropped, tx_dropped) in links.items():
+                if name not in names:
+                    continue
+                series = self.series.get(name)
+                if series is None:
+                    link, bw = names[name]
+                    series = LinkSeries(name, key, link, bw, self.capacity)
+                    with self.lock:
+                        self.series[name] = series
+                drops, overlimits, backlog, qlen = qdiscs.get(index, (0, 0, 0, 0))
+                series.append((now, rx_bytes, tx_bytes, rx_packets, tx_packets, rx_dropped, tx_dropped,
+                               drops, overlimits, backlog, qlen))
+
+    def start(self):
+        self.scan()
+        self.thread = Thread(target=self.loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def running(self):
+        return self.thread is not None
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for netlink, _ in self.namespaces.values():
+            netlink.close()
+        self.namespaces = {}
+
+    def loop(self):
+        deadline = time.time()
+        while not self.stopped.is_set():
+            try:
+                if time.time() - self.last_scan >= self.rescan_interval:
+                    self.scan()
+                self.sample()
+            except Exception as e:
+                error('*** error: link telemetry sampler: %s\n' % e)
+            # Scheduled on absolute deadlines, as the resource sampler.
+            deadline += self.interval
+            delay = deadline - time.time()
+            if delay < 0:
+                deadline = time.time()
+                delay = 0
+            self.stopped.wait(delay)
+
+    def latest(self):
+        """A snapshot of interface name -> LinkSeries"""
+        with self.lock:
+            return dict(self.series)
+
+    def export(self, path):
+        """Write all series to a columnar file, in the format of telemetry.Sampler.export"""
+        series = sorted(self.latest().values(), key=lambda s: (s.link, s.name))
+        header = {'columns': list(COLUMNS), 'typecode': 'd', 'series': [
+            {'name': s.name, 'node': s.node, 'link': s.link, 'bw': s.bw, 'length': len(s)}
+            for s in series]}
+        with open(path, 'wb') as f:
+            f.write((MAGIC + '\n' + json.dumps(header) + '\n').encode())
+            for s in series:
+                for column in COLUMNS:
+                    s.columns[column].values().tofile(f)
+
+
+def bits(value):
+    """Format bits per second, e.g. 1.5M"""
+    for unit in ('', 'K', 'M', 'G'):
+        if abs(value) < 1000 or unit == 'G':
+            return '%.1f%s' % (value, unit)
+        value /= 1000.0
+
+
+def table(sampler, window=1.0, count=None):
+    """Render the latest traffic of the interfaces, the busiest first, the count busiest if given"""
+    rows = []
+    for s in sampler.latest().values():
+        rates = s.rates(window, sampler.interval)
+        if rates is not None:
+            rows.append((s, rates))
+    # The interfaces closest to their shaped bandwidth first, then the busiest unshaped ones.
+    rows.sort(key=lambda row: (row[1]['util'] is None, -(row[1]['util'] or 0), -row[1]['tx']))
+    lines = ['%-16s %-16s %9s %9s %6s %9s %9s %10s' %
+             ('INTERFACE', 'LINK', 'RX b/s', 'TX b/s', 'UTIL%', 'DROPS/s', 'OVERLIM/s', 'BACKLOG')]
+    for s, rates in rows[:count]:
+        util = '%5.1f%%' % rates['util'] if rates['util'] is not None else '-'
+        lines.append('%-16s %-16s %9s %9s %6s %9.1f %9.1f %10s' %
+                     (s.name, s.link, bits(rates['rx']), bits(rates['tx']), util,
+                      rates['drops'], rates['overlimits'],
+                      '%s/%dp' % (human(rates['backlog']), rates['qlen'])))
+    return '\n'.join(lines)
+
+
+def load(path):
+    """Load an exported file, return a dictionary of interface name to its header and columns"""
+    return telemetry.load(path, MAGIC)
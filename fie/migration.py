@@ -0,0 +1,222 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Container migration between abstraction nodes, with the downtime measured.
+cold destroys the container and runs a fresh one on the destination.
+live checkpoints the processes with CRIU through docker checkpoints and restores them
+in a container on the destination network, which needs the docker daemon in experimental mode.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import docker
+from mininet.log import error
+import executor
+
+# Checkpoints are written to memory when possible, the dump is part of the downtime.
+CHECKPOINT_ROOT = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def checkpoint(client, container_id, name, directory):
+    """Checkpoint a container into directory/name and stop it"""
+    api = client.api
+    res = executor.docker(None, 'checkpoint ' + name, api._post_json,
+                          api._url('/containers/{0}/checkpoints', container_id),
+                          data={'CheckpointID': name, 'CheckpointDir': directory, 'Exit': True})
+    api._raise_for_status(res)
+
+
+def restore(client, container_id, name, directory):
+    """Start a created container from the checkpoint directory/name"""
+    api = client.api
+    res = executor.docker(None, 'restore ' + name, api._post,
+                          api._url('/containers/{0}/start', container_id),
+                          params={'checkpoint': name, 'checkpoint-dir': directory})
+    api._raise_for_status(res)
+
+
+def cold(src, dst, c):
+    """
+    Destroy the container and run it again on dst, the state is lost.
+    If it fails to run on dst, it is run again on src and the error is reported.
+    """
+    # Admitted ahead, a container which does not fit on dst keeps running.
+    dst.use_budget(c)
+    start = time.time()
+    try:
+        c.destroy()
+    except Exception:
+        dst.release_budget(c)
+        raise
+    src.detach(c, unindex=False)
+    report = {'mode': 'cold', 'name': c.name, 'src': src.name, 'dst': dst.name,
+              'prepare': 0.0, 'checkpoint': 0.0, 'error': None}
+    try:
+        dst.dry_run(c)
+    except Exception as e:
+        dst.release_budget(c)
+        error('*** Failed to run %s on %s: %s\n' % (c.name, dst.name, e))
+        report['error'] = str(e)
+        try:
+            src.dry_run(c)
+            report['error'] += ', restarted on ' + src.name
+        except Exception as e:
+            # Gone from both nodes, and from the index along with them.
+            error('*** Failed to restart %s on %s: %s\n' % (c.name, src.name, e))
+            src.index.remove(c.name, node=src)
+            report['error'] += ', failed to restart on %s: %s' % (src.name, e)
+    downtime = time.time() - start
+    report.update({'restore': downtime, 'downtime': downtime, 'total': downtime})
+    return report
+
+
+def live(src, dst, c, precopy=True):
+    """
+    Checkpoint the container and restore it on dst, the processes keep their memory.
+    Docker has no iterative pre-dump, so precopy moves everything but the dump ahead of the freeze:
+    the destination container is created before the checkpoint, under a temporary name.
+    Without precopy it is created within the frozen window.
+    If the restore fails, the container is cold started on dst instead and the error is reported.
+    If anything else fails past the checkpoint, the container goes back to src, restored from the checkpoint
+    when possible. The checkpoint is kept, and its directory reported, unless a restore succeeded.
+    """
+    client = dst.docker_client
+    report = {'mode': 'live' if precopy else 'live-noprecopy', 'name': c.name,
+              'src': src.name, 'dst': dst.name, 'prepare': 0.0, 'error': None}
+    directory = tempfile.mkdtemp(prefix='fie-checkpoint-', dir=CHECKPOINT_ROOT)
+    checkpoint_name = 'migrate-%d' % int(time.time())
+    staging = c.name + '-restore'
+    ip = dst.addresses.allocate() if dst.static_ip else None
+    old_ip = c.ip
+    # The id of the destination container, the source may still hold the name.
+    staged = [None]
+
+    def prepare():
+        # The destination container is the same declaration placed on dst.
+        c.cg_parent, c.network, c.ip = dst.cg, dst.network, ip
+        dst.use_dns(c)
+        dst.use_cpus(c)
+        dst.use_budget(c)
+        dst.journal.record('container', staging)
+        staged[0] = c.create(name=staging)
+
+    def undo():
+        """Remove the destination container and give the resources of dst back"""
+        if staged[0] is not None:
+            try:
+                executor.docker(dst.name, 'remove_container ' + staging,
+                                client.api.remove_container, staged[0], force=True)
+            except docker.errors.APIError:
+                pass
+        dst.journal.forget('container', staging)
+        dst.release_cpus(c)
+        dst.release_budget(c)
+        c.cg_parent, c.network, c.ip = src.cg, src.network, old_ip
+        if ip is not None:
+            dst.addresses.release(ip)
+
+    def rollback():
+        # The source keeps running, undo the destination.
+        undo()
+        src.use_cpus(c)
+        src.use_budget(c)
+
+    def recover(e, destroyed, renamed):
+        """Bring the container back on src after a failure past the checkpoint, return whether it is restored"""
+        error('*** Failed to migrate %s to %s, back to %s: %s\n' % (c.name, dst.name, src.name, e))
+        report['error'] = str(e)
+        undo()
+        if renamed:
+            dst.journal.forget('container', c.name)
+        restored = False
+        try:
+            src.use_dns(c)
+            src.use_cpus(c)
+            src.use_budget(c)
+            if destroyed:
+                src.journal.record('container', c.name)
+                c.id = c.create()
+                c.container = src.docker_client.containers.prepare_model({'Id': c.id})
+            try:
+                restore(src.docker_client, c.container.id, checkpoint_name, directory)
+                restored = True
+            except docker.errors.APIError:
+                executor.docker(src.name, 'start ' + c.name, src.docker_client.api.start, c.container.id)
+            c.pid = c.log_pid()
+            if destroyed:
+                src.attach(c)
+            report['error'] += ', %s on %s' % ('restored' if restored else 'restarted', src.name)
+        except Exception as e:
+            # Gone from both nodes, and from the index along with them.
+            error('*** Failed to restart %s on %s: %s\n' % (c.name, src.name, e))
+            try:
+                c.destroy()
+            except Exception:
+                pass
+            src.detach(c)
+            report['error'] += ', failed to restart on %s: %s' % (src.name, e)
+        return restored
+
+    started = time.time()
+    try:
+        if precopy:
+            prepare()
+            report['prepare'] = time.time() - started
+        else:
+            # Admitted ahead of the freeze, a container which does not fit on dst keeps running.
+            dst.use_budget(c)
+        frozen = time.time()
+        checkpoint(src.docker_client, c.container.id, checkpoint_name, directory)
+    except Exception:
+        rollback()
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    report['checkpoint'] = time.time() - frozen
+
+    restoring = time.time()
+    destroyed = renamed = restored = False
+    try:
+        # The checkpoint stopped the source, which gives its name up to the destination.
+        c.ip = old_ip
+        c.destroy()
+        src.detach(c, unindex=False)
+        destroyed = True
+        c.ip = ip
+        if staged[0] is None:
+            prepare()
+        dst.journal.record('container', c.name)
+        renamed = True
+        executor.docker(dst.name, 'rename ' + c.name, client.api.rename, staged[0], c.name)
+        dst.journal.forget('container', staging)
+        c.id = staged[0]
+        c.container = client.containers.prepare_model({'Id': staged[0]})
+
+        restoring = time.time()
+        try:
+            restore(client, staged[0], checkpoint_name, directory)
+            restored = True
+        except docker.errors.APIError as e:
+            error('*** Failed to restore %s on %s, cold started instead: %s\n' % (c.name, dst.name, e))
+            report['error'] = '%s, cold started on %s' % (e, dst.name)
+            executor.docker(dst.name, 'start ' + c.name, client.api.start, staged[0])
+        c.pid = c.log_pid()
+        dst.attach(c)
+    except Exception as e:
+        restored = recover(e, destroyed, renamed)
+    report['restore'] = time.time() - restoring
+    report['downtime'] = time.time() - frozen
+    if restored:
+        shutil.rmtree(directory, ignore_errors=True)
+    else:
+        error('*** The checkpoint of %s is kept in %s\n' % (c.name, directory))
+        report['error'] += ', the checkpoint is kept in ' + directory
+    report['total'] = time.time() - started
+    return report
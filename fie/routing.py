@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+The routing planner of abstraction nodes.
+Every abstraction node reaches the ip pool of another one through the eth0 address of its head node.
+The planner computes these static routes once, keeps what has been installed per node,
+and only pushes the differences, one link backend batch per namespace.
+"""
+
+import ipaddress
+from utils import network
+
+
+class RoutePlanner(object):
+    """
+    Plan and install static routes between abstraction nodes.
+    With summarize, the subnets sharing a gateway are collapsed into supernets where possible,
+    e.g. a node holding 192.168.4.0/24 and 192.168.5.0/24 is reached by 192.168.4.0/23.
+    """
+
+    def __init__(self, link, summarize=True):
+        self.link = link
+        self.summarize = summarize
+        # name -> abstraction node
+        self.nodes = {}
+        # name -> eth0 address of the head node
+        self.gateways = {}
+        # name -> {prefix: gateway} installed in the namespace
+        self.installed = {}
+        # name -> {prefix: gateway} queued by sync, installed once committed
+        self.pending = {}
+        # name -> (ip pool, gateway) of the nodes of other workers, see distributed.py
+        self.remote = {}
+
+    def plan(self, name):
+        """Compute the route table of a node, return a dictionary of prefix to gateway"""
+        subnets = {}
+        for other in self.nodes.values():
+            if other.name == name:
+                continue
+            gw = self.gateways[other.name]
+            subnets.setdefault(gw, []).extend(self.pools(other))
+        for other, (pool, gw) in self.remote.items():
+            if other not in self.nodes:
+                subnets.setdefault(gw, []).append(network(pool))
+
+        table = {}
+        for gw, nets in subnets.items():
+            if self.summarize:
+                nets = ipaddress.collapse_addresses(nets)
+            for net in nets:
+                table[str(net)] = gw
+        return table
+
+    def pools(self, node):
+        """The subnets owned by a node"""
+        return [network(node.ip_pool)]
+
+    def sync(self, name):
+        """Queue the differences between the planned and the installed table of a node"""
+        node = self.nodes[name]
+        dev = name + '-eth0'
+        old = self.installed.get(name, {})
+        new = self.plan(name)
+
+        # Add before delete, the traffic is never left without a route during resummarization.
+        for prefix, gw in new.items():
+            if old.get(prefix) != gw:
+                self.link.add_route(prefix, gw, dev, node.head_node)
+        for prefix in old:
+            if prefix not in new:
+                self.link.del_route(prefix, node.head_node)
+
+        self.pending[name] = new
+
+    def commit(self):
+        """Commit the queued differences, a table is installed only if the batch of its namespace applied"""
+        pending, self.pending = self.pending, {}
+        self.link.commit()
+        failed = self.link.failed
+        for name, table in pending.items():
+            if self.nodes[name].head_node in failed:
+                # Applied in part at best, the next sync pushes the whole table again.
+                self.installed.pop(name, None)
+            else:
+                self.installed[name] = table
+
+    def register(self, node):
+        """Track a node without pushing anything yet"""
+        self.nodes[node.name] = node
+        self.gateways[node.name] = node.head_node.IP(node.name + '-eth0')
+
+    def route(self, nodes):
+        """Install the full route table of nodes"""
+        for node in nodes:
+            self.register(node)
+        for name in self.nodes:
+            self.sync(name)
+        self.commit()
+
+    def add_node(self, node):
+        """A node joins, the others learn its subnets and it learns theirs"""
+        self.register(node)
+        for name in self.nodes:
+            self.sync(name)
+        self.commit()
+
+    def remove_node(self, name):
+        """A node leaves, its subnets are withdrawn from the others"""
+        if name not in self.nodes:
+            return
+        del self.nodes[name]
+        del self.gateways[name]
+        self.installed.pop(name, None)
+        for other in self.nodes:
+            self.sync(other)
+        self.commit()
@@ -11,14 +11,34 @@ This file is modified from mininet/node.py.
 """
 
 from mininet.node import CPULimitedHost, Host, Node
-from mininet.util import (quietRun, errFail)
+from mininet.util import mountCgroups
 from mininet.log import error
-from subprocess import call, check_call
+import cgroup
+import executor
+
+# The limit options of config, in the order they are applied, and their setters.
+LIMITS = [
+    ('cpu', 'setCPUFrac'),
+    ('mem', 'setMem'),
+    ('memsw', 'setMemSW'),
+    ('oom_control', 'setOOM'),
+    ('swappiness', 'setSwappiness'),
+    ('cores', 'setCPUs'),
+    ('device_write_bps', 'setDeviceWriteBps'),
+    ('device_write_iops', 'setDeviceWriteIOps'),
+    ('device_read_bps', 'setDeviceReadBps'),
+    ('device_read_iops', 'setDeviceReadIOps'),
+    ('blkio_weight', 'setBlkioWeight'),
+    ('blkio_weight_device', 'setBlkioWeightDevice'),
+]
 
 
 class RSLimitedHost(CPULimitedHost):
     """The Resource Limited Host Class"""
 
+    # The cgroup backend, v1 or v2 as mounted, see cgroup.py
+    cgroups = None
+
     def __init__(self, name, sched='cfs', **kwargs):
         """Initailized Resource Limited Host Class"""
         Host.__init__(self, name, **kwargs)
@@ -27,10 +47,11 @@ class RSLimitedHost(CPULimitedHost):
             RSLimitedHost.init()
 
         self.cgroup = 'cpu,cpuacct,cpuset,memory,blkio:/' + self.name
+        # Pending (resource, param, value) while limits are applied in one pass, see cgroupBatch
+        self.pending = None
 
-        errFail('cgcreate -g ' + self.cgroup)
-        errFail('cgclassify -g cpu,cpuacct,memory,blkio:/%s %s' %
-                (self.name, self.pid))
+        executor.run('cgroup', self.name, 'create', self.cgroups.create, self.name)
+        executor.run('cgroup', self.name, 'classify', self.cgroups.classify, self.name, self.pid)
 
         self.period_us = kwargs.get('period_us', 100000)
         self.sched = sched
@@ -38,35 +59,71 @@ class RSLimitedHost(CPULimitedHost):
             self.checkRtGroupSched()
             self.rtprio = 20
 
-    # Overwrite cgroupSet for ignore blkio
+    @classmethod
+    def init(cls):
+        """Detect the cgroup hierarchy, mininet only knows how to mount v1"""
+        cls.cgroups = cgroup.detect()
+        if cls.cgroups.version == 1:
+            mountCgroups()
+        cls.inited = True
+
+    # Overwrite cgroupSet for writing cgroupfs directly
     def cgroupSet(self, param, value, resource='cpu'):
         "Set a cgroup parameter and return its value"
 
-        # Replace the old form to the new string formatting in python
-        cmd = 'cgset -r {0}.{1}={2} /{3}'.format(
-            resource, param, value, self.name)
-
-        # Mininet will split the whitespaces into list for subprocess call...
-        # In the blkio, we need whitespaces in a " ", can't be used
-        # That is, use shell=True flag instead.
+        # Queued while batching, the whole batch is written at once.
+        if self.pending is not None:
+            self.pending.append((resource, param, value))
+            return value
 
-        if resource == 'blkio':
-            call(cmd, shell=True)
-        else:
-            quietRun(cmd)
+        executor.run('cgroup', self.name, 'apply %s.%s' % (resource, param),
+                     self.cgroups.apply, self.name, [(resource, param, value)])
 
         # TODO: Currently, we don't check for blkio.
-        if resource is 'blkio':
+        if resource == 'blkio':
             return value
-        if resource is 'memory':
-            if param is 'oom_control':
+        if resource == 'memory':
+            if param == 'oom_control':
                 return value
 
-        nvalue = int(self.cgroupGet(param, resource))
-        if nvalue != value:
+        nvalue = self.cgroupGet(param, resource)
+        # Not every parameter can be read back in cgroup v2.
+        if nvalue is None:
+            return value
+        if str(nvalue) != str(value):
             error('*** error: cgroupSet: %s set to %s instead of %s\n'
                   % (param, nvalue, value))
-        return nvalue
+        return int(nvalue) if isinstance(value, int) else nvalue
+
+    def cgroupGet(self, param, resource='cpu'):
+        "Return the value of a cgroup parameter"
+        return self.cgroups.get(self.name, resource, param)
+
+    def cgroupDel(self):
+        "Clean up our cgroup"
+        executor.run('cgroup', self.name, 'remove', self.cgroups.remove, self.name)
+        return True
+
+    def cgroupBatch(self):
+        """Start queueing cgroupSet, until cgroupFlush"""
+        self.pending = []
+
+    def cgroupFlush(self):
+        """Write the queued parameters in one pass, return the failed ones"""
+        pending, self.pending = self.pending, None
+        return executor.run('cgroup', self.name, 'apply %d' % len(pending or []),
+                            self.cgroups.apply, self.name, pending or [])
+
+    def setCPUs(self, cores, mems=0):
+        """Specify (real) cores that our cgroup can run on"""
+        if not cores:
+            return
+        if isinstance(cores, list):
+            cores = ','.join([str(c) for c in cores])
+        self.cgroupSet(resource='cpuset', param='cpus', value=cores)
+        # Memory placement is probably not relevant, but we must specify it anyway.
+        # The head process is classified into cpuset on creation already.
+        self.cgroupSet(resource='cpuset', param='mems', value=mems)
 
     # We'll not dealing with logging statistics here
     # Set cgroup memory metrics, support:
@@ -176,21 +233,26 @@ class RSLimitedHost(CPULimitedHost):
         r = Node.config(self, **params)
 
         # Add memory for params, mininet already add to setCPUs function, but not used though.
-        self.setParam(r, 'setCPUFrac', cpu=cpu)
-        self.setParam(r, 'setMem', mem=mem)
-        self.setParam(r, 'setMemSw', memsw=memsw)
-        self.setParam(r, 'setOOM', oom_control=oom_control)
-        self.setParam(r, 'setSwappiness', swappiness=swappiness)
-        self.setParam(r, 'setCPUs', cores=cores)
-        self.setParam(r, 'setDeviceWriteBps',
-                      device_write_bps=device_write_bps)
-        self.setParam(r, 'setDeviceWriteIOps',
-                      device_write_iops=device_write_iops)
-        self.setParam(r, 'setDeviceReadBps', device_read_bps=device_read_bps)
-        self.setParam(r, 'setDeviceReadIOps',
-                      device_read_iops=device_read_iops)
-        self.setParam(r, 'setBlkioWeight', blkio_weight=blkio_weight)
-        self.setParam(r, 'setBlkioWeightDevice',
-                      blkio_weight_device=blkio_weight_device)
+        limits = dict(cpu=cpu, cores=cores,
+                      mem=mem, memsw=memsw, oom_control=oom_control, swappiness=swappiness,
+                      device_write_bps=device_write_bps, device_write_iops=device_write_iops,
+                      device_read_bps=device_read_bps, device_read_iops=device_read_iops,
+                      blkio_weight=blkio_weight, blkio_weight_device=blkio_weight_device)
+        r.update(self.limit(**limits))
+
+        return r
 
+    def limit(self, **limits):
+        """
+        Set resource limits in one pass of cgroupfs writes, at configuration or at runtime.
+        Takes the limit options of config, e.g. limit(cpu=0.2, mem=256).
+        """
+        r = {}
+        self.cgroupBatch()
+        try:
+            for name, method in LIMITS:
+                if name in limits:
+                    self.setParam(r, method, **{name: limits[name]})
+        finally:
+            self.cgroupFlush()
         return r
@@ -0,0 +1,257 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Dependency-aware deployment: services declare the services they start after, and a readiness probe.
+A service is launched as soon as all of its dependencies are ready, independent branches go in parallel,
+so the cold start is as fast as the dependencies allow without fixed sleeps.
+
+    net.schedule([
+        {'name': 'controller', 'node': 'cloud1', 'spec': {...}, 'ready': {'tcp': 2551}},
+        {'name': 'analytics', 'node': 'fog1', 'spec': {...}, 'after': ['controller'],
+         'ready': {'log': 'joined cluster', 'timeout': 120}},
+    ])
+
+A probe is a tcp port of the container, a command exiting 0 in it, a pattern in its logs,
+or by default, the container seen running.
+"""
+
+import re
+import sys
+import time
+from threading import Condition, Semaphore, Thread
+import docker
+import executor
+
+
+class NotReady(Exception):
+    """Raised when a service is not ready within the timeout of its probe"""
+
+
+class Probe(object):
+    """Readiness check of a container, polled every interval seconds until timeout"""
+
+    def __init__(self, timeout=60.0, interval=0.2):
+        self.timeout = timeout
+        self.interval = interval
+
+    def ready(self, node, c):
+        raise NotImplementedError
+
+    def wait(self, node, c):
+        deadline = time.time() + self.timeout
+        while not self.ready(node, c):
+            if time.time() >= deadline:
+                raise NotReady('%s is not ready after %.1fs: %s' % (c.name, self.timeout, self))
+            time.sleep(self.interval)
+
+
+class Running(Probe):
+    """The container is seen running"""
+
+    def ready(self, node, c):
+        return c.status() == 'running'
+
+    def __str__(self):
+        return 'running'
+
+
+class TCPProbe(Probe):
+    """The container accepts connections on port, tried from the namespace of its abstraction node"""
+
+    def __init__(self, port, **opts):
+        Probe.__init__(self, **opts)
+        self.port = port
+
+    def address(self, c):
+        if c.ip is not None:
+            return c.ip
+        state = c.state.get(c.name) if c.state is not None else None
+        return None if state is None else state.ip
+
+    def ready(self, node, c):
+        ip = self.address(c)
+        if ip is None:
+            return False
+        script = 'import socket; socket.create_connection((%r, %d), %r).close()' % (
+            ip, self.port, self.interval)
+        _, _, rc = executor.popen(node.head_node, [sys.executable, '-c', script], b'')
+        return rc == 0
+
+    def __str__(self):
+        return 'tcp %d' % self.port
+
+
+class ExecProbe(Probe):
+    """A command exits 0 in the container"""
+
+    def __init__(self, command, **opts):
+        Probe.__init__(self, **opts)
+        self.command = command
+
+    def ready(self, node, c):
+        try:
+            result = executor.docker(node.name, 'exec_run ' + c.name, c.container.exec_run, self.command)
+        except docker.errors.APIError:
+            # e.g. the container is restarting
+            return False
+        return result[0] == 0
+
+    def __str__(self):
+        return 'exec %s' % self.command
+
+
+class LogProbe(Probe):
+    """A line of the container logs matches pattern"""
+
+    def __init__(self, pattern, **opts):
+        Probe.__init__(self, **opts)
+        self.pattern = re.compile(pattern, re.M)
+
+    def ready(self, node, c):
+        logs = executor.docker(node.name, 'logs ' + c.name, c.container.logs)
+        return self.pattern.search(logs.decode('utf-8', 'replace')) is not None
+
+    def __str__(self):
+        return 'log %s' % self.pattern.pattern
+
+
+def probe(spec):
+    """
+    The probe of a readiness spec: None for running, a Probe,
+    or a dictionary of one of tcp, exec or log, with optional timeout and interval (running without them).
+    """
+    if spec is None:
+        return Running()
+    if isinstance(spec, Probe):
+        return spec
+    opts = dict((k, spec[k]) for k in ('timeout', 'interval') if k in spec)
+    if 'tcp' in spec:
+        return TCPProbe(int(spec['tcp']), **opts)
+    if 'exec' in spec:
+        return ExecProbe(spec['exec'], **opts)
+    if 'log' in spec:
+        return LogProbe(spec['log'], **opts)
+    if not set(spec) - set(opts):
+        return Running(**opts)
+    raise ValueError('unknown readiness probe: %s' % spec)
+
+
+def order(services):
+    """Check the dependencies of services, return the names in a dependency order"""
+    after = {}
+    for s in services:
+        if s['name'] in after:
+            raise ValueError('duplicate service: ' + s['name'])
+        after[s['name']] = set(s.get('after') or [])
+    for name, deps in after.items():
+        unknown = deps - set(after)
+        if unknown:
+            raise ValueError('%s starts after unknown services: %s' % (name, ', '.join(sorted(unknown))))
+
+    ordered = []
+    remaining = dict((name, set(deps)) for name, deps in after.items())
+    while remaining:
+        free = sorted(name for name, deps in remaining.items() if not deps)
+        if not free:
+            raise ValueError('dependency cycle among: ' + ', '.join(sorted(remaining)))
+        for name in free:
+            del remaining[name]
+            ordered.append(name)
+        for deps in remaining.values():
+            deps.difference_update(free)
+    return ordered
+
+
+class Scheduler(object):
+    """
+    Launch services on abstraction nodes in the order of their dependencies.
+    A service is a dictionary of name, node, spec (the keyword arguments of AbstractionNode.run,
+    the container is named after the service), after (the services it starts after) and ready (a probe spec).
+    At most workers containers are created at once, probes wait without holding a worker.
+    """
+
+    def __init__(self, net, services, workers=8):
+        self.net = net
+        self.services = list(services)
+        order(self.services)
+        for s in self.services:
+            net.node(s['node'])
+        self.workers = Semaphore(workers)
+        self.cond = Condition()
+
+    def run(self):
+        """
+        Deploy the services and wait until all are ready or failed.
+        Return a result per service in the order of services: node, name, error, container,
+        elapsed seconds of the run, launched and ready seconds from the start, and time_to_ready,
+        the seconds from its launch until its probe passed.
+        """
+        self.start = time.time()
+        self.results = dict((s['name'], {'node': s['node'], 'name': s['name'], 'error': None,
+                                         'container': None, 'elapsed': 0.0, 'launched': None,
+                                         'ready': None, 'time_to_ready': None})
+                            for s in self.services)
+        self.waiting = dict((s['name'], set(s.get('after') or [])) for s in self.services)
+        self.dependents = dict((s['name'], []) for s in self.services)
+        for s in self.services:
+            for dep in s.get('after') or []:
+                self.dependents[dep].append(s['name'])
+        self.finished = 0
+        self.phase = executor.get().current_phase()
+
+        self.by_name = dict((s['name'], s) for s in self.services)
+        with self.cond:
+            for name in order(self.services):
+                if not self.waiting[name]:
+                    self.launch(self.by_name[name])
+            while self.finished < len(self.services):
+                self.cond.wait(0.5)
+        return [self.results[s['name']] for s in self.services]
+
+    def launch(self, service):
+        t = Thread(target=self.deploy, args=(service,))
+        t.daemon = True
+        t.start()
+
+    def deploy(self, service):
+        name = service['name']
+        result = self.results[name]
+        with executor.phase(self.phase):
+            try:
+                node = self.net.node(service['node'])
+                spec = dict(service.get('spec') or {}, name=name)
+                result['launched'] = time.time() - self.start
+                with self.workers:
+                    outcome = node.run_spec(spec)
+                result['elapsed'] = outcome['elapsed']
+                result['container'] = outcome['container']
+                if outcome['error'] is not None:
+                    raise RuntimeError(outcome['error'])
+                probe(service.get('ready')).wait(node, outcome['container'])
+                result['ready'] = time.time() - self.start
+                result['time_to_ready'] = result['ready'] - result['launched']
+            except Exception as e:
+                result['error'] = str(e)
+        self.done(name)
+
+    def done(self, name):
+        """Launch the dependents of a ready service, or fail them along with a failed one"""
+        with self.cond:
+            self.finished += 1
+            failed = self.results[name]['error'] is not None
+            for dependent in self.dependents[name]:
+                if failed:
+                    if self.results[dependent]['error'] is None:
+                        self.results[dependent]['error'] = 'dependency %s failed' % name
+                        self.done(dependent)
+                    continue
+                self.waiting[dependent].discard(name)
+                if not self.waiting[dependent]:
+                    self.launch(self.by_name[dependent])
+            self.cond.notify_all()
@@ -0,0 +1,407 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Trace-driven link shaping: bandwidth, delay, jitter and loss of links follow traces while the experiment runs.
+Both interfaces of a shaped link get the qdiscs of TCIntf, an htb class for the rate and netem below it,
+and updates change them in place.
+Each namespace keeps one `tc -force -batch -` process open for the replay, the updates due at the same time
+are written to it as one batch, so no process is spawned per update.
+Every batch is recorded with its scheduled, dispatched and applied times, so the drift can be measured:
+a batch ends with a `qdisc show` of a device which does not exist, tc reports it on stderr once the lines
+before it are applied.
+
+A trace file is a csv of time (seconds from the start), link and any of bw (Mbit/s), delay (ms), jitter (ms)
+and loss (%), an empty cell keeps the previous value:
+
+    time,link,bw,delay,loss
+    0,s2-fog0,100,10,0
+    0.5,s2-fog0,20,80,1
+    0.5,s1-s2,,40,
+
+A link is named by its two nodes in either order, or by an interface name, e.g. s2-eth3, for one side only.
+"""
+
+import csv
+import os
+import random
+import re
+import subprocess
+import time
+from threading import Thread, Lock
+from mininet.log import error
+from utils import parallel_map
+import executor
+
+# The rate of an htb class without bandwidth, in Mbit/s.
+UNSHAPED = 10000
+PARAMS = ('bw', 'delay', 'jitter', 'loss')
+# Updates due within this many seconds of each other go in the same batch.
+COALESCE = 0.0005
+# The device name acknowledging a batch, shorter than IFNAMSIZ for any sequence number in practice.
+MARKER = 'fiesync%d'
+ACKNOWLEDGED = re.compile(r'Cannot find device "fiesync(\d+)"')
+FAILED = re.compile(r'Command failed -:(\d+)')
+
+
+class Trace(object):
+    """The (time, params) points of a link, params is a dictionary of some of PARAMS"""
+
+    def __init__(self, points=None):
+        self.points = sorted(points or [], key=lambda p: p[0])
+
+    def add(self, t, params):
+        self.points.append((t, params))
+        self.points.sort(key=lambda p: p[0])
+
+    def duration(self):
+        return self.points[-1][0] if self.points else 0.0
+
+    @staticmethod
+    def generate(duration, step=1.0, seed=None, **ranges):
+        """
+        A random walk over duration seconds, a point every step seconds.
+        ranges are (low, high) of params, e.g. bw=(10, 100), delay=(5, 50), loss=(0, 2).
+        """
+        rng = random.Random(seed)
+        current = dict((k, rng.uniform(lo, hi)) for k, (lo, hi) in ranges.items())
+        points = []
+        t = 0.0
+        while t <= duration:
+            points.append((t, dict(current)))
+            for k, (lo, hi) in ranges.items():
+                # Moves of up to a tenth of the range per step.
+                current[k] = min(hi, max(lo, current[k] + rng.uniform(-0.1, 0.1) * (hi - lo)))
+            t += step
+        return Trace(points)
+
+
+def load(path):
+    """Load a trace file, return a dictionary of link to Trace"""
+    traces = {}
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            params = dict((k, float(row[k])) for k in PARAMS if row.get(k, '').strip())
+            traces.setdefault(row['link'].strip(), Trace()).points.append((float(row['time']), params))
+    for trace in traces.values():
+        trace.points.sort(key=lambda p: p[0])
+    return traces
+
+
+class Shaped(object):
+    """An interface under shaping and its current parameters"""
+
+    def __init__(self, intf):
+        self.intf = intf
+        self.dev = intf.name
+        # None is the root namespace, mininet switches live there.
+        self.node = intf.node if intf.node.inNamespace else None
+        params = getattr(intf, 'params', {}) or {}
+        self.params = {'bw': params.get('bw'), 'delay': params.get('delay'),
+                       'jitter': params.get('jitter'), 'loss': params.get('loss')}
+
+    def netem(self):
+        args = ''
+        delay, jitter = ms(self.params['delay']), ms(self.params['jitter'])
+        if delay or jitter:
+            args += ' delay %s' % (delay or '0ms')
+            if jitter:
+                args += ' %s' % jitter
+        if self.params['loss']:
+            args += ' loss %g%%' % float(self.params['loss'])
+        return args
+
+    def rate(self):
+        return '%gMbit' % float(self.params['bw'] or UNSHAPED)
+
+    def setup(self):
+        """The tc lines installing the qdiscs of TCIntf, whatever the interface had"""
+        return ['qdisc replace dev %s root handle 5: htb default 1' % self.dev,
+                'class replace dev %s parent 5: classid 5:1 htb rate %s burst 15k' % (self.dev, self.rate()),
+                'qdisc replace dev %s parent 5:1 handle 10: netem%s' % (self.dev, self.netem())]
+
+    def update(self, params):
+        """Apply params, return the tc lines changing the qdiscs in place"""
+        lines = []
+        old = dict(self.params)
+        self.params.update(params)
+        if self.params['bw'] != old['bw']:
+            lines.append('class change dev %s parent 5: classid 5:1 htb rate %s burst 15k' %
+                         (self.dev, self.rate()))
+        # netem replaces all of its options on change, they are restated.
+        if any(self.params[k] != old[k] for k in ('delay', 'jitter', 'loss')):
+            lines.append('qdisc change dev %s parent 5:1 handle 10: netem%s' % (self.dev, self.netem()))
+        return lines
+
+
+def ms(value):
+    """A delay in tc syntax, numbers are milliseconds, strings are kept e.g. '10ms'"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return '%gms' % value if value else None
+    return value
+
+
+class Batch(object):
+    """The tc updates of a namespace due at the same time, with the times they went out"""
+
+    __slots__ = ('scheduled', 'node', 'lines', 'dispatched', 'applied', 'error')
+
+    def __init__(self, scheduled, node, lines):
+        self.scheduled = scheduled
+        self.node = node
+        self.lines = lines
+        self.dispatched = None
+        self.applied = None
+        self.error = None
+
+
+def tc(node, lines):
+    """Run tc lines in one batch in the namespace of node, return the error output or None"""
+    _, err, returncode = executor.popen(node, ['tc', '-force', '-batch', '-'], '\n'.join(lines) + '\n')
+    if returncode != 0:
+        return err.strip() or 'failed'
+    return None
+
+
+class TcSession(object):
+    """A tc batch process in the namespace of node, batches are written to it and acknowledged on stderr"""
+
+    def __init__(self, node):
+        self.node = node
+        self.name = 'root' if node is None else node.name
+        # The reader takes lock only, a write blocked on a full stdin never holds it.
+        self.lock = Lock()
+        self.write_lock = Lock()
+        self.seq = 0
+        self.lineno = 0
+        # sequence number -> batch, and input line number -> batch, of the batches not acknowledged yet
+        self.pending = {}
+        self.lines = {}
+        args = ['tc', '-force', '-batch', '-']
+        devnull = open(os.devnull, 'wb')
+        # Without close_fds, the sessions inherit the stdin of each other and never see it closed.
+        popen = subprocess.Popen if node is None else node.popen
+        self.process = executor.run('tc', None if node is None else node.name, 'tc session', popen, args,
+                                    stdin=subprocess.PIPE, stdout=devnull, stderr=subprocess.PIPE,
+                                    close_fds=True)
+        devnull.close()
+        self.reader = Thread(target=self.read)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def send(self, batch):
+        with self.write_lock:
+            with self.lock:
+                self.seq += 1
+                self.pending[self.seq] = batch
+                for _ in batch.lines:
+                    self.lineno += 1
+                    self.lines[self.lineno] = batch
+                # The line of the marker.
+                self.lineno += 1
+                data = '\n'.join(batch.lines + ['qdisc show dev ' + MARKER % self.seq]) + '\n'
+                batch.dispatched = time.time()
+            self.process.stdin.write(data.encode())
+            self.process.stdin.flush()
+
+    def read(self):
+        """Mark the batches applied as their markers are reported, and the errors of their lines"""
+        messages = []
+        for line in iter(self.process.stderr.readline, b''):
+            line = line.decode('utf-8', 'replace').strip()
+            now = time.time()
+            acknowledged = ACKNOWLEDGED.search(line)
+            failed = FAILED.search(line)
+            with self.lock:
+                if acknowledged:
+                    batch = self.pending.pop(int(acknowledged.group(1)), None)
+                    if batch is not None:
+                        batch.applied = now
+                        for lineno in [n for n, b in self.lines.items() if b is batch]:
+                            del self.lines[lineno]
+                    messages = []
+                elif failed:
+                    # Reported after the message of the failed line, the marker line fails on purpose.
+                    batch = self.lines.get(int(failed.group(1)))
+                    if batch is not None:
+                        batch.error = '; '.join(messages) or line
+                    messages = []
+                else:
+                    messages.append(line)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        self.process.wait()
+        self.reader.join()
+
+
+class Shaper(object):
+    """
+    Replay traces on the links of a network, traces is a dictionary of link name to Trace.
+    With loop, the traces start over after the longest one ends.
+    At most workers namespaces are updated at once.
+    """
+
+    def __init__(self, net, traces, loop=False, workers=16):
+        self.net = net
+        self.loop = loop
+        self.workers = workers
+        self.interfaces = {}
+        # (time, interface name, params), in time order
+        self.events = []
+        for link, trace in traces.items():
+            for shaped in self.resolve(link):
+                self.interfaces[shaped.dev] = shaped
+                self.events.extend((t, shaped.dev, params) for t, params in trace.points)
+        self.events.sort(key=lambda e: e[0])
+        self.period = max([trace.duration() for trace in traces.values()] or [0.0])
+        self.lock = Lock()
+        self.batches = []
+        # namespace name -> TcSession, open during the replay
+        self.sessions = {}
+        self.running = False
+        self.thread = None
+        self.start_time = None
+
+    def resolve(self, name):
+        """The shaped interfaces of a link name or an interface name"""
+        for link in self.net.links:
+            intfs = (link.intf1, link.intf2)
+            nodes = set(intf.node.name for intf in intfs)
+            if name.count('-') == 1 and set(name.split('-')) == nodes:
+                return [Shaped(intf) for intf in intfs]
+            for intf in intfs:
+                if intf.name == name:
+                    return [Shaped(intf)]
+        raise KeyError('no such link: ' + name)
+
+    def namespaces(self, updates):
+        """Group (Shaped, lines) by namespace, return a list of (node, lines)"""
+        groups = {}
+        for shaped, lines in updates:
+            key = None if shaped.node is None else shaped.node.name
+            groups.setdefault(key, (shaped.node, []))[1].extend(lines)
+        return [group for group in groups.values() if group[1]]
+
+    def setup(self):
+        """Install the qdiscs on every shaped interface"""
+        groups = self.namespaces([(s, s.setup()) for s in self.interfaces.values()])
+        for (node, _), err, _ in parallel_map(lambda group: tc(*group), groups, self.workers):
+            if err is not None:
+                error('*** error: tc setup in %s: %s\n' % ('root' if node is None else node.name, err))
+
+    def apply(self, scheduled, events):
+        updates = [(self.interfaces[dev], self.interfaces[dev].update(params)) for _, dev, params in events]
+        batches = [Batch(scheduled, node, lines) for node, lines in self.namespaces(updates)]
+        with self.lock:
+            self.batches.extend(batches)
+        for batch in batches:
+            self.sessions['root' if batch.node is None else batch.node.name].send(batch)
+
+    def sleep_until(self, deadline):
+        """Sleep until deadline, waking up to notice stop, return False once stopped"""
+        while self.running:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 0.05))
+        return False
+
+    def replay(self):
+        with executor.phase('shape'):
+            self.replay_traces()
+
+    def replay_traces(self):
+        start = self.start_time
+        while True:
+            i = 0
+            while i < len(self.events):
+                t = self.events[i][0]
+                j = i
+                while j < len(self.events) and self.events[j][0] - t <= COALESCE:
+                    j += 1
+                if not self.sleep_until(start + t):
+                    return
+                self.apply(start + t, self.events[i:j])
+                i = j
+            if not self.loop or self.period <= 0:
+                return
+            start += self.period
+
+    def start(self):
+        """Install the qdiscs and replay the traces in the background"""
+        self.setup()
+        nodes = dict((s.node.name if s.node is not None else 'root', s.node) for s in self.interfaces.values())
+        for name, session, _ in parallel_map(lambda name: TcSession(nodes[name]), nodes, self.workers):
+            if session is not None:
+                self.sessions[name] = session
+        if len(self.sessions) < len(nodes):
+            self.close()
+            raise RuntimeError('failed to start tc in the namespaces of: ' +
+                               ', '.join(sorted(set(nodes) - set(self.sessions))))
+        self.running = True
+        self.start_time = time.time()
+        self.thread = Thread(target=self.replay)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def join(self):
+        """Wait until the traces end, never returns with loop"""
+        while self.thread is not None and self.thread.is_alive():
+            self.thread.join(0.5)
+
+    def stop(self):
+        """Stop the replay, the links keep their current parameters"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.close()
+
+    def close(self):
+        """Close the tc sessions, once the pending batches are applied"""
+        sessions, self.sessions = list(self.sessions.values()), {}
+        for session in sessions:
+            session.close()
+        with self.lock:
+            failed = [b for b in self.batches if b.error is not None]
+        if failed:
+            b = failed[0]
+            error('*** error: %d tc batches failed, the first in %s: %s\n' %
+                  (len(failed), 'root' if b.node is None else b.node.name, b.error))
+
+    def drift(self):
+        """
+        Statistics in seconds of the applied batches: count, failed, and the mean, median, p99
+        and max of the drift, the time a batch was applied after it was scheduled.
+        """
+        with self.lock:
+            failed = sum(1 for b in self.batches if b.error is not None)
+            drifts = sorted(b.applied - b.scheduled for b in self.batches if b.applied is not None)
+        if not drifts:
+            return {'count': 0, 'failed': failed}
+        return {'count': len(drifts), 'failed': failed,
+                'mean': sum(drifts) / len(drifts), 'median': drifts[len(drifts) // 2],
+                'p99': drifts[min(len(drifts) - 1, int(len(drifts) * 0.99))], 'max': drifts[-1]}
+
+    def export(self, path):
+        """Save the batches as csv, the times in seconds from the start, empty if never acknowledged"""
+        with self.lock:
+            batches = list(self.batches)
+        offset = lambda t: '' if t is None else '%.6f' % (t - self.start_time)
+        with open(path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['scheduled', 'dispatched', 'applied', 'drift', 'namespace', 'updates', 'error'])
+            for b in batches:
+                drift = '' if b.applied is None else '%.6f' % (b.applied - b.scheduled)
+                writer.writerow([offset(b.scheduled), offset(b.dispatched), offset(b.applied), drift,
+                                 'root' if b.node is None else b.node.name, len(b.lines), b.error or ''])
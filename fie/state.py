@@ -0,0 +1,153 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+The in-memory cache of container states.
+A single subscription to the docker events stream keeps pid, status, ip and exit code of every container,
+lookups are memory reads instead of docker inspect calls.
+"""
+
+from threading import Thread, Condition
+from mininet.log import error
+import executor
+
+
+class ContainerState(object):
+    """The cached state of a container"""
+
+    def __init__(self, name, id=None):
+        self.name = name
+        self.id = id
+        self.pid = None
+        self.status = 'created'
+        self.ip = None
+        self.exit_code = None
+
+    def __repr__(self):
+        return '<ContainerState %s %s pid=%s ip=%s>' % (self.name, self.status, self.pid, self.ip)
+
+
+class StateCache(object):
+    """
+    Subscribe to the docker events of containers and cache their states by name.
+    The daemon is only asked once per start event for the pid and ip, which are not carried by events.
+    """
+
+    def __init__(self, docker_client):
+        self.docker_client = docker_client
+        self.states = {}
+        self.cond = Condition()
+        # Callbacks of (action, state), invoked from the events thread.
+        self.listeners = []
+        self.stream = None
+        self.thread = None
+
+    def start(self):
+        """Subscribe to the events stream"""
+        self.stream = self.docker_client.events(
+            decode=True, filters={'type': 'container'})
+        self.thread = Thread(target=self.loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Unsubscribe from the events stream"""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def loop(self):
+        try:
+            for event in self.stream:
+                try:
+                    self.handle(event)
+                except Exception as e:
+                    error('*** error: state cache event %s: %s\n' % (event, e))
+        except Exception:
+            # The stream raises once it is closed by stop.
+            pass
+
+    def handle(self, event):
+        """Update the cache from a container event"""
+        action = event.get('status') or event.get('Action')
+        attrs = event.get('Actor', {}).get('Attributes', {})
+        name = attrs.get('name')
+        if name is None:
+            return
+
+        if action == 'start':
+            # Inspect outside of the lock, the lookups are not blocked by the daemon.
+            inspect = executor.docker(None, 'inspect_container ' + name,
+                                      self.docker_client.api.inspect_container, event['id'])
+
+        with self.cond:
+            state = self.states.get(name)
+            if state is not None and state.id != event['id']:
+                # A late event of an earlier container of the same name leaves the current one alone.
+                if action not in ('create', 'rename', 'start'):
+                    return
+                state = None
+            if action == 'rename':
+                self.states.pop(attrs.get('oldName', '').lstrip('/'), None)
+            if action == 'destroy':
+                self.states.pop(name, None)
+            else:
+                if state is None:
+                    state = ContainerState(name, event['id'])
+                    self.states[name] = state
+
+                if action == 'start':
+                    state.pid = inspect['State']['Pid']
+                    state.status = 'running'
+                    state.exit_code = None
+                    state.ip = None
+                    for net in inspect['NetworkSettings']['Networks'].values():
+                        if net.get('IPAddress'):
+                            state.ip = net['IPAddress']
+                            break
+                elif action == 'die':
+                    state.pid = None
+                    state.status = 'exited'
+                    if 'exitCode' in attrs:
+                        state.exit_code = int(attrs['exitCode'])
+                elif action == 'pause':
+                    state.status = 'paused'
+                elif action == 'unpause':
+                    state.status = 'running'
+            self.cond.notify_all()
+
+        if state is not None:
+            for listener in self.listeners:
+                listener(action, state)
+
+    def get(self, name):
+        """Return the cached state of a container, or None"""
+        with self.cond:
+            return self.states.get(name)
+
+    def wait(self, name, id=None, timeout=10):
+        """
+        Wait until the container is seen running, return its state or None on timeout.
+        Given the id of the container, an earlier container of the same name is not taken for it.
+        """
+        with self.cond:
+            state = self.states.get(name)
+            # Condition.wait has no predicate in python 2, re-check on every notification.
+            remaining = timeout
+            while state is None or state.status != 'running' or (id is not None and state.id != id):
+                if remaining <= 0:
+                    return None
+                self.cond.wait(0.1)
+                remaining -= 0.1
+                state = self.states.get(name)
+            return state
+
+    def pid(self, name, id=None, timeout=10):
+        """The pid of a running container, or None"""
+        state = self.wait(name, id, timeout)
+        return None if state is None else state.pid
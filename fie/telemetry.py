@@ -0,0 +1,395 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Resource telemetry of abstraction nodes, read straight from cgroupfs.
+The sampler reads the cpu, throttling, memory and block io counters of each host cgroup (/<host name>)
+and of each container cgroup under it, through file descriptors kept open, at intervals down to tens of ms.
+Samples are kept in fixed-size ring buffers backed by arrays, and exported to a columnar file at the end.
+"""
+
+import json
+import os
+import time
+from array import array
+from threading import Thread, Event, Lock
+from mininet.log import error
+
+# The columns of every series, counters are cumulative as in cgroupfs.
+COLUMNS = ('time', 'cpu_ns', 'throttled_ns', 'nr_throttled',
+           'mem_bytes', 'io_read_bytes', 'io_write_bytes')
+
+MAGIC = 'FIE-TELEMETRY 1'
+
+
+class RingBuffer(object):
+    """A fixed-size ring of doubles, the oldest values are overwritten"""
+
+    def __init__(self, capacity):
+        self.data = array('d', [0.0]) * capacity
+        self.capacity = capacity
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.count % self.capacity] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def values(self):
+        """The values from the oldest to the latest, as an array"""
+        if self.count <= self.capacity:
+            return self.data[:self.count]
+        head = self.count % self.capacity
+        return self.data[head:] + self.data[:head]
+
+    def last(self, n=1):
+        """The latest n values, oldest first"""
+        n = min(n, len(self))
+        return [self.data[(self.count - n + i) % self.capacity] for i in range(n)]
+
+
+class Series(object):
+    """The samples of one cgroup, one ring buffer per column"""
+
+    def __init__(self, name, kind, node, capacity, limit=None, group=None):
+        self.name = name
+        # The cgroup group sampled, a container re-created under the same name has a group of its own.
+        self.group = group
+        # host or container
+        self.kind = kind
+        self.node = node
+        # The memory limit in bytes, None if unlimited
+        self.limit = limit
+        self.columns = dict((column, RingBuffer(capacity)) for column in COLUMNS)
+
+    def append(self, row):
+        for column, value in zip(COLUMNS, row):
+            self.columns[column].append(value)
+
+    def last(self, n=1):
+        """The latest n rows, as a list of dictionaries of column to value"""
+        columns = dict((c, self.columns[c].last(n)) for c in COLUMNS)
+        return [dict((c, columns[c][i]) for c in COLUMNS) for i in range(len(columns['time']))]
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def rates(self, window=1.0, interval=0.1):
+        """
+        The usage over the latest window seconds, sampled every interval seconds:
+        cpu in percent of one core, throttled ms per second, memory in bytes and io in bytes per second.
+        Return None until two samples are taken.
+        """
+        rows = self.last(int(window / interval) + 1)
+        if len(rows) < 2:
+            return None
+        first, last = rows[0], rows[-1]
+        elapsed = last['time'] - first['time']
+        if elapsed <= 0:
+            return None
+        delta = lambda column: max(last[column] - first[column], 0) / elapsed
+        return {'cpu': delta('cpu_ns') / 1e7,
+                'throttled': delta('throttled_ns') / 1e6,
+                'mem': last['mem_bytes'],
+                'limit': self.limit,
+                'read': delta('io_read_bytes'),
+                'write': delta('io_write_bytes')}
+
+
+def parse_keys(content):
+    """Parse 'key value' lines, e.g. cpu.stat"""
+    values = {}
+    for line in content.splitlines():
+        fields = line.split()
+        if len(fields) == 2:
+            values[fields[0]] = int(fields[1])
+    return values
+
+
+def parse_blkio(content):
+    """Sum read and write bytes over devices of blkio.throttle.io_service_bytes"""
+    read = write = 0
+    for line in content.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[1] == 'Read':
+            read += int(fields[2])
+        elif len(fields) == 3 and fields[1] == 'Write':
+            write += int(fields[2])
+    return read, write
+
+
+def parse_io_stat(content):
+    """Sum read and write bytes over devices of io.stat"""
+    read = write = 0
+    for line in content.splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key == 'rbytes':
+                read += int(value)
+            elif key == 'wbytes':
+                write += int(value)
+    return read, write
+
+
+class CounterReader(object):
+    """Read the counters of one cgroup, the files are opened once and re-read from offset 0"""
+
+    def __init__(self, backend, group):
+        self.version = backend.version
+        if self.version == 1:
+            paths = {'cpu': backend.stat(group, 'cpuacct', 'cpuacct.usage'),
+                     'cpu.stat': backend.stat(group, 'cpu', 'cpu.stat'),
+                     'mem': backend.stat(group, 'memory', 'memory.usage_in_bytes'),
+                     'io': backend.stat(group, 'blkio', 'blkio.throttle.io_service_bytes')}
+            limit = backend.stat(group, 'memory', 'memory.limit_in_bytes')
+        else:
+            paths = {'cpu.stat': backend.stat(group, 'cpu', 'cpu.stat'),
+                     'mem': backend.stat(group, 'memory', 'memory.current'),
+                     'io': backend.stat(group, 'io', 'io.stat')}
+            limit = backend.stat(group, 'memory', 'memory.max')
+        self.limit_path = limit
+
+        self.fds = {}
+        for key, path in paths.items():
+            try:
+                self.fds[key] = os.open(path, os.O_RDONLY)
+            except OSError:
+                pass
+        if not self.fds:
+            raise IOError('no counter of cgroup %s' % group)
+
+    def limit(self):
+        """The memory limit in bytes, None if unlimited"""
+        try:
+            with open(self.limit_path) as f:
+                value = f.read().strip()
+            # v1 reports a huge number, v2 reports max, for unlimited.
+            return None if value == 'max' or int(value) >= 1 << 60 else int(value)
+        except (IOError, ValueError):
+            return None
+
+    def read(self, key):
+        fd = self.fds.get(key)
+        if fd is None:
+            return ''
+        os.lseek(fd, 0, os.SEEK_SET)
+        return os.read(fd, 65536).decode()
+
+    def sample(self):
+        """Return a row of COLUMNS without the time"""
+        stat = parse_keys(self.read('cpu.stat'))
+        if self.version == 1:
+            content = self.read('cpu')
+            cpu = int(content) if content else 0
+            throttled = stat.get('throttled_time', 0)
+            io = parse_blkio(self.read('io'))
+        else:
+            cpu = stat.get('usage_usec', 0) * 1000
+            throttled = stat.get('throttled_usec', 0) * 1000
+            io = parse_io_stat(self.read('io'))
+        content = self.read('mem')
+        mem = int(content) if content else 0
+        return (cpu, throttled, stat.get('nr_throttled', 0), mem, io[0], io[1])
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+
+class Sampler(object):
+    """
+    Sample the cgroups of hosts and of their containers every interval seconds.
+    hosts is a dictionary of abstraction node name to its cgroup group, e.g. {'fog0': '/fog0'},
+    the containers are discovered from the child groups every rescan seconds,
+    and named after the container state cache if given.
+    """
+
+    def __init__(self, backend, hosts, interval=0.1, capacity=6000, state=None, rescan=1.0):
+        self.backend = backend
+        self.hosts = hosts
+        self.interval = interval
+        self.capacity = capacity
+        self.state = state
+        self.rescan_interval = rescan
+        self.lock = Lock()
+        # group -> Series, group -> (series, reader) of the groups sampled
+        self.series = {}
+        self.readers = {}
+        self.stopped = Event()
+        self.thread = None
+        self.last_scan = 0
+
+    def start(self):
+        self.scan()
+        self.thread = Thread(target=self.loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def running(self):
+        return self.thread is not None
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for _, reader in self.readers.values():
+            reader.close()
+        self.readers = {}
+
+    def children(self, group):
+        """The child groups of a host cgroup, one per container"""
+        path = self.backend.stat(group, 'cpu', '')
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return []
+        return [name for name in names
+                if name != getattr(self.backend, 'leaf', None) and os.path.isdir(os.path.join(path, name))]
+
+    def container_names(self):
+        """Container id -> name from the state cache"""
+        if self.state is None:
+            return {}
+        with self.state.cond:
+            return dict((s.id, s.name) for s in self.state.states.values() if s.id)
+
+    def track(self, group, name, kind, node):
+        try:
+            reader = CounterReader(self.backend, group)
+        except IOError:
+            return
+        series = Series(name, kind, node, self.capacity, reader.limit(), group)
+        with self.lock:
+            self.series[group] = series
+        self.readers[group] = (series, reader)
+
+    def scan(self):
+        """Track new hosts and containers, drop the removed containers"""
+        names = self.container_names()
+        # Limits change at runtime through RSLimitedHost.limit, refreshed along.
+        for series, reader in self.readers.values():
+            series.limit = reader.limit()
+        seen = set()
+        for node, group in self.hosts.items():
+            seen.add(group)
+            if group not in self.readers:
+                self.track(group, node, 'host', node)
+            for child in self.children(group):
+                sub = group.rstrip('/') + '/' + child
+                seen.add(sub)
+                if sub not in self.readers:
+                    self.track(sub, names.get(child, child[:12]), 'container', node)
+
+        # The series of a removed container stays for the export, only the reader goes.
+        for group in list(self.readers):
+            if group not in seen:
+                self.readers.pop(group)[1].close()
+        self.last_scan = time.time()
+
+    def sample(self):
+        """Take one sample of every tracked cgroup"""
+        now = time.time()
+        for group, (series, reader) in list(self.readers.items()):
+            try:
+                series.append((now,) + reader.sample())
+            except (OSError, ValueError):
+                # Removed in between, dropped on the next scan.
+                pass
+
+    def loop(self):
+        deadline = time.time()
+        while not self.stopped.is_set():
+            try:
+                if time.time() - self.last_scan >= self.rescan_interval:
+                    self.scan()
+                self.sample()
+            except Exception as e:
+                error('*** error: telemetry sampler: %s\n' % e)
+            # Scheduled on absolute deadlines, the sampling cost never accumulates as drift.
+            deadline += self.interval
+            delay = deadline - time.time()
+            if delay < 0:
+                deadline = time.time()
+                delay = 0
+            self.stopped.wait(delay)
+
+    def latest(self):
+        """A snapshot of group -> Series"""
+        with self.lock:
+            return dict(self.series)
+
+    def export(self, path):
+        """
+        Write all series to a columnar file: a magic line, a json header line,
+        then for each series and each column the doubles of the column in native byte order.
+        """
+        series = sorted(self.latest().values(), key=lambda s: (s.node, s.kind != 'host', s.name))
+        header = {'columns': list(COLUMNS), 'typecode': 'd', 'series': [
+            {'name': s.name, 'group': s.group, 'kind': s.kind, 'node': s.node, 'limit': s.limit, 'length': len(s)}
+            for s in series]}
+        with open(path, 'wb') as f:
+            f.write((MAGIC + '\n' + json.dumps(header) + '\n').encode())
+            for s in series:
+                for column in COLUMNS:
+                    s.columns[column].values().tofile(f)
+
+
+def human(value):
+    """Format bytes, e.g. 1.5M"""
+    for unit in ('B', 'K', 'M', 'G'):
+        if abs(value) < 1024 or unit == 'G':
+            return '%.1f%s' % (value, unit) if unit != 'B' else '%d%s' % (value, unit)
+        value /= 1024.0
+
+
+def table(sampler, window=1.0):
+    """Render the latest usage of every node, followed by its containers, sampled within the latest window seconds"""
+    # The series of removed containers stay for the export, not for the table.
+    sampled = set(sampler.readers)
+    now = time.time()
+    series = sorted(sampler.latest().values(), key=lambda s: (s.node, s.kind != 'host', s.name))
+    lines = ['%-20s %7s %10s %19s %10s %10s' %
+             ('NAME', 'CPU%', 'THROTTLED', 'MEM / LIMIT', 'READ/s', 'WRITE/s')]
+    for s in series:
+        last = s.columns['time'].last()
+        if s.group not in sampled or (last and now - last[0] > window):
+            continue
+        rates = s.rates(window, sampler.interval)
+        name = s.name if s.kind == 'host' else '  ' + s.name
+        if rates is None:
+            lines.append('%-20s %7s' % (name, '-'))
+            continue
+        mem = human(rates['mem']) + ' / ' + (human(rates['limit']) if rates['limit'] else '-')
+        lines.append('%-20s %6.1f%% %8.1fms %19s %10s %10s' %
+                     (name, rates['cpu'], rates['throttled'], mem,
+                      human(rates['read']), human(rates['write'])))
+    return '\n'.join(lines)
+
+
+def load(path, magic=MAGIC):
+    """
+    Load an exported file, return a dictionary of series to its header and columns,
+    a series is keyed by its group if it has one, by its name otherwise.
+    """
+    with open(path, 'rb') as f:
+        if f.readline().decode().strip() != magic:
+            raise ValueError('not a telemetry file: ' + path)
+        header = json.loads(f.readline().decode())
+        result = {}
+        for meta in header['series']:
+            columns = {}
+            for column in header['columns']:
+                values = array(header['typecode'])
+                values.fromfile(f, meta['length'])
+                columns[column] = values
+            result[meta.get('group') or meta['name']] = dict(meta, columns=columns)
+        return result
@@ -7,7 +7,11 @@ Checkout the License for using, modifying and publishing.
 """
 
 from mininet.util import quietRun
+from threading import Thread, Lock
+import traceback
+import ipaddress
 import docker
+import executor
 
 
 def checkIntf(intf):
@@ -25,8 +29,65 @@ def checkIntf(intf):
         exit(1)
 
 
+def network(cidr):
+    """Parse a cidr string, the ipaddress module expects unicode in python 2"""
+    if isinstance(cidr, bytes):
+        cidr = cidr.decode()
+    return ipaddress.ip_network(cidr)
+
+
+# The client of implicit_dns, created on the first call.
+_dns_client = None
+
+
 def implicit_dns():
-    client = docker.APIClient(base_url='unix://var/run/docker.sock')
-    details = client.inspect_container('dns')
+    """
+    The address of a docker-dns container named dns in cloud0.
+    FIE serves container names itself, see dns.py, this is kept for topologies still running one.
+    """
+    global _dns_client
+    if _dns_client is None:
+        _dns_client = docker.APIClient(base_url='unix://var/run/docker.sock')
+    details = _dns_client.inspect_container('dns')
     ip = details['NetworkSettings']['Networks']['netns-cloud0']['IPAddress']
     return ip
+
+
+def parallel_map(func, items, workers=1):
+    """
+    Apply func on every item with a bounded pool of worker threads.
+    Return a list of (item, result, error) in the order of items,
+    error is None on success or the formatted traceback string on failure.
+    """
+    items = list(items)
+    outcomes = [None] * len(items)
+    cursor = [0]
+    lock = Lock()
+    # The workers run in the phase of the caller.
+    phase = executor.get().current_phase()
+
+    def worker():
+        with executor.phase(phase):
+            while True:
+                with lock:
+                    i = cursor[0]
+                    if i >= len(items):
+                        return
+                    cursor[0] += 1
+                try:
+                    outcomes[i] = (items[i], func(items[i]), None)
+                except Exception:
+                    outcomes[i] = (items[i], None, traceback.format_exc())
+
+    # Run in the caller thread for the sequential case, keep the old behavior and stack.
+    if workers <= 1 or len(items) <= 1:
+        worker()
+        return outcomes
+
+    threads = [Thread(target=worker) for _ in range(min(workers, len(items)))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
@@ -0,0 +1,8 @@
+#!/bin/bash
+
+# Reap containers, docker networks and links left by a killed emulation.
+# Pass --journal <path> for a journal other than ~/.fie/journal.
+sudo -E python -c "from fie.cleanup import main; main()" "$@"
+
+# Then the mininet leftovers.
+sudo mn -c
@@ -116,14 +116,13 @@ Architecture:
     net.routeAll()
     
     """
-    TODO: For internal container configuration =>
-        We have **kwargs currently, so it's available of setting contaienr for more options.
-        Including cpu_period, cpu_quota (not like fraction, it is represented in ms), mem_limit, etc.
-        You can specifiy it => absnode_map['test'].run('image', cpu_quota=1000)
-        The problem is, should we automatically compute the relative portion of internal containers? Or, let them remained in the absolute number?
+    For internal container configuration =>
+        Containers take shares of the resources of their abstraction node, converted into limits, see fie/budget.py.
+        Absolute limits, e.g. absnode_map['test'].run('image', cpu_quota=1000), count against the same budget,
+        a container which does not fit is rejected with BudgetError.
     """
     
-    net.absnode_map['cloud'].run('tz70s/busy-wait', cpu_quota=1000) # This will makes the quota of absnode cloud almost full
+    net.absnode_map['cloud'].run('tz70s/busy-wait', share={'cpu': 0.75, 'mem': 0.5}) # Three quarters of the quota of absnode cloud
     net.absnode_map['cloud'].run('tz70s/busy-wait')
     net.absnode_map['fog'].run('tz70s/busy-wait')
     net.absnode_map['driver'].run('tz70s/busy-wait')
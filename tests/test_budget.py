@@ -0,0 +1,124 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Tests of the resource budgets of abstraction nodes, the shares of containers converted into their limits.
+
+    python -m unittest discover tests
+"""
+
+import unittest
+from fie.budget import Budget, BudgetError
+
+GB = 1024 * 1024 * 1024
+
+
+class ShareTest(unittest.TestCase):
+
+    def test_cpu_share_to_quota(self):
+        budget = Budget(4)
+        self.assertEqual(budget.admit('a', 0.5, {}), [])
+        # Half of a node of 4 cpus is 2 cpus of cfs quota.
+        self.assertEqual(budget.limits('a'), {'cpu_period': 100000, 'cpu_quota': 200000})
+        self.assertEqual(budget.usage()['cpu'], 0.5)
+
+    def test_memory_share_to_limit(self):
+        budget = Budget(4, mem=GB)
+        budget.admit('a', {'mem': 0.25}, {})
+        self.assertEqual(budget.limits('a'), {'mem_limit': GB // 4})
+
+    def test_single_share_of_every_budgeted_resource(self):
+        budget = Budget(2, mem=GB)
+        budget.admit('a', 0.5, {})
+        limits = budget.limits('a')
+        self.assertEqual(limits['cpu_quota'], 100000)
+        self.assertEqual(limits['mem_limit'], GB // 2)
+        self.assertNotIn('blkio_weight', limits)
+
+    def test_absolute_limits_count_without_limits_of_their_own(self):
+        budget = Budget(4)
+        budget.admit('a', None, {'nano_cpus': int(1e9)})
+        self.assertEqual(budget.usage()['cpu'], 0.25)
+        self.assertEqual(budget.limits('a'), {})
+
+    def test_invalid_shares(self):
+        budget = Budget(4)
+        self.assertRaises(ValueError, budget.admit, 'a', 1.5, {})
+        self.assertRaises(ValueError, budget.admit, 'a', {'gpu': 0.5}, {})
+        # No memory budget to take a share of.
+        self.assertRaises(ValueError, budget.admit, 'a', {'mem': 0.5}, {})
+        self.assertRaises(ValueError, budget.admit, 'a', 0.5, {'cpu_quota': 50000})
+        self.assertRaises(ValueError, Budget, 4, policy='evict')
+
+
+class RejectTest(unittest.TestCase):
+
+    def test_rejects_overcommit(self):
+        budget = Budget(4)
+        budget.admit('a', 0.5, {})
+        self.assertRaises(BudgetError, budget.admit, 'b', 0.75, {})
+        # The rejected container leaves the budget as it was.
+        self.assertEqual(budget.usage()['cpu'], 0.5)
+        self.assertEqual(budget.limits('b'), {})
+        budget.admit('b', 0.5, {})
+        self.assertEqual(budget.usage()['cpu'], 1.0)
+
+    def test_admitted_once(self):
+        budget = Budget(4)
+        budget.admit('a', 0.75, {})
+        self.assertEqual(budget.admit('a', 0.75, {}), [])
+        self.assertEqual(budget.usage()['cpu'], 0.75)
+
+    def test_release_makes_room(self):
+        budget = Budget(4)
+        budget.admit('a', 0.75, {})
+        budget.release('a')
+        budget.admit('b', 0.75, {})
+        self.assertEqual(budget.usage()['cpu'], 0.75)
+
+
+class RebalanceTest(unittest.TestCase):
+
+    def test_scales_cpu_shares_down(self):
+        budget = Budget(4, policy='rebalance')
+        budget.admit('a', 0.5, {})
+        self.assertEqual(budget.admit('b', 0.75, {}), ['a'])
+        # 125% asked for, every share scaled by 0.8.
+        self.assertEqual(budget.limits('a')['cpu_quota'], 160000)
+        self.assertEqual(budget.limits('b')['cpu_quota'], 240000)
+        self.assertAlmostEqual(budget.usage()['cpu'], 1.0)
+
+    def test_shares_grow_back_on_release(self):
+        budget = Budget(4, policy='rebalance')
+        budget.admit('a', 0.5, {})
+        budget.admit('b', 0.75, {})
+        self.assertEqual(budget.release('b'), ['a'])
+        self.assertEqual(budget.limits('a')['cpu_quota'], 200000)
+
+    def test_absolute_limits_are_not_scaled(self):
+        budget = Budget(4, policy='rebalance')
+        budget.admit('fixed', None, {'cpu_quota': 200000, 'cpu_period': 100000})
+        budget.admit('a', 0.75, {})
+        # The half left is granted to the relative share.
+        self.assertEqual(budget.limits('a')['cpu_quota'], 200000)
+        self.assertAlmostEqual(budget.usage()['cpu'], 1.0)
+
+    def test_absolute_limits_beyond_the_node_are_rejected(self):
+        budget = Budget(4, policy='rebalance')
+        budget.admit('a', 0.5, {})
+        self.assertRaises(BudgetError, budget.admit, 'fixed', None, {'nano_cpus': int(4e9)})
+
+    def test_memory_is_never_rebalanced(self):
+        budget = Budget(4, mem=GB, policy='rebalance')
+        budget.admit('a', {'mem': 0.75}, {})
+        self.assertRaises(BudgetError, budget.admit, 'b', {'mem': 0.5}, {})
+        self.assertEqual(budget.limits('a'), {'mem_limit': 3 * GB // 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
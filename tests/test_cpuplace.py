@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Tests of the cpu placement of abstraction nodes and of their containers, on topologies given by hand.
+
+    python -m unittest discover tests
+"""
+
+import unittest
+from fie.cpuplace import CpuSet, Placement, Topology, format_cpus, parse_cpus, sizes
+
+
+class CpuListTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(parse_cpus('0-3,8,10-11\n'), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(format_cpus([11, 0, 1, 2, 3, 8, 10]), '0-3,8,10-11')
+        self.assertEqual(parse_cpus(''), [])
+
+
+class SizesTest(unittest.TestCase):
+
+    def test_fractions_of_the_cpus(self):
+        self.assertEqual(sizes({'a': 0.5, 'b': 0.25}, 8), {'a': 4, 'b': 2})
+
+    def test_at_least_one_cpu(self):
+        self.assertEqual(sizes({'a': 0.01}, 8), {'a': 1})
+
+    def test_shares_above_the_cpu_count_scale_down(self):
+        self.assertEqual(sizes({'a': 0.75, 'b': 0.75}, 4), {'a': 2, 'b': 2})
+        result = sizes({'a': 0.9, 'b': 0.05, 'c': 0.05}, 4)
+        self.assertEqual(sum(result.values()), 4)
+        self.assertTrue(all(n >= 1 for n in result.values()))
+        self.assertEqual(max(result, key=result.get), 'a')
+
+    def test_largest_remainders_take_the_cpus_left(self):
+        result = sizes({'a': 0.5, 'b': 0.3, 'c': 0.3}, 4)
+        self.assertEqual(sum(result.values()), 4)
+        self.assertEqual(result['a'], 2)
+
+    def test_more_shares_than_cpus(self):
+        shares = dict(('n%d' % i, 0.25) for i in range(5))
+        self.assertEqual(sizes(shares, 4), dict((name, 1) for name in shares))
+
+
+class PlacementTest(unittest.TestCase):
+
+    def setUp(self):
+        # Two NUMA nodes of 4 cpus each.
+        self.topology = Topology({0: [0, 1, 2, 3], 1: [4, 5, 6, 7]})
+
+    def test_disjoint_cpusets_within_a_numa_node(self):
+        assigned = Placement(self.topology).place({'a': 0.5, 'b': 0.25})
+        self.assertEqual(len(assigned['a']), 4)
+        self.assertEqual(len(assigned['b']), 2)
+        self.assertFalse(set(assigned['a']) & set(assigned['b']))
+        for cpus in assigned.values():
+            self.assertEqual(len(self.topology.mems(cpus)), 1)
+
+    def test_nodes_without_a_share_run_on_the_rest(self):
+        placement = Placement(self.topology)
+        assigned = placement.place({'a': 0.5, 'b': 0.25, 'c': None})
+        self.assertEqual(assigned['c'], placement.rest)
+        self.assertEqual(set(assigned['c']), set(self.topology.cpus()) - set(assigned['a']) - set(assigned['b']))
+
+    def test_shares_above_the_cpu_count(self):
+        assigned = Placement(self.topology).place({'a': 0.75, 'b': 0.75})
+        self.assertEqual((len(assigned['a']), len(assigned['b'])), (4, 4))
+        self.assertFalse(set(assigned['a']) & set(assigned['b']))
+
+    def test_spread_over_numa_nodes_when_none_fits(self):
+        placement = Placement(self.topology)
+        assigned = placement.place({'a': 0.75})
+        self.assertEqual(len(assigned['a']), 6)
+        self.assertEqual(self.topology.mems(assigned['a']), [0, 1])
+        self.assertEqual(len(placement.rest), 2)
+
+    def test_whole_machine_left_without_free_cpus(self):
+        placement = Placement(self.topology)
+        assigned = placement.place({'a': 1.0, 'b': None})
+        self.assertEqual(assigned['b'], self.topology.cpus())
+
+
+class CpuSetTest(unittest.TestCase):
+
+    def test_least_loaded_cpus(self):
+        cpuset = CpuSet([0, 1, 2, 3])
+        self.assertEqual(cpuset.assign('x', 2), [0, 1])
+        self.assertEqual(cpuset.assign('y', 2), [2, 3])
+        self.assertEqual(cpuset.assign('z'), [0])
+        self.assertEqual(cpuset.load, {0: 2, 1: 1, 2: 1, 3: 1})
+
+    def test_assigned_once(self):
+        cpuset = CpuSet([0, 1, 2, 3])
+        self.assertEqual(cpuset.assign('x', 2), [0, 1])
+        self.assertEqual(cpuset.assign('x', 3), [0, 1])
+        self.assertEqual(sum(cpuset.load.values()), 2)
+
+    def test_release(self):
+        cpuset = CpuSet([0, 1, 2, 3])
+        cpuset.assign('x', 2)
+        cpuset.assign('y', 2)
+        cpuset.release('x')
+        self.assertEqual(cpuset.assign('z', 2), [0, 1])
+        cpuset.release('unknown')
+
+    def test_count_bounded_by_the_cpus(self):
+        cpuset = CpuSet([4, 5])
+        self.assertEqual(cpuset.assign('x', 8), [4, 5])
+        self.assertEqual(cpuset.assign('y', 0), [4])
+        self.assertEqual(str(cpuset), '4-5')
+
+
+if __name__ == '__main__':
+    unittest.main()
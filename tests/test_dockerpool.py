@@ -0,0 +1,151 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Tests of the pooled docker client against a stand-in daemon, an http server on a unix socket
+counting the connections it accepts.
+
+    python -m unittest discover tests
+"""
+
+import BaseHTTPServer
+import json
+import os
+import shutil
+import SocketServer
+import tempfile
+import threading
+import time
+import unittest
+import docker
+from fie.dockerpool import PooledUnixAdapter, pooled
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers every GET as an inspect of a container, keeping the connection alive"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.server.accepted()
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def address_string(self):
+        return 'stand-in'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        # Long enough for the concurrent calls to overlap.
+        time.sleep(self.server.latency)
+        body = json.dumps({'Id': self.path, 'State': {'Pid': 1, 'Running': True}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInDaemon(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """A docker daemon stand-in on a unix socket"""
+
+    daemon_threads = True
+    # The connections of the concurrent calls arrive at once.
+    request_queue_size = 64
+
+    def __init__(self, path, latency=0.05):
+        SocketServer.UnixStreamServer.__init__(self, path, StandInHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.connections = 0
+
+    def get_request(self):
+        # The peer of a unix socket has no address, which the handler expects.
+        request, _ = self.socket.accept()
+        return request, ('stand-in', 0)
+
+    def accepted(self):
+        with self.lock:
+            self.connections += 1
+
+
+class PooledUnixAdapterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='fie-test-')
+        self.path = os.path.join(self.directory, 'docker.sock')
+        self.daemon = StandInDaemon(self.path)
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def client(self, connections):
+        return pooled(docker.DockerClient(base_url='unix://' + self.path, version='1.30'), connections)
+
+    def inspect(self, client, names):
+        """Inspect every container of names in a thread of its own, all at once"""
+        errors = []
+
+        def call(name):
+            try:
+                self.assertEqual(client.api.inspect_container(name)['State']['Pid'], 1)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call, args=(name,)) for name in names]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def idle(self, client):
+        """The connections kept in the pool of client"""
+        pool = client.api._custom_adapter.pools[self.path]
+        return len([conn for conn in list(pool.pool.queue) if conn is not None])
+
+    def test_pooled_replaces_the_adapter(self):
+        client = self.client(8)
+        self.assertIsInstance(client.api._custom_adapter, PooledUnixAdapter)
+        self.assertEqual(client.api.get_adapter('http+docker://localhost/'), client.api._custom_adapter)
+
+    def test_reuses_one_connection_across_requests(self):
+        client = self.client(8)
+        for i in range(40):
+            client.api.inspect_container('c%d' % i)
+        # The stock client keeps a pool per url, one connection per container.
+        self.assertEqual(self.daemon.connections, 1)
+        self.assertEqual(len(client.api._custom_adapter.pools), 1)
+
+    def test_reuses_connections_across_threads(self):
+        client = self.client(8)
+        for r in range(4):
+            self.inspect(client, ['c%d-%d' % (r, i) for i in range(8)])
+        # 32 calls of 8 threads, on no more connections than the pool keeps.
+        self.assertLessEqual(self.daemon.connections, 8)
+
+    def test_respects_the_pool_size(self):
+        client = self.client(4)
+        # The calls beyond the pool open a connection of their own, dropped once done.
+        self.inspect(client, ['a%d' % i for i in range(12)])
+        self.assertGreater(self.daemon.connections, 4)
+        self.assertEqual(self.idle(client), 4)
+        opened = self.daemon.connections
+        self.inspect(client, ['b%d' % i for i in range(4)])
+        self.assertEqual(self.daemon.connections, opened)
+        self.assertEqual(self.idle(client), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
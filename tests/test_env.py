@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Tests of the allocators of ip pools and of container addresses.
+
+    python -m unittest discover tests
+"""
+
+import unittest
+from fie.env import AddressPool, BlockAllocator, CidrAllocator
+
+
+class BlockAllocatorTest(unittest.TestCase):
+
+    def test_fresh_blocks_in_order(self):
+        blocks = BlockAllocator(4, first=1)
+        self.assertEqual([blocks.allocate() for _ in range(3)], [1, 2, 3])
+        self.assertRaises(ValueError, blocks.allocate)
+
+    def test_released_blocks_first(self):
+        blocks = BlockAllocator(8)
+        for _ in range(4):
+            blocks.allocate()
+        blocks.release(1)
+        blocks.release(2)
+        self.assertEqual(blocks.allocate(), 2)
+        self.assertEqual(blocks.allocate(), 1)
+        self.assertEqual(blocks.allocate(), 4)
+
+    def test_release_of_a_free_block(self):
+        blocks = BlockAllocator(4)
+        blocks.allocate()
+        blocks.release(0)
+        self.assertRaises(ValueError, blocks.release, 0)
+        self.assertRaises(ValueError, blocks.release, 3)
+        self.assertRaises(ValueError, blocks.release, 4)
+
+
+class CidrAllocatorTest(unittest.TestCase):
+
+    def test_pools_of_the_base(self):
+        cidr = CidrAllocator('10.0.0.0/16', 24)
+        self.assertEqual(cidr.capacity, 255)
+        # The first pool is left to the LAN of the host.
+        self.assertEqual(cidr.allocate(), '10.0.1.0/24')
+        self.assertEqual(cidr.allocate(), '10.0.2.0/24')
+
+    def test_released_pools_are_reused(self):
+        cidr = CidrAllocator('10.0.0.0/16', 24)
+        first = cidr.allocate()
+        cidr.allocate()
+        cidr.release(first)
+        self.assertEqual(cidr.allocate(), first)
+
+    def test_exhausted(self):
+        cidr = CidrAllocator('10.0.0.0/22', 24)
+        self.assertEqual([cidr.allocate() for _ in range(cidr.capacity)],
+                         ['10.0.1.0/24', '10.0.2.0/24', '10.0.3.0/24'])
+        self.assertRaises(ValueError, cidr.allocate)
+
+    def test_prefixlen_out_of_the_base(self):
+        self.assertRaises(ValueError, CidrAllocator, '10.0.0.0/16', 8)
+        self.assertRaises(ValueError, CidrAllocator, '10.0.0.0/16', 31)
+
+
+class AddressPoolTest(unittest.TestCase):
+
+    def test_addresses_after_the_gateway(self):
+        pool = AddressPool('10.0.1.0/24')
+        self.assertEqual(pool.allocate(), '10.0.1.2')
+        self.assertEqual(pool.allocate(), '10.0.1.3')
+
+    def test_owns_and_release(self):
+        pool = AddressPool('10.0.1.0/24')
+        ip = pool.allocate()
+        self.assertTrue(pool.owns(ip))
+        self.assertFalse(pool.owns('10.0.1.1'))
+        self.assertFalse(pool.owns('10.0.2.2'))
+        pool.release(ip)
+        self.assertFalse(pool.owns(ip))
+        self.assertRaises(ValueError, pool.release, ip)
+
+    def test_exhausted_before_the_broadcast(self):
+        pool = AddressPool('10.0.1.0/29')
+        self.assertEqual([pool.allocate() for _ in range(5)],
+                         ['10.0.1.%d' % i for i in range(2, 7)])
+        self.assertRaises(ValueError, pool.allocate)
+
+
+if __name__ == '__main__':
+    unittest.main()
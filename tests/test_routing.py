@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Tests of the route planner, against a link backend recording the ip commands of every namespace.
+
+    python -m unittest discover tests
+"""
+
+import unittest
+from fie.linkbackend import LinkBackend
+from fie.routing import RoutePlanner
+
+
+class RecordingBackend(LinkBackend):
+    """Keeps the committed ip commands per node, the batches of the nodes in failing fail"""
+
+    def __init__(self):
+        self.pending = []
+        self.committed = []
+        self.failing = set()
+
+    def ip(self, node, line):
+        self.pending.append((node.name, line))
+
+    def commit(self):
+        self.failed = [node for node in self.heads if node.name in self.failing]
+        self.committed, self.pending = self.pending, []
+        return len(self.failed)
+
+
+class StandInHead(object):
+
+    def __init__(self, name, ip):
+        self.name = name
+        self.ip = ip
+
+    def IP(self, intf=None):
+        return self.ip
+
+
+class StandInNode(object):
+    """An abstraction node, its head node holding the eth0 address"""
+
+    def __init__(self, name, ip_pool, gateway):
+        self.name = name
+        self.ip_pool = ip_pool
+        self.head_node = StandInHead(name, gateway)
+
+
+class RoutePlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.link = RecordingBackend()
+        self.planner = RoutePlanner(self.link)
+        self.nodes = [StandInNode('fog0', '192.168.1.0/24', '10.0.0.1'),
+                      StandInNode('fog1', '192.168.2.0/24', '10.0.0.2'),
+                      StandInNode('cloud', '192.168.3.0/24', '10.0.0.3')]
+        self.link.heads = [n.head_node for n in self.nodes]
+
+    def commands(self):
+        return sorted(self.link.committed)
+
+    def test_full_tables(self):
+        self.planner.route(self.nodes[:2])
+        self.assertEqual(self.commands(), [
+            ('fog0', 'route replace 192.168.2.0/24 via 10.0.0.2 dev fog0-eth0'),
+            ('fog1', 'route replace 192.168.1.0/24 via 10.0.0.1 dev fog1-eth0'),
+        ])
+        self.assertEqual(self.planner.installed['fog0'], {'192.168.2.0/24': '10.0.0.2'})
+
+    def test_unchanged_tables_are_not_pushed(self):
+        self.planner.route(self.nodes)
+        self.planner.route(self.nodes)
+        self.assertEqual(self.commands(), [])
+
+    def test_added_node(self):
+        self.planner.route(self.nodes[:2])
+        self.planner.add_node(self.nodes[2])
+        # The others learn the subnet of cloud only, cloud learns all of theirs.
+        self.assertEqual(self.commands(), [
+            ('cloud', 'route replace 192.168.1.0/24 via 10.0.0.1 dev cloud-eth0'),
+            ('cloud', 'route replace 192.168.2.0/24 via 10.0.0.2 dev cloud-eth0'),
+            ('fog0', 'route replace 192.168.3.0/24 via 10.0.0.3 dev fog0-eth0'),
+            ('fog1', 'route replace 192.168.3.0/24 via 10.0.0.3 dev fog1-eth0'),
+        ])
+
+    def test_removed_node(self):
+        self.planner.route(self.nodes)
+        self.planner.remove_node('cloud')
+        self.assertEqual(self.commands(), [
+            ('fog0', 'route del 192.168.3.0/24'),
+            ('fog1', 'route del 192.168.3.0/24'),
+        ])
+        self.assertNotIn('cloud', self.planner.installed)
+        # Removed already, nothing to queue.
+        self.planner.remove_node('cloud')
+        self.assertEqual(self.link.pending, [])
+
+    def test_remote_subnets_are_summarized(self):
+        self.planner.remote = {'edge0': ('192.168.4.0/24', '10.0.0.9'), 'edge1': ('192.168.5.0/24', '10.0.0.9')}
+        self.planner.route(self.nodes[:1])
+        self.assertEqual(self.commands(), [
+            ('fog0', 'route replace 192.168.4.0/23 via 10.0.0.9 dev fog0-eth0'),
+        ])
+        # Withdrawing one of them splits the supernet, added before the supernet is deleted.
+        del self.planner.remote['edge1']
+        self.planner.route([])
+        self.assertEqual(self.link.committed, [
+            ('fog0', 'route replace 192.168.4.0/24 via 10.0.0.9 dev fog0-eth0'),
+            ('fog0', 'route del 192.168.4.0/23'),
+        ])
+
+    def test_without_summarize(self):
+        self.planner.summarize = False
+        self.planner.remote = {'edge0': ('192.168.4.0/24', '10.0.0.9'), 'edge1': ('192.168.5.0/24', '10.0.0.9')}
+        self.planner.route(self.nodes[:1])
+        self.assertEqual(len(self.link.committed), 2)
+
+    def test_failed_batch_is_pushed_again(self):
+        self.link.failing.add('fog1')
+        self.planner.route(self.nodes[:2])
+        self.assertNotIn('fog1', self.planner.installed)
+        self.link.failing.clear()
+        self.planner.route([])
+        self.assertEqual(self.commands(), [
+            ('fog1', 'route replace 192.168.1.0/24 via 10.0.0.1 dev fog1-eth0'),
+        ])
+        self.assertIn('fog1', self.planner.installed)
+
+
+if __name__ == '__main__':
+    unittest.main()
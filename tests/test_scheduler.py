@@ -0,0 +1,133 @@
+#!/usr/bin/python
+
+"""
+This work targets for emulating fog computing infrastructure and fog service and network evaluation.
+Original author Tzu-Chiao Yeh (@tz70s), 2017@National Taiwan University, Dependable Distributed System and Network Lab.
+Checkout the License for using, modifying and publishing.
+"""
+
+"""
+Tests of the dependency-aware deployment, against abstraction nodes standing in for the real ones
+whose containers are running as soon as they are launched.
+
+    python -m unittest discover tests
+"""
+
+import unittest
+from threading import Lock
+from fie.scheduler import Scheduler, order
+
+
+class StandInContainer(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def status(self):
+        return 'running'
+
+
+class StandInNode(object):
+    """Launches every container at once, but those named in failing"""
+
+    def __init__(self, net, name):
+        self.net = net
+        self.name = name
+
+    def run_spec(self, spec):
+        with self.net.lock:
+            self.net.launched.append(spec['name'])
+        if spec['name'] in self.net.failing:
+            return {'container': None, 'elapsed': 0.0, 'error': 'failed to create ' + spec['name']}
+        return {'container': StandInContainer(spec['name']), 'elapsed': 0.0, 'error': None}
+
+
+class StandInNet(object):
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.launched = []
+        self.lock = Lock()
+        self.nodes = {'fog0': StandInNode(self, 'fog0')}
+
+    def node(self, name):
+        return self.nodes[name]
+
+
+def service(name, after=None):
+    return {'name': name, 'node': 'fog0', 'spec': {'image': 'busybox'}, 'after': after}
+
+
+# a is the root, b and c depend on it, d on both.
+DIAMOND = [service('a'), service('b', ['a']), service('c', ['a']), service('d', ['b', 'c'])]
+
+
+class OrderTest(unittest.TestCase):
+
+    def test_dependencies_first(self):
+        self.assertEqual(order(DIAMOND), ['a', 'b', 'c', 'd'])
+        self.assertEqual(order(list(reversed(DIAMOND))), ['a', 'b', 'c', 'd'])
+
+    def test_independent_services(self):
+        self.assertEqual(order([service('y'), service('x')]), ['x', 'y'])
+
+    def test_invalid_dependencies(self):
+        self.assertRaises(ValueError, order, [service('a'), service('a')])
+        self.assertRaises(ValueError, order, [service('a', ['missing'])])
+        self.assertRaises(ValueError, order, [service('a', ['b']), service('b', ['a'])])
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def run_services(self, services, failing=()):
+        net = StandInNet(failing)
+        results = Scheduler(net, services, workers=2).run()
+        return net, dict((r['name'], r) for r in results)
+
+    def test_diamond(self):
+        net, results = self.run_services(DIAMOND)
+        self.assertTrue(all(r['error'] is None for r in results.values()))
+        # Every service launched once its dependencies are ready.
+        launched = net.launched
+        self.assertEqual(sorted(launched), ['a', 'b', 'c', 'd'])
+        self.assertEqual((launched[0], launched[-1]), ('a', 'd'))
+        for r in results.values():
+            self.assertIsNotNone(r['time_to_ready'])
+
+    def test_diamond_with_a_failing_branch(self):
+        net, results = self.run_services(DIAMOND, failing=['b'])
+        self.assertIsNone(results['a']['error'])
+        self.assertEqual(results['b']['error'], 'failed to create b')
+        # The other branch is deployed, the join is not.
+        self.assertIsNone(results['c']['error'])
+        self.assertEqual(results['d']['error'], 'dependency b failed')
+        self.assertNotIn('d', net.launched)
+        self.assertIsNone(results['d']['launched'])
+
+    def test_failing_root(self):
+        net, results = self.run_services(DIAMOND, failing=['a'])
+        self.assertEqual(net.launched, ['a'])
+        self.assertEqual(results['b']['error'], 'dependency a failed')
+        self.assertEqual(results['c']['error'], 'dependency a failed')
+        # Failed along with the first of its dependencies to fail.
+        self.assertEqual(results['d']['error'], 'dependency b failed')
+
+    def test_done_counts_every_service_once(self):
+        net = StandInNet()
+        scheduler = Scheduler(net, DIAMOND)
+        scheduler.results = dict((s['name'], {'error': None}) for s in DIAMOND)
+        scheduler.waiting = {'a': set(), 'b': set(['a']), 'c': set(['a']), 'd': set(['b', 'c'])}
+        scheduler.dependents = {'a': ['b', 'c'], 'b': ['d'], 'c': ['d'], 'd': []}
+        scheduler.finished = 0
+        launched = []
+        scheduler.launch = lambda s: launched.append(s['name'])
+        scheduler.by_name = dict((s['name'], s) for s in DIAMOND)
+
+        scheduler.results['a']['error'] = 'failed'
+        scheduler.done('a')
+        self.assertEqual(scheduler.finished, 4)
+        self.assertEqual(launched, [])
+
+
+if __name__ == '__main__':
+    unittest.main()